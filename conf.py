@@ -11,8 +11,41 @@ PLUGIN_VERSION_INT = 30102
 # web engine view
 WEBENGINE_INPROCESS_WEBGL_AVAILABLE = False
 
+# dem layer
+DEM_CACHE_ENABLED = True    # If True, warped DEM arrays are cached on disk
+DEM_CACHE_MAX_SIZE = 1024   # max size of the DEM cache in MB
+DEM_USE_WARPED_VRT = True   # If True, DEM tiles are read from a warped VRT built once per layer
+DEM_BUILD_OVERVIEWS = True  # If True, overviews of large DEMs without overviews are built on first coarse read
+DEM_QUANTIZE_HEIGHTS = False   # If True, DEM grid heights are stored as 16-bit integers
+DEM_QUANTIZE_MAX_ERROR = 0.01   # max absolute error of quantized heights in DEM units
+DEM_QUANTIZE_DELTA = True       # If True, delta and zig-zag encoding is applied to quantized heights
+DEM_BUILD_WORKERS = 0       # number of worker processes that build DEM blocks. If 0, blocks are built in the builder thread
+DEM_CLIP_ENGINE = "raster"  # "raster": clip DEM surfaces with a cell mask. "geometry": split clip polygons with the grid
+DEM_GRID_CACHE_MAX_SIZE = 256   # max size in MB of DEM grids shared between layers in a scene build
+DEM_PREFETCH_DEPTH = 4      # number of DEM grids of upcoming blocks read ahead in background threads. If 0, grids are read when blocks are built
+
 # vector layer
 FEATURES_PER_BLOCK = 500    # max number of features in a data block
+VECTOR_BINARY_BLOCKS = True  # If True, numbers and coordinate lists of features in a block are stored as binary data
+POLYGON_MESH_BATCH = True   # If True, triangles of Polygon and Overlay features in a block are stored in a single binary mesh
+POINT_INSTANCING = True     # If True, objects of Sphere, Cylinder, Cone, Box, Disk and Plane features are drawn as instances of a mesh
+
+# GSI elevation tile plugin
+GSI_ELEV_TILE_URL = "https://cyberjapandata.gsi.go.jp/xyz/dem/{z}/{x}/{y}.txt"  # URL template of tiles. A local mirror or a file:// URL can be used
+GSI_ELEV_TILE_CONNECTIONS = 6       # max number of concurrent tile downloads
+GSI_ELEV_TILE_MEMORY_CACHE = 256    # max number of decoded tiles kept in memory
+GSI_ELEV_TILE_DISK_CACHE = True     # If True, decoded tiles are stored on disk
+
+# binary data
+BINARY_CODEC = "zlib"           # compression codec of binary data. "none", "zlib" or "deflate-raw"
+BINARY_COMPRESSION_LEVEL = 6    # 1 (fastest) - 9 (smallest)
+BINARY_FILTERS = {              # filters applied to binary data before compression, by data type
+    "f32": ["shuffle"],
+    "f64": ["shuffle"],
+    "I32": ["shuffle"],
+    "I16": ["shuffle"]
+}
+BINARY_COMPRESSION_THREADS = 4  # number of threads that compress binary data of a block concurrently. 0 to disable
 
 # threading
 RUN_BLDR_IN_BKGND = True    # If True, builders run in a worker thread
@@ -51,6 +84,7 @@ class DEF_SETS:
     WIREFRAME_COLOR = "#000000"
     TEXTURE_SIZE = 1024
     Z_BOTTOM = 0
+    MAX_ERROR = 1.0     # max vertical error of adaptive mesh
 
     # vector
     LABEL_HEIGHT = 50
@@ -13,7 +13,11 @@ from ..const import LayerType
 from ..exportsettings import ExportSettings, Layer
 from .datamanager.image import ImageManager
 from .dem.builder import DEMLayerBuilder
+from .dem.gridcache import gridCache
+from .dem.providerpool import providerPool
+from .executor import BlockExecutor
 from .vector.builder import VectorLayerBuilder
+from ...conf import DEM_BUILD_WORKERS
 from ...utils.basic import noop
 from ...utils.js import int_color
 from ...utils.logging import logger
@@ -50,6 +54,8 @@ class ThreeJSBuilder(QObject):
 
         self.currentProgress = 0
 
+        self.executor = BlockExecutor(DEM_BUILD_WORKERS)
+
     def _progress(self, current, total=100, msg=""):
         total = total or 100
         self.currentProgress = int(current / total * 100)
@@ -79,6 +85,8 @@ class ThreeJSBuilder(QObject):
         # break circular references
         self.progress = noop
 
+        self.executor.shutdown()
+
         # move to the main thread
         self.moveToThread(QgsApplication.instance().thread())
         self.readyToQuit.emit()
@@ -111,17 +119,21 @@ class ThreeJSBuilder(QObject):
             if data:
                 self.dataReady.emit(data)
 
-            for buildTask in layerBuilder.buildTasks():
-                logger.debug("Building a block.")
-
-                if self.aborted:
-                    self.taskAborted.emit()
-                    return
-
-                data = buildTask.build()
-                if data:
-                    data["progress"] = self.currentProgress
-                    self.dataReady.emit(data)
+            tasks = layerBuilder.buildTasks()
+            results = self.executor.run(tasks)
+            try:
+                for data in results:
+                    if self.aborted:
+                        self.taskAborted.emit()
+                        return
+
+                    if data:
+                        data["progress"] = self.currentProgress
+                        self.dataReady.emit(data)
+            finally:
+                results.close()
+                if hasattr(tasks, "close"):
+                    tasks.close()       # let the layer builder release resources such as pending DEM reads
 
         except Exception as _:
             self.taskFailed.emit(layer.name, traceback.format_exc())
@@ -130,6 +142,12 @@ class ThreeJSBuilder(QObject):
         self.taskCompleted.emit()
 
     def buildScene(self, settings):
+        # DEM grids read in the previous scene build are not reused
+        gridCache().clear()
+
+        # close DEM files opened in the previous scene build. layers that have been removed do not lock them
+        providerPool().release()
+
         be = settings.baseExtent()
         mapTo3d = settings.mapTo3d()
 
@@ -172,9 +172,14 @@ class MaterialManager(DataManager):
 
         return m
 
-    def buildAll(self, assetDestination=None, base64=False):
+    def buildAll(self, assetDestination=None, base64=False, start=0):
+        """Build materials whose indices are `start` or greater.
+
+        @return {MaterialData[]}
+        """
         mList = []
-        for i, mtl in enumerate(self._list):
+        for i in range(start, len(self._list)):
+            mtl = self._list[i]
             filepath = url = None
 
             if assetDestination and mtl.type == MaterialType.SPRITE_IMAGE:
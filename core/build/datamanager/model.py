@@ -20,9 +20,9 @@ class ModelManager(DataManager):
     def modelIndex(self, path):
         return self._index(path)
 
-    def build(self, export=True, base64=False):
+    def build(self, export=True, base64=False, start=0):
         a = []
-        for path_url in self._list:
+        for path_url in self._list[start:]:
             if path_url.startswith("http:") or path_url.startswith("https:"):
                 a.append({"url": path_url})
 
@@ -3,23 +3,35 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 import base64
+import os
 import numpy as np
 import struct
 
 from qgis.PyQt.QtCore import QSize
 from qgis.core import QgsGeometry, QgsPoint, QgsPointXY
 
-from ..jsonbinarywriter import BinaryContainer, JSONBinaryWriter
+from .block_worker import PeakMemoryTracer, buildGridBlock, gridData
+from .clipper import clippedGridMesh
+from .demprovider import GDALDEMProvider
+from .gridcache import gridCache
+from .property_reader import DEMPropertyReader
+from .rtin import rtinMesh
+from .warpcache import warpCache
+from ..jsonbinarywriter import BinaryContainer, encodeJSONBinary
 from ...exportsettings import ExportSettings
-from ...geometry import TINGeometry
+from ...geometry import GridGeometry, TINGeometry
 from ...mapextent import MapExtent
+from ....conf import DEM_CLIP_ENGINE, DEM_QUANTIZE_HEIGHTS, DEM_QUANTIZE_MAX_ERROR, DEM_QUANTIZE_DELTA
+from ....utils.basic import noop
 from ....utils.js import writeBinaryContainer
 from ....utils.logging import logger
 
+MESH_CHUNK_CELLS = 1024 * 1024      # number of grid points processed at once in mesh generation
+
 
 class DEMBlockBuilderBase:
 
-    def __init__(self, layer, settings: ExportSettings, provider, mtlManager, assetDestination=None):
+    def __init__(self, layer, settings: ExportSettings, provider, mtlManager, assetDestination=None, log=None):
         self.layer = layer
         self.properties = layer.properties
 
@@ -28,33 +40,58 @@ class DEMBlockBuilderBase:
         self.mtlManager = mtlManager
 
         self.assetDestination = assetDestination
+        self.log = log or noop
+
+        self.prefetcher = None      # DEMReadPrefetcher set by the layer builder
 
     def setup(self, blockIndex, extent: MapExtent, localOrigin: QgsPoint):
         self.blockIndex = blockIndex
         self.extent = extent
         self.localOrigin = localOrigin
 
-    def buildGridData(self, z_arr, extent: MapExtent, localOrigin: QgsPoint, nodata=None):
-        """
-        @returns {DEMGridData | DEMGridDataRef}
+    def readAsArray(self, columns, rows, extent: MapExtent):
+        """Read grid values of the block, taking prefetched values if available."""
+        if self.prefetcher:
+            return self.prefetcher.readAsArray(columns, rows, extent)
+        return self.provider.readAsArray(columns, rows, extent)
+
+    def build(self):
+        """Build the block and log the peak memory usage of the build.
+
+        @returns {DEMBlockData}
         """
-        rows, cols = z_arr.shape
-        bytearray = z_arr.astype(np.float32, copy=False).tobytes()
+        with PeakMemoryTracer() as tracer:
+            b = self.buildBlock()
 
-        g = {
-            "columns": cols,
-            "rows": rows,
-            "dem_values": BinaryContainer(bytearray, "f32")
-        }
+        self.logPeakMemory(b["block"], tracer.peak)
+        return b
 
-        if nodata is not None:
-            g["nodata"] = BinaryContainer.fromFloat(nodata)
+    def buildBlock(self):
+        raise NotImplementedError
 
-        return self.buildJSONBinary(g)
+    def logPeakMemory(self, blockIndex, peak, worker=False):
+        """Log the peak memory allocated by Python and NumPy to build a block."""
+        self.log(f"Block {blockIndex}: peak memory usage {peak / 1024 ** 2:.1f} MB" + (" in a worker process" if worker else ""))
 
-    def buildMeshData(self, z_arr, extent: MapExtent, localOrigin: QgsPoint, nodata=None, full_extent: MapExtent=None):
+    def parallelJob(self):
+        """Return a job that builds the block in a worker process as (function, args, finalize),
+        or None if the block needs to be built in the builder thread.
+
+        `function(*args)` must be picklable and `finalize(result)` returns the block data.
         """
-        center: Coordinates of the origin
+        return None
+
+    def buildGridData(self, z_arr, extent: MapExtent, localOrigin: QgsPoint, nodata=None):
+        """
+        @returns {DEMGridData | DEMGridDataRef}
+        """
+        return self.buildJSONBinary(gridData(z_arr, nodata, *self.quantization()))
+
+    def buildMeshData(self, z_arr, extent: MapExtent, localOrigin: QgsPoint, nodata=None, full_extent: MapExtent=None):
+        """Build a mesh of a regular grid. Triangles that have no data vertices are not generated.
+
+        Vertices, UVs and triangle indices are written into preallocated output buffers in chunks
+        of rows, so that peak memory usage stays low for large grids.
 
         @returns {DEMMeshData | DEMMeshDataRef}
         """
@@ -62,68 +99,151 @@ class DEMBlockBuilderBase:
             full_extent = extent
 
         rows, cols = z_arr.shape
-
-        c, r = np.meshgrid(np.arange(cols), np.arange(rows))
-
         gt = extent.geotransform(cols, rows)
 
         # Coordinates of the upper-left corner of the extent relative to the center
         x0 = gt[0] + 0.5 * (gt[1] + gt[2]) - localOrigin.x()
         y0 = gt[3] + 0.5 * (gt[4] + gt[5]) - localOrigin.y()
+        z0 = localOrigin.z()
 
-        # Coordinates
-        x = x0 + c * gt[1] + r * gt[2]
-        y = y0 + c * gt[4] + r * gt[5]
-        z = z_arr - localOrigin.z() if localOrigin.z() else z_arr
+        # UV per row/column
+        du = full_extent.width() / ((cols - 1) * extent.width())
+        dv = full_extent.height() / ((rows - 1) * extent.height())
 
-        # UVs
-        u = c / ((cols - 1) * extent.width() / full_extent.width())
-        v = 1 - r / ((rows - 1) * extent.height() / full_extent.height())
+        valid = (z_arr != nodata) if nodata is not None else None
 
-        if nodata is not None:
-            valid_mask = z_arr != nodata
+        # index of the first vertex in each row
+        rowStart = np.zeros(rows + 1, dtype=np.int64)
+        np.cumsum(valid.sum(axis=1) if valid is not None else np.full(rows, cols), out=rowStart[1:])
+        nv = int(rowStart[-1])
+
+        # count triangles to allocate the index buffer
+        chunkRows = max(1, MESH_CHUNK_CELLS // max(cols, 1))
+        if valid is None:
+            nf = 2 * (rows - 1) * (cols - 1)
         else:
-            valid_mask = np.ones_like(z_arr, dtype=bool)
+            nf = 0
+            for r0 in range(0, rows - 1, chunkRows):
+                nf += sum(np.count_nonzero(m) for m in self._cellTriangleMasks(valid, r0, min(r0 + chunkRows, rows - 1)))
+
+        vertices = np.empty((nv, 3), dtype=np.float32)
+        uvs = np.empty((nv, 2), dtype=np.float32)
+        faces = np.empty((nf, 3), dtype=np.uint16 if nv <= 65536 else np.uint32)
+
+        c = np.arange(cols)
+
+        # vertices and UVs
+        for r0 in range(0, rows, chunkRows):
+            r1 = min(r0 + chunkRows, rows)
+            r = np.arange(r0, r1)[:, np.newaxis]
+            m = valid[r0:r1] if valid is not None else slice(None)
+            out = slice(rowStart[r0], rowStart[r1])
+
+            vertices[out, 0] = (x0 + c * gt[1] + r * gt[2])[m].ravel()
+            vertices[out, 1] = (y0 + c * gt[4] + r * gt[5])[m].ravel()
+            vertices[out, 2] = (z_arr[r0:r1] - z0 if z0 else z_arr[r0:r1])[m].ravel()
+
+            uvs[out, 0] = np.broadcast_to(c * du, (r1 - r0, cols))[m].ravel()
+            uvs[out, 1] = np.broadcast_to(1 - r * dv, (r1 - r0, cols))[m].ravel()
+
+        # triangle indices. each cell is split into two triangles.
+        f = 0
+        for r0 in range(0, rows - 1, chunkRows):
+            r1 = min(r0 + chunkRows, rows - 1)
+
+            # vertex index of each grid point in rows r0 to r1
+            if valid is None:
+                ids = rowStart[r0:r1 + 1, np.newaxis] + c
+            else:
+                ids = rowStart[r0:r1 + 1, np.newaxis] + np.cumsum(valid[r0:r1 + 1], axis=1) - 1
+
+            p00, p01, p10, p11 = ids[:-1, :-1], ids[:-1, 1:], ids[1:, :-1], ids[1:, 1:]
+            m1, m2 = self._cellTriangleMasks(valid, r0, r1)
+
+            for tri, m in [((p00, p10, p01), m1), ((p10, p11, p01), m2)]:
+                n = np.count_nonzero(m) if m is not Ellipsis else (r1 - r0) * (cols - 1)
+                for k in range(3):
+                    faces[f:f + n, k] = tri[k][m].ravel()
+                f += n
 
-        # Combine all coordinates and remove NoData points
-        vertices = np.column_stack((x.ravel(), y.ravel(), z.ravel()))[valid_mask.ravel()]   # (N_valid, 3)
-        uvs = np.column_stack((u.ravel(), v.ravel()))[valid_mask.ravel()]                   # (N_valid, 2)
+        mb = (vertices.nbytes + uvs.nbytes + faces.nbytes) / 1024 ** 2
+        logger.debug(f"Mesh block {self.blockIndex}: {nv} vertices, {nf} triangles, {mb:.1f} MB buffers")
+
+        return self.buildJSONBinary({
+            "vertices": BinaryContainer(vertices, "f32"),
+            "indices": indexContainer(faces, nv),
+            "uvs": BinaryContainer(uvs, "f32")
+        })
 
-        # Assign vertex IDs to valid points and use -1 for NoData points
-        grid_indices = np.full((rows, cols), -1, dtype=np.int32)    # np.int16 if rows * cols < 256 * 256
-        grid_indices[valid_mask] = np.arange(np.sum(valid_mask))
+    @staticmethod
+    def _cellTriangleMasks(valid, r0, r1):
+        """Return masks of the two triangles of cells in rows r0 to r1 - 1 that have no no-data vertices.
+        Ellipsis is returned for each mask if there are no no-data values."""
+        if valid is None:
+            return Ellipsis, Ellipsis
 
-        # Obtain the vertex IDs of the four corners of each cell using slicing
-        p00 = grid_indices[:-1, :-1]
-        p01 = grid_indices[:-1, 1:]
-        p10 = grid_indices[1:, :-1]
-        p11 = grid_indices[1:, 1:]
+        v = valid[r0:r1 + 1]
+        v00, v01, v10, v11 = v[:-1, :-1], v[:-1, 1:], v[1:, :-1], v[1:, 1:]
+        return v00 & v10 & v01, v10 & v11 & v01
 
-        # Split each cell into two triangles
-        t1 = np.stack([p00, p10, p01], axis=-1).reshape(-1, 3)
-        t2 = np.stack([p10, p11, p01], axis=-1).reshape(-1, 3)
-        triangles = np.vstack([t1, t2])
+    def quantization(self):
+        """Return (max error, delta) for height quantization. Max error is None if heights are not quantized."""
+        return (DEM_QUANTIZE_MAX_ERROR if DEM_QUANTIZE_HEIGHTS else None), DEM_QUANTIZE_DELTA
 
-        # Filter out triangles that contain at least one -1
-        valid_triangles_mask = np.all(triangles >= 0, axis=1)
-        faces = triangles[valid_triangles_mask]
+    def buildAdaptiveMeshData(self, z_arr, extent: MapExtent, localOrigin: QgsPoint, maxError, nodata=None):
+        """Build an adaptive mesh (RTIN) of which vertical error does not exceed `maxError`.
+
+        z_arr must be a square grid with 2^k + 1 points on each side.
+
+        @returns {DEMMeshData | DEMMeshDataRef}
+        """
+        rows, cols = z_arr.shape
+        points, faces = rtinMesh(z_arr, maxError, nodata)
+        r, c = points[:, 0], points[:, 1]
+
+        gt = extent.geotransform(cols, rows)
+
+        # Coordinates of the upper-left corner of the extent relative to the center
+        x0 = gt[0] + 0.5 * (gt[1] + gt[2]) - localOrigin.x()
+        y0 = gt[3] + 0.5 * (gt[4] + gt[5]) - localOrigin.y()
+
+        x = x0 + c * gt[1] + r * gt[2]
+        y = y0 + c * gt[4] + r * gt[5]
+        z = z_arr[r, c] - localOrigin.z() if localOrigin.z() else z_arr[r, c]
+
+        vertices = np.column_stack((x, y, z))
+        uvs = np.column_stack((c / (cols - 1), 1 - r / (rows - 1)))
 
         return self.buildJSONBinary({
-            "vertices": BinaryContainer(nparr_to_bytes(vertices, np.float32), "f32"),
-            "indices": BinaryContainer(nparr_to_bytes(faces, np.uint32), "I32"),
-            "uvs": BinaryContainer(nparr_to_bytes(uvs, np.float32), "f32")
+            "vertices": BinaryContainer(vertices, "f32"),
+            "indices": indexContainer(faces, len(vertices)),
+            "uvs": BinaryContainer(uvs, "f32")
         })
 
     def buildJSONBinary(self, data):
-        jhb = JSONBinaryWriter(data)
+        return encodeJSONBinary(data, self.output())
+
+    def output(self):
+        """Return a tuple of (file path, url) to write block data to, or None in preview."""
         if self.settings.isPreview:
-            return jhb.toJSONCompatible()
+            return None
 
         tail = f"{self.blockIndex}.binjson"
-        jhb.write(self.assetDestination.path(tail))
-        return {
-            "url": self.assetDestination.url(tail)
-        }
+        return self.assetDestination.path(tail), self.assetDestination.url(tail)
+
+    def finalizer(self, b, key, source=None):
+        def finalize(result):
+            result, peak = result
+            self.logPeakMemory(b["block"], peak, worker=True)
+
+            # count the array that the worker process stored in the DEM cache
+            cachePath = source and source.get("cachePath")
+            if cachePath and os.path.exists(cachePath):
+                warpCache().track(cachePath)
+
+            b[key] = result
+            return b
+        return finalize
 
 
 class DEMBlockResampBuilder(DEMBlockBuilderBase):
@@ -139,14 +259,11 @@ class DEMBlockResampBuilder(DEMBlockBuilderBase):
 
         self.edges = None
 
-    def build(self):
-        """
-        @returns {DEMBlockGridData}
-        """
+    def blockData(self):
         c = self.extent.center()
         o = self.localOrigin
 
-        b = {
+        return {
             "type": "block",
             "layer": self.layer.jsLayerId,
             "block": self.blockIndex,
@@ -155,20 +272,55 @@ class DEMBlockResampBuilder(DEMBlockBuilderBase):
             "zScale": self.settings.mapTo3d().zScale
         }
 
+    def readAsArray(self, columns, rows, extent: MapExtent):
+        if self.prefetcher:
+            return self.prefetcher.readAsArray(columns, rows, extent)
+        return gridCache().readAsArray(self.layer.layerId, self.provider, columns, rows, extent)
+
+    def parallelJob(self):
+        if self.clip_geometry or self.edgeRoughness != 1 or self.neighbors or not isinstance(self.provider, GDALDEMProvider) \
+                or DEMPropertyReader.adaptiveMeshMaxError(self.properties) is not None:
+            return None
+
+        columns, rows = (self.grid_seg.width() + 1, self.grid_seg.height() + 1)
+        if gridCache().contains(self.layer.layerId, self.provider, columns, rows, self.extent):
+            return None     # the grid has already been read in this scene build
+
+        gt = self.extent.geotransform(columns, rows)
+        source = self.provider.warpSource(columns, rows, gt)
+        if source is None:
+            return None
+
+        args = (source, columns, rows, gt, self.provider.nodata, self.output(), *self.quantization())
+
+        return buildGridBlock, args, self.finalizer(self.blockData(), "grid", source)
+
+    def buildBlock(self):
+        """
+        @returns {DEMBlockGridData}
+        """
+        b = self.blockData()
+
         if self.clip_geometry:
             b["mesh"] = self.buildClippedMeshData(self.clip_geometry)
 
         else:
             columns, rows = (self.grid_seg.width() + 1, self.grid_seg.height() + 1)
 
-            if self.edgeRoughness == 1 and len(self.neighbors) == 0:
-                arr = self.provider.readAsArray(columns, rows, self.extent)
+            arr = self.readAsArray(columns, rows, self.extent)
+            if self.edgeRoughness != 1 or len(self.neighbors):
+                arr = np.array(arr, dtype=np.float32)      # copy since the array can be read-only
+                if len(self.neighbors):
+                    self.processEdges(arr, self.roughness)
+                else:
+                    self.processEdgesCenter(arr, self.edgeRoughness)
+
+            maxError = DEMPropertyReader.adaptiveMeshMaxError(self.properties)
+            if maxError is None:
+                b["grid"] = self.buildGridData(arr, self.extent, self.localOrigin, nodata=self.provider.nodata)
             else:
-                grid_values = list(self.provider.readValues(columns, rows, self.extent))
-                self.processEdgesCenter(grid_values, self.edgeRoughness)
-                arr = np.array(grid_values, dtype=np.float32).reshape(rows, columns)
-
-            b["grid"] = self.buildGridData(arr, self.extent, self.localOrigin, nodata=self.provider.nodata)
+                c = self.extent.center()
+                b["mesh"] = self.buildAdaptiveMeshData(arr, self.extent, QgsPoint(c.x(), c.y(), 0), maxError, nodata=self.provider.nodata)
 
         return b
 
@@ -179,29 +331,47 @@ class DEMBlockResampBuilder(DEMBlockBuilderBase):
         transform_func = self.settings.mapTo3d().transformXY
 
         # create a grid geometry and split polygons with the grid
-        grid = self.provider.readAsGridGeometry(self.grid_seg.width() + 1, self.grid_seg.height() + 1, self.extent)
+        columns, rows = (self.grid_seg.width() + 1, self.grid_seg.height() + 1)
+        z_arr = self.readAsArray(columns, rows, self.extent)
+        grid = GridGeometry(self.extent, columns - 1, rows - 1, z_arr.ravel())
 
         if self.extent.rotation():
             clip_geometry = QgsGeometry(clip_geometry)
             clip_geometry.rotate(self.extent.rotation(), self.extent.center())
 
-        polys = grid.splitPolygon(clip_geometry)
-        z_func = lambda x, y: grid.valueOnSurface(x, y) or 0
+        if DEM_CLIP_ENGINE == "raster":
+            try:
+                vertices, faces = clippedGridMesh(grid, z_arr, clip_geometry, transform_func)
+            except (RuntimeError, ValueError) as e:
+                logger.warning(f"Failed to clip the DEM with a cell mask: {e}. Polygons are split with the grid instead.")
+            else:
+                return self.buildJSONBinary({
+                    "vertices": BinaryContainer(vertices, "f32"),
+                    "indices": BinaryContainer(faces, "I32")
+                })
 
-        tin = TINGeometry.fromQgsGeometry(polys, z_func, transform_func, centroid=False)
-        d = tin.toDict(flat=True)
+        polys = grid.splitPolygon(clip_geometry)
+        tin = TINGeometry.fromQgsGeometry(polys, grid.surfaceZFunc(), transform_func, centroid=False)
+        vertices, faces = tin.toArrays()
 
         return self.buildJSONBinary({
-            "vertices": BinaryContainer(nparr_to_bytes(np.array(d["vertices"], dtype=np.float32)), "f32"),
-            "indices": BinaryContainer(nparr_to_bytes(np.array(d["indices"], dtype=np.uint32)), "I32")
+            "vertices": BinaryContainer(vertices.astype(np.float32).ravel(), "f32"),
+            "indices": BinaryContainer(faces.astype(np.uint32).ravel(), "I32")
         })
 
-    def processEdges(self, grid_values, roughness):
+    def processEdges(self, arr, roughness):
+        """Replace edge values of the grid with the edge values of neighbor blocks
+        that are less roughened than this block.
+
+        Args:
+            arr: 2D numpy.ndarray of grid values. Modified in place.
+            roughness: roughness of this block.
+        """
         grid_width, grid_height = (self.grid_seg.width() + 1,
                                    self.grid_seg.height() + 1)
 
-        for sx, sy, neighbor, roughness in self.neighbors:
-            if self.roughness <= roughness:
+        for sx, sy, neighbor, nroughness in self.neighbors:
+            if roughness <= nroughness:
                 continue
             if neighbor.edges is None:
                 logger.warning(f"Neighbor block {neighbor.blockIndex} has no edge values.")
@@ -210,123 +380,75 @@ class DEMBlockResampBuilder(DEMBlockBuilderBase):
             match (sx, sy):
                 case (0, -1):
                     # top edge
-                    for x in range(grid_width):
-                        grid_values[x] = neighbor.edges[0][x]
+                    arr[0, :] = neighbor.edges[0][:grid_width]
 
                 case (0, 1):
                     # bottom edge
-                    offset = grid_width * (grid_height - 1)
-                    for x in range(grid_width):
-                        grid_values[offset + x] = neighbor.edges[3][x]
+                    arr[-1, :] = neighbor.edges[3][:grid_width]
 
                 case (-1, 0):
                     # right edge
-                    offset = grid_width - 1
-                    for y in range(grid_height):
-                        grid_values[offset + grid_width * y] = neighbor.edges[1][y]
+                    arr[:, -1] = neighbor.edges[1][:grid_height]
 
                 case (1, 0):
                     # left edge
-                    for y in range(grid_height):
-                        grid_values[grid_width * y] = neighbor.edges[2][y]
+                    arr[:, 0] = neighbor.edges[2][:grid_height]
 
                 case (-1, -1):
                     # top-right corner
-                    grid_values[grid_width - 1] = neighbor.edges[0][0]
+                    arr[0, -1] = neighbor.edges[0][0]
 
                 case (1, -1):
                     # top-left corner
-                    grid_values[0] = neighbor.edges[0][grid_width - 1]
+                    arr[0, 0] = neighbor.edges[0][grid_width - 1]
 
                 case (-1, 1):
                     # bottom-right corner
-                    grid_values[grid_width * grid_height - 1] = neighbor.edges[3][0]
+                    arr[-1, -1] = neighbor.edges[3][0]
 
                 case (1, 1):
                     # bottom-left corner
-                    grid_values[grid_width * (grid_height - 1)] = neighbor.edges[3][grid_width - 1]
+                    arr[-1, 0] = neighbor.edges[3][grid_width - 1]
 
                 case _:
                     logger.warning(f"Edge processing: invalid sx and sy ({sx}, {sy})")
 
-    def processEdgesCenter(self, grid_values, roughness):
+    def processEdgesCenter(self, arr, roughness):
+        """Interpolate edge values of the grid linearly between every `roughness`-th grid point
+        so that the edges match the edges of roughened neighbor blocks.
 
-        grid_width, grid_height = (self.grid_seg.width() + 1,
-                                   self.grid_seg.height() + 1)
-        rg_grid_width, rg_grid_height = (self.grid_seg.width() // roughness + 1,
-                                         self.grid_seg.height() // roughness + 1)
-        ii = range(roughness)[1:]
-
-        iy0 = grid_width * (grid_height - 1)
-        e_top = [grid_values[0]]
-        e_bottom = [grid_values[iy0]]
-
-        for x0 in range(rg_grid_width - 1):
-            # top edge
-            ix0 = x0 * roughness
-            z0 = grid_values[ix0]
-            z1 = grid_values[ix0 + roughness]
-            s = (z1 - z0) / roughness
-            for i in ii:
-                grid_values[ix0 + i] = z0 + s * i
-
-            e_top.append(z1)
-
-            # bottom edge
-            z0 = grid_values[iy0 + ix0]
-            z1 = grid_values[iy0 + ix0 + roughness]
-            s = (z1 - z0) / roughness
-            for i in ii:
-                grid_values[iy0 + ix0 + i] = z0 + s * i
-
-            e_bottom.append(z1)
-
-        e_left = [grid_values[0]]
-        e_right = [grid_values[grid_width - 1]]
-
-        rw = roughness * grid_width
-        for y0 in range(rg_grid_height - 1):
-            # left edge
-            iy0 = y0 * rw
-            z0 = grid_values[iy0]
-            z1 = grid_values[iy0 + rw]
-            s = (z1 - z0) / roughness
-            for i in ii:
-                grid_values[iy0 + i * grid_width] = z0 + s * i
-
-            e_left.append(z1)
-
-            # right edge
-            iy0 += grid_width - 1
-            z0 = grid_values[iy0]
-            z1 = grid_values[iy0 + rw]
-            s = (z1 - z0) / roughness
-            for i in ii:
-                grid_values[iy0 + i * grid_width] = z0 + s * i
-
-            e_right.append(z1)
-
-        self.edges = [e_bottom, e_left, e_right, e_top]
+        Args:
+            arr: 2D numpy.ndarray of grid values. Modified in place.
+        """
+        # bottom, left, right and top edges (views of the grid)
+        lines = [arr[-1, :], arr[:, 0], arr[:, -1], arr[0, :]]
+        self.edges = [interpolateEdge(line, roughness) for line in lines]
 
 
 class DEMBlockRawBuilder(DEMBlockBuilderBase):
 
-    def setup(self, blockIndex: int, tileExtent: MapExtent, localOrigin: QgsPoint, segments: int, dataExtentLowerRight, clip_geometry=None):
+    def setup(self, blockIndex: int, tileExtent: MapExtent, localOrigin: QgsPoint, segments: int, dataExtentLowerRight, clip_geometry=None, asMesh=False,
+              hasNoData=True):
+        """
+        Args:
+            clip_geometry: Clip polygon for a tile on the boundary of the clip polygon.
+            asMesh: Whether to build a mesh instead of a grid. Tiles of a clipped layer are built as meshes.
+            hasNoData: False if all values in the tile are known to be valid.
+        """
         super().setup(blockIndex, tileExtent, localOrigin)
 
         self.segments = segments
         self.tileSize = tileExtent.width()
         self.dataExtentLowerRight = dataExtentLowerRight
         self.clip_geometry = clip_geometry
+        self.asMesh = asMesh or bool(clip_geometry)
+        self.nodata = self.provider.nodata if hasNoData else None
 
-    def build(self):
-        """
-        @returns {DEMBlockGridData}
-        """
+    def blockData(self):
         c = self.extent.center()
         o = self.localOrigin
 
-        b = {
+        return {
             "type": "block",
             "layer": self.layer.jsLayerId,
             "block": self.blockIndex,
@@ -336,43 +458,100 @@ class DEMBlockRawBuilder(DEMBlockBuilderBase):
             "zScale": self.settings.mapTo3d().zScale
         }
 
+    def validGrid(self):
+        """Return the extent in the tile that contains actual data, and the number of columns and rows of the grid."""
+        return validTileGrid(self.extent, self.segments, self.dataExtentLowerRight)
+
+    def parallelJob(self):
+        if self.asMesh or not isinstance(self.provider, GDALDEMProvider):
+            return None
+
+        valid_extent, columns, rows = self.validGrid()
+        gt = valid_extent.geotransform(columns, rows)
+        source = self.provider.warpSource(columns, rows, gt)
+        if source is None:
+            return None
+
+        args = (source, columns, rows, gt, self.nodata, self.output(), *self.quantization())
+
+        return buildGridBlock, args, self.finalizer(self.blockData(), "grid", source)
+
+    def buildBlock(self):
+        """
+        @returns {DEMBlockGridData}
+        """
+        b = self.blockData()
+
+        valid_extent, columns, rows = self.validGrid()
+
+        arr = self.readAsArray(columns, rows, valid_extent)
+
         if self.clip_geometry:
-            # TODO: implement clipped tile
-            pass
+            # tile on the clip polygon boundary. vertices are relative to the origin of the scene like
+            # clipped meshes of resampled DEMs, so that texture coordinates are calculated in the same way.
+            grid = GridGeometry(valid_extent, columns - 1, rows - 1, arr.ravel())
+            vertices, faces = clippedGridMesh(grid, arr, self.clip_geometry, self.settings.mapTo3d().transformXY)
+
+            b["mesh"] = self.buildJSONBinary({
+                "vertices": BinaryContainer(vertices, "f32"),
+                "indices": BinaryContainer(faces, "I32")
+            })
+            b["translate"] = [0, 0, 0]
+
+        elif self.asMesh:
+            # tile inside the clip polygon
+            o = self.localOrigin
+            b["mesh"] = self.buildMeshData(arr, valid_extent, QgsPoint(o.x(), o.y(), 0), nodata=self.nodata, full_extent=self.extent)
+            b["translate"] = [0, 0, 0]
 
         else:
-            segment_size = self.tileSize / self.segments
-            half_segment_size = segment_size / 2
+            b["grid"] = self.buildGridData(arr, valid_extent, self.localOrigin, self.nodata)
 
-            # Determine the valid extent
-            ulx, uly = self.extent.point(0, 1)              # A' (px is pt)
-            tile_lrx, tile_lry = self.extent.point(1, 0)    # B' (px is pt)
+        return b
 
-            _lrx, _lry = self.dataExtentLowerRight              # C  (px is area)
-            layer_lrx, layer_lry = _lrx - half_segment_size, _lry + half_segment_size # C' (px is pt)
 
-            lrx, lry = min(layer_lrx, tile_lrx), max(layer_lry, tile_lry)
+def validTileGrid(tileExtent: MapExtent, segments, dataExtentLowerRight):
+    """Return the extent in a tile of original values that contains actual data, and the number of columns and rows of the grid."""
+    segment_size = tileExtent.width() / segments
+    half_segment_size = segment_size / 2
 
-            valid_width = lrx - ulx
-            valid_height = uly - lry
-            center = QgsPointXY(ulx + valid_width / 2, uly - valid_height / 2)
+    # Determine the valid extent
+    ulx, uly = tileExtent.point(0, 1)              # A' (px is pt)
+    tile_lrx, tile_lry = tileExtent.point(1, 0)    # B' (px is pt)
 
-            valid_extent = MapExtent(center, valid_width, valid_height)   # extent in the tile that contains actual data
+    _lrx, _lry = dataExtentLowerRight              # C  (px is area)
+    layer_lrx, layer_lry = _lrx - half_segment_size, _lry + half_segment_size # C' (px is pt)
 
-            columns = int(valid_width / segment_size + 1)
-            rows = int(valid_height / segment_size + 1)
+    lrx, lry = min(layer_lrx, tile_lrx), max(layer_lry, tile_lry)
 
-            arr = self.provider.readAsArray(columns, rows, valid_extent)
+    valid_width = lrx - ulx
+    valid_height = uly - lry
+    center = QgsPointXY(ulx + valid_width / 2, uly - valid_height / 2)
 
-            b["grid"] = self.buildGridData(arr, valid_extent, self.localOrigin, self.provider.nodata)
+    valid_extent = MapExtent(center, valid_width, valid_height)   # extent in the tile that contains actual data
 
-            # b["mesh"] = self.buildMeshData(arr, valid_extent, self.localOrigin, nodata=self.provider.nodata, full_extent=self.extent)
-            # b["translate"] = [0, 0, 0]
-        return b
+    columns = int(valid_width / segment_size + 1)
+    rows = int(valid_height / segment_size + 1)
+
+    return valid_extent, columns, rows
+
+
+def indexContainer(faces, vertexCount):
+    """Return a binary container of triangle indices, with 16-bit indices if the vertex count allows."""
+    return BinaryContainer(faces, "I16" if vertexCount <= 65536 else "I32")
 
 
-def nparr_to_bytes(arr, dtype=None):
-    if dtype is None:
-        return arr.tobytes()
+def interpolateEdge(line, step):
+    """Interpolate values of a 1D array linearly between every `step`-th element in place.
 
-    return arr.astype(dtype, copy=False).tobytes()
+    Returns:
+        numpy.ndarray of the values at every `step`-th element.
+    """
+    knots = line[0:(len(line) - 1) // step * step + 1:step].copy()
+    if step > 1 and len(knots) > 1:
+        z = knots.astype(np.float64)
+        s = (z[1:] - z[:-1]) / step
+        i = np.arange(1, step)
+        idx = (np.arange(len(knots) - 1)[:, np.newaxis] * step + i).ravel()
+        line[idx] = (z[:-1, np.newaxis] + s[:, np.newaxis] * i).ravel()
+    return knots
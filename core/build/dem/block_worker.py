@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Minoru Akagi
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+# Functions in this module are executed in worker processes. Do not import QGIS modules here.
+
+import os
+import tracemalloc
+
+import numpy as np
+from osgeo import gdal
+
+from ..jsonbinarywriter import BinaryContainer, encodeJSONBinary
+
+
+QUANTIZED_NODATA = 65535       # code for no data values in quantized heights
+
+# resampling algorithms used to read a window of a warped VRT
+RIO_RESAMPLE_ALGS = {
+    gdal.GRA_NearestNeighbour: gdal.GRIORA_NearestNeighbour,
+    gdal.GRA_Bilinear: gdal.GRIORA_Bilinear,
+    gdal.GRA_Cubic: gdal.GRIORA_Cubic,
+    gdal.GRA_CubicSpline: gdal.GRIORA_CubicSpline,
+    gdal.GRA_Lanczos: gdal.GRIORA_Lanczos,
+    gdal.GRA_Average: gdal.GRIORA_Average
+}
+
+# source datasets and warped VRTs opened in this process. filename -> dataset, (filename, options) -> VRT dataset
+_datasets = {}
+_vrts = {}
+
+
+class PeakMemoryTracer:
+    """Context manager that measures the peak memory allocated by Python and NumPy within the context.
+
+    `peak` is the peak in bytes above the memory allocated when the context is entered. Memory is traced
+    with tracemalloc, so allocations by other threads in the meantime are also counted, and memory
+    allocated by GDAL is not.
+    """
+
+    def __init__(self):
+        self.peak = 0
+
+    def __enter__(self):
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+        else:
+            tracemalloc.reset_peak()
+
+        self._base = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.peak = max(0, tracemalloc.get_traced_memory()[1] - self._base)
+        if self._started:
+            tracemalloc.stop()
+        return False
+
+
+def gridData(z_arr, nodata=None, maxError=None, delta=True):
+    """
+    Args:
+        z_arr: 2D numpy.ndarray of grid values.
+        nodata: No data value.
+        maxError: If not None, heights are quantized into 16-bit integers with this absolute error bound.
+        delta: Whether to apply delta and zig-zag encoding to quantized heights.
+
+    @returns {DEMGridData}
+    """
+    rows, cols = z_arr.shape
+
+    values = quantizeHeights(z_arr, maxError, nodata, delta) if maxError is not None else None
+    if values is None:
+        values = BinaryContainer(z_arr, "f32")
+
+    g = {
+        "columns": cols,
+        "rows": rows,
+        "dem_values": values
+    }
+
+    if nodata is not None:
+        g["nodata"] = BinaryContainer.fromFloat(nodata)
+
+    return g
+
+
+def quantizeHeights(z_arr, maxError, nodata=None, delta=True):
+    """Quantize heights into 16-bit unsigned integers.
+
+    A height is decoded as `base + code * scale`. The step between codes is 2 * maxError, so the
+    absolute error does not exceed maxError. If delta is True, differences between consecutive
+    codes are stored in zig-zag encoding, which compresses much better for smooth surfaces.
+
+    Returns:
+        BinaryContainer of "q16" type, or None if the range of heights is too large for the error bound.
+    """
+    scale = 2 * maxError
+    if scale <= 0:
+        return None
+
+    # compare with the no data value in the array type (e.g. -3.4e38 is not exactly representable in float32)
+    valid = (z_arr.ravel() != z_arr.dtype.type(nodata)) if nodata is not None else np.ones(z_arr.size, dtype=bool)
+    z = z_arr.astype(np.float64).ravel()
+    base = float(z[valid].min()) if valid.any() else 0.0
+    zmax = float(z[valid].max()) if valid.any() else 0.0
+
+    if (zmax - base) / scale > QUANTIZED_NODATA - 1:
+        return None
+
+    codes = np.full(len(z), QUANTIZED_NODATA, dtype=np.uint16)
+    codes[valid] = np.round((z[valid] - base) / scale).astype(np.uint16)
+
+    params = {
+        "base": base,
+        "scale": scale
+    }
+
+    if nodata is not None:
+        params["nodata"] = float(nodata)
+
+    if delta:
+        d = np.diff(codes, prepend=np.uint16(0)).view(np.int16).astype(np.int32)    # wraps around
+        codes = ((d << 1) ^ (d >> 15)).astype(np.uint16)
+        params["filter"] = "delta-zigzag"
+
+    return BinaryContainer(codes, "q16", params=params)
+
+
+def readWarpedVRTWindow(vrt, width, height, gt, resampleAlg, nodata=None):
+    """Read a block as a window of a warped VRT.
+
+    Returns:
+        numpy.ndarray (float32), or None if the block extends beyond the VRT.
+    """
+    vgt = vrt.GetGeoTransform()
+    vw, vh = vrt.RasterXSize, vrt.RasterYSize
+
+    # window in the VRT pixel coordinates
+    xoff = (gt[0] - vgt[0]) / vgt[1]
+    yoff = (gt[3] - vgt[3]) / vgt[5]
+    xsize = width * gt[1] / vgt[1]
+    ysize = height * gt[5] / vgt[5]
+    xoff, yoff, xsize, ysize = [round(v) if abs(v - round(v)) < 1e-6 else v for v in (xoff, yoff, xsize, ysize)]
+
+    if xoff >= vw or yoff >= vh or xoff + xsize <= 0 or yoff + ysize <= 0:
+        # no overlap with the layer
+        return np.full((height, width), 0 if nodata is None else nodata, dtype=np.float32)
+
+    if xoff < 0 or yoff < 0 or xoff + xsize > vw or yoff + ysize > vh:
+        return None     # partial overlap. warp the block to get the same values along the layer edges
+
+    band = vrt.GetRasterBand(1)
+    alg = RIO_RESAMPLE_ALGS.get(resampleAlg, gdal.GRIORA_Bilinear)
+    return band.ReadAsArray(xoff, yoff, xsize, ysize, buf_xsize=width, buf_ysize=height,
+                            buf_type=gdal.GDT_Float32, resample_alg=alg)
+
+
+def warpArray(source, width, height, gt):
+    """Warp a DEM into a grid in the same way as `GDALDEMProvider` reads it.
+
+    Args:
+        source: Dictionary returned by `GDALDEMProvider.warpSource()`.
+        width, height: Size of the grid.
+        gt: Geotransform of the grid.
+
+    Returns:
+        numpy.ndarray (float32)
+    """
+    filename = source["filename"]
+    ds = _datasets.get(filename)
+    if ds is None:
+        ds = _datasets[filename] = gdal.Open(filename, gdal.GA_ReadOnly)
+
+    arr = None
+    vrtOpts = source.get("vrt")
+    if vrtOpts:
+        key = (filename, repr(sorted(vrtOpts.items())))
+        vrt = _vrts.get(key)
+        if vrt is None:
+            vrt = _vrts[key] = gdal.Warp("", ds, **vrtOpts)
+
+        if vrt is not None:
+            opts = source["opts"]
+            arr = readWarpedVRTWindow(vrt, width, height, gt, opts["resampleAlg"], opts.get("dstNodata"))
+
+    if arr is None:
+        opts = dict(source["opts"])
+        opts["width"] = width
+        opts["height"] = height
+        opts["outputBounds"] = [gt[0], gt[3] + gt[5] * height, gt[0] + gt[1] * width, gt[3]]
+
+        warped_ds = gdal.Warp("", ds, **opts)
+        arr = warped_ds.GetRasterBand(1).ReadAsArray()
+
+    cachePath = source.get("cachePath")
+    if cachePath:
+        # the builder process counts the file in the cache size
+        tempPath = f"{cachePath}.{os.getpid()}.tmp"
+        try:
+            with open(tempPath, "wb") as f:
+                np.save(f, np.ascontiguousarray(arr, dtype=np.float32))
+            os.replace(tempPath, cachePath)
+        except OSError:
+            if os.path.exists(tempPath):
+                os.remove(tempPath)
+
+    return arr
+
+
+def buildGridBlock(source, width, height, gt, nodata, output, maxError=None, delta=True):
+    """Read a DEM grid and encode it.
+
+    Returns:
+        (DEMGridData | DEMGridDataRef, peak memory usage in bytes)
+    """
+    with PeakMemoryTracer() as tracer:
+        arr = warpArray(source, width, height, gt)
+        data = encodeJSONBinary(gridData(arr, nodata, maxError, delta), output)
+    return data, tracer.peak
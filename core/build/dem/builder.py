@@ -3,18 +3,23 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 import math
+import numpy as np
 from osgeo import gdal
 from qgis.PyQt.QtCore import QSize
-from qgis.core import QgsPoint, QgsProject
+from qgis.core import QgsGeometry, QgsPoint, QgsProject
 
-from .block_builder import DEMBlockResampBuilder, DEMBlockRawBuilder
+from .block_builder import DEMBlockResampBuilder, DEMBlockRawBuilder, validTileGrid
+from .demprovider import GDALDEMProvider, TILE_EMPTY, TILE_PARTIAL, TILE_FULL
 from .material_builder import DEMMaterialBuilder
+from .prefetch import DEMReadPrefetcher
 from .property_reader import DEMPropertyReader
+from .rtin import rtinGridSize
+from .warpcache import warpCache
 from ..layerbuilderbase import LayerBuilderBase
 from ...const import DEMMtlType
 from ...geometry import dissolvePolygonsWithinExtent
 from ...mapextent import MapExtent
-from ....conf import DEF_SETS
+from ....conf import DEF_SETS, DEM_BUILD_WORKERS, DEM_PREFETCH_DEPTH, DEM_USE_WARPED_VRT
 from ....utils.basic import  parseFloat
 from ....utils.js import hex_color
 from ....utils.logging import logger
@@ -31,7 +36,7 @@ class DEMLayerBuilder(LayerBuilderBase):
         self.mtlBuilder = DEMMaterialBuilder(layer, settings, imageManager, assetDestination)
 
         BldClass = DEMBlockRawBuilder if self.properties.get("radioButton_OriginalValues") else DEMBlockResampBuilder
-        self.blockBuilder = BldClass(layer, settings, self.provider, self.mtlBuilder.materialManager, self.assetDestination)
+        self.blockBuilder = BldClass(layer, settings, self.provider, self.mtlBuilder.materialManager, self.assetDestination, self.log)
 
     def build(self, build_blocks=False):
         """
@@ -69,7 +74,8 @@ class DEMLayerBuilder(LayerBuilderBase):
         """
         p = LayerBuilderBase.layerProperties(self)
         p["type"] = "dem"
-        p["dataType"] = "mesh" if self.properties.get("radioButton_ClipPolygon") else "grid"
+        isMesh = bool(self.properties.get("radioButton_ClipPolygon") or DEMPropertyReader.adaptiveMeshMaxError(self.properties) is not None)
+        p["dataType"] = "mesh" if isMesh else "grid"
         p["mtlNames"] = [mtl.get("name", "") for mtl in self.properties.get("materials", [])]
         p["mtlIdx"] = self.layer.mtlIndex(self.properties.get("mtlId"))
 
@@ -84,7 +90,7 @@ class DEMLayerBuilder(LayerBuilderBase):
                 "bottom": parseFloat(self.properties.get("lineEdit_Bottom"), DEF_SETS.Z_BOTTOM)
             }
 
-        if self.properties.get("checkBox_Frame") and not self.properties.get("radioButton_ClipPolygon"):
+        if self.properties.get("checkBox_Frame") and not isMesh:
             mi = mtlMan.getLineIndex(color=hex_color(self.properties.get("colorButton_Edge", DEF_SETS.EDGE_COLOR), prefix="0x"), opacity=opacity)
             p["edges"] = {
                 "mtl": mtlMan.build(mi)
@@ -102,14 +108,46 @@ class DEMLayerBuilder(LayerBuilderBase):
         """Yield build tasks that produce DEM tiles and materials."""
         orig = self.properties.get("radioButton_OriginalValues")
 
-        if orig and self.provider.CanUseOriginalValues:
-            self.provider.setResampleAlg(gdal.GRA_NearestNeighbour)
-            yield from self._buildTasks_Raw()
-        else:
-            self.provider.setResampleAlg(gdal.GRA_Bilinear)
-            yield from self._buildTasks_Resamp()
+        if isinstance(self.provider, GDALDEMProvider):
+            # many blocks are read from the same source when tiling
+            tiled = orig or self.properties.get("checkBox_Tiles", False)
+            self.provider.setWarpedVRTMode(DEM_USE_WARPED_VRT and tiled)
+
+        raw = orig and self.provider.CanUseOriginalValues
+        self.provider.setResampleAlg(gdal.GRA_NearestNeighbour if raw else gdal.GRA_Bilinear)
 
-    def _buildTasks_Raw(self):
+        # grids of upcoming blocks are read in background threads while blocks are built in this thread.
+        # blocks built in worker processes read their own grids.
+        prefetcher = None
+        if isinstance(self.provider, GDALDEMProvider) and DEM_PREFETCH_DEPTH > 0 and DEM_BUILD_WORKERS == 0 \
+                and not self.layer.opt.onlyMaterial:
+            prefetcher = DEMReadPrefetcher(self.layer.layerId, self.provider, DEM_PREFETCH_DEPTH, useGridCache=not raw)
+
+        try:
+            if raw:
+                yield from self._buildTasks_Raw(prefetcher)
+            else:
+                yield from self._buildTasks_Resamp(prefetcher)
+
+        finally:
+            # also when the build is aborted and this generator is closed
+            if prefetcher:
+                prefetcher.close()
+                self.blockBuilder.prefetcher = None
+
+        cache = warpCache()
+        if cache:
+            logger.debug(f"{self.layer.name}: DEM cache stats {cache.stats()}")
+
+    def clipGeometry(self, extent):
+        """Return the dissolved polygons of the clip layer within the extent, or None if the clip layer is not available."""
+        clip_layerId = self.properties.get("comboBox_ClipLayer")
+        clip_layer = QgsProject.instance().mapLayer(clip_layerId) if clip_layerId else None
+        if clip_layer:
+            return dissolvePolygonsWithinExtent(clip_layer, extent, self.settings.crs)
+        return None
+
+    def _buildTasks_Raw(self, prefetcher=None):
         materials = self.properties.get("materials", [])
         mtlCount = len(materials)
         currentMtlId = self.properties.get("mtlId")
@@ -122,6 +160,15 @@ class DEMLayerBuilder(LayerBuilderBase):
         segments = self.properties.get("spinBox_TileSideSegments", 512)
         noClip = self.properties.get("radioButton_NoClip")
 
+        # clip polygon and its prepared geometry engine for tile-level filtering
+        clipping = bool(self.properties.get("radioButton_ClipPolygon"))
+        clip_geometry = clip_engine = None
+        if clipping:
+            clip_geometry = self.clipGeometry(be)
+            if clip_geometry:
+                clip_engine = QgsGeometry.createGeometryEngine(clip_geometry.constGet())
+                clip_engine.prepareGeometry()
+
         # DEM provider is assumed to be GDALDEMProvider.
         layer_extent = self.provider.extent()
 
@@ -153,20 +200,49 @@ class DEMLayerBuilder(LayerBuilderBase):
             logger.error(f"{self.layer.name}: DEM pixel size is different in X and Y directions.")
             return
 
+        # classify tiles to skip tiles that have no valid values
+        classes = self.provider.classifyTiles(ulx, uly, segments, tile_cols, tile_rows)
+        if classes is not None:
+            counts = np.bincount(classes.ravel(), minlength=3)
+            logger.debug(f"{self.layer.name}: {counts[TILE_EMPTY]} empty, {counts[TILE_PARTIAL]} partial and {counts[TILE_FULL]} full tiles.")
+
         tile_size = xres * segments
         tiles = []
+        skipped = 0
         for row in range(tile_rows):
             for col in range(tile_cols):
                 blockIndex = row * tile_cols + col
+                tileClass = TILE_PARTIAL if classes is None else classes[row, col]
+                if tileClass == TILE_EMPTY:
+                    continue
 
                 cx = ulx + xres / 2 + (col + 0.5) * tile_size
                 cy = uly - yres / 2 - (row + 0.5) * tile_size
                 tileExtent = MapExtent(QgsPoint(cx, cy), tile_size, tile_size)
 
-                tiles.append((-row, blockIndex, tileExtent))
+                tile_clip = None
+                if clip_engine:
+                    tile_geom = tileExtent.geometry()
+                    if not clip_engine.intersects(tile_geom.constGet()):
+                        skipped += 1        # outside the clip polygon
+                        continue
+
+                    if not clip_engine.contains(tile_geom.constGet()):
+                        tile_clip = clip_geometry.clipped(tileExtent.unrotatedRect())      # on the boundary
 
-        beCenterX, beCenterY = be.center().x(), be.center().y()
-        for i, (_r, blockIndex, tileExtent) in enumerate(sorted(tiles)):
+                tiles.append((-row, blockIndex, tileExtent, tile_clip, tileClass == TILE_FULL))
+
+        if skipped:
+            logger.debug(f"{self.layer.name}: {skipped} tiles outside the clip polygon are skipped.")
+
+        tiles.sort(key=lambda t: t[:2])
+
+        self.blockBuilder.prefetcher = prefetcher
+        if prefetcher:
+            prefetcher.schedule((columns, rows, extent) for extent, columns, rows
+                                in (validTileGrid(t[2], segments, data_extent_lr) for t in tiles))
+
+        for i, (_r, blockIndex, tileExtent, tile_clip, full) in enumerate(tiles):
                 # set up material builder for first/current material
                 if self.layer.opt.allMaterials and len(materials):
                     id = materials[0].get("id")
@@ -179,7 +255,8 @@ class DEMLayerBuilder(LayerBuilderBase):
                 if not self.layer.opt.onlyMaterial:
                     # DEMBlockRawBuilder
                     self.blockBuilder.setup(blockIndex, tileExtent, self.settings.mapTo3d().origin, segments,
-                                            dataExtentLowerRight=data_extent_lr)
+                                            dataExtentLowerRight=data_extent_lr, clip_geometry=tile_clip,
+                                            asMesh=clipping, hasNoData=not full)
                     yield self.blockBuilder
 
                 # set up material builder for remaininig materials
@@ -189,9 +266,9 @@ class DEMLayerBuilder(LayerBuilderBase):
                         self.mtlBuilder.setup(blockIndex, tileExtent, id, useNow=bool(id == currentMtlId))
                         yield self.mtlBuilder
 
-                self.progress(i + 1, tile_cols * tile_rows)
+                self.progress(i + 1, len(tiles))
 
-    def _buildTasks_Resamp(self):
+    def _buildTasks_Resamp(self, prefetcher=None):
         be = self.settings.baseExtent()
 
         materials = self.properties.get("materials", [])
@@ -207,14 +284,15 @@ class DEMLayerBuilder(LayerBuilderBase):
         rotation = be.rotation()
         base_grid_seg = self.settings.demGridSegments(self.layer.layerId)
 
+        if DEMPropertyReader.adaptiveMeshMaxError(self.properties) is not None:
+            # adaptive mesh requires a square grid with 2^k segments on each side
+            seg = rtinGridSize(max(base_grid_seg.width(), base_grid_seg.height()))
+            base_grid_seg = QSize(seg, seg)
+
         # clipping
         clip_geometry = None
-        clipping = self.properties.get("radioButton_ClipPolygon")
-        if clipping:
-            clip_layerId = self.properties.get("comboBox_ClipLayer")
-            clip_layer = QgsProject.instance().mapLayer(clip_layerId) if clip_layerId else None
-            if clip_layer:
-                clip_geometry = dissolvePolygonsWithinExtent(clip_layer, be, self.settings.crs)
+        if self.properties.get("radioButton_ClipPolygon"):
+            clip_geometry = self.clipGeometry(be)
 
         # surrounding tiles
         tiles = self.properties.get("checkBox_Tiles", False)
@@ -222,7 +300,7 @@ class DEMLayerBuilder(LayerBuilderBase):
         size = self.properties.get("spinBox_Size", 1) if tiles else 1
         size2 = size * size
 
-        centerBlk = DEMBlockResampBuilder(self.layer, self.settings, self.provider, self.mtlBuilder.materialManager, self.assetDestination)
+        centerBlk = DEMBlockResampBuilder(self.layer, self.settings, self.provider, self.mtlBuilder.materialManager, self.assetDestination, self.log)
         blks = []
         for i in range(size2):
             sx = i % size - (size - 1) // 2
@@ -230,7 +308,8 @@ class DEMLayerBuilder(LayerBuilderBase):
             dist2 = sx * sx + sy * sy
             blks.append([dist2, -sy, sx, sy, i])
 
-        for i, (dist2, _nsy, sx, sy, blockIndex) in enumerate(sorted(blks)):
+        blocks = []
+        for dist2, _nsy, sx, sy, blockIndex in sorted(blks):
             is_center = (sx == 0 and sy == 0)
             if is_center:
                 extent = be
@@ -240,7 +319,13 @@ class DEMLayerBuilder(LayerBuilderBase):
                 extent = MapExtent(block_center, be.width(), be.height()).rotate(rotation, center)
                 grid_seg = QSize(max(1, base_grid_seg.width() // roughness),
                                  max(1, base_grid_seg.height() // roughness))
+            blocks.append((sx, sy, blockIndex, is_center, extent, grid_seg))
+
+        centerBlk.prefetcher = self.blockBuilder.prefetcher = prefetcher
+        if prefetcher:
+            prefetcher.schedule((b[5].width() + 1, b[5].height() + 1, b[4]) for b in blocks)
 
+        for i, (sx, sy, blockIndex, is_center, extent, grid_seg) in enumerate(blocks):
             # set up material builder for first/current material
             if self.layer.opt.allMaterials and len(materials):
                 id = materials[0].get("id")
@@ -256,8 +341,8 @@ class DEMLayerBuilder(LayerBuilderBase):
                     blkBuilder = centerBlk
                 else:
                     blkBuilder = self.blockBuilder
-                    if sx * sx <= 1 and sy * sy <= 1:
-                        neighbors = [(sx, sy, centerBlk, 1)]
+                    if sx * sx <= 1 and sy * sy <= 1 and clip_geometry is None:
+                        neighbors = [(sx, sy, centerBlk, 1)]     # a clipped center block has no edges to stitch to
 
                 # DEMBlockResampBuilder
                 blkBuilder.setup(blockIndex, extent, self.settings.mapTo3d().origin, grid_seg,
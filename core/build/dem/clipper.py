@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Minoru Akagi
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+# Clipping of a DEM grid with a polygon using a raster mask of grid cells.
+# Cells inside the polygon are triangulated as a regular grid at once, and exact polygon
+# clipping is done only for cells that the polygon boundary crosses.
+
+import numpy as np
+from osgeo import gdal, ogr
+from qgis.core import QgsGeometry, QgsRectangle
+
+from ...geometry import GridGeometry, TINGeometry
+from ....utils.logging import logger
+
+
+def cellMasks(geom: QgsGeometry, grid: GridGeometry):
+    """Classify grid cells with a polygon.
+
+    Returns:
+        (inside, boundary): 2D boolean numpy.ndarrays of (rows, columns) of cells. `inside` is True for
+        cells that are entirely inside the polygon, and `boundary` is True for cells that may be
+        partially covered with the polygon. Other cells are outside the polygon.
+    """
+    cols, rows = grid.x_segments, grid.y_segments
+
+    ds = gdal.GetDriverByName("MEM").Create("", cols, rows, 2, gdal.GDT_Byte)
+    ds.SetGeoTransform([grid.xmin, grid.xres, 0, grid.ymax, 0, -grid.yres])
+
+    ogr_geom = ogr.CreateGeometryFromWkb(bytes(geom.asWkb()))
+    if ogr_geom is None:
+        raise ValueError("Failed to convert the clip geometry")
+
+    vds = ogr.GetDriverByName("Memory").CreateDataSource("")
+    for band, g in [(1, ogr_geom), (2, ogr_geom.Boundary())]:
+        lyr = vds.CreateLayer(f"band{band}", geom_type=ogr.wkbUnknown)
+        f = ogr.Feature(lyr.GetLayerDefn())
+        f.SetGeometry(g)
+        lyr.CreateFeature(f)
+        gdal.RasterizeLayer(ds, [band], lyr, burn_values=[1], options=["ALL_TOUCHED=TRUE"])
+
+    touched = ds.GetRasterBand(1).ReadAsArray().astype(bool)
+    edge = ds.GetRasterBand(2).ReadAsArray().astype(bool)
+
+    # dilate boundary cells by one cell, so that cells which the boundary only touches at
+    # their edges or corners are clipped exactly
+    padded = np.pad(edge, 1)
+    near = np.zeros_like(edge)
+    for dy in range(3):
+        for dx in range(3):
+            near |= padded[dy:dy + rows, dx:dx + cols]
+
+    return touched & ~near, touched & near
+
+
+def clippedGridMesh(grid: GridGeometry, z_arr, geom: QgsGeometry, transform_func):
+    """Triangulate the part of a grid within a polygon.
+
+    Args:
+        grid: Grid geometry. Its values are used to calculate z of vertices on the polygon boundary.
+        z_arr: 2D numpy.ndarray of grid values.
+        geom: Clip polygon in the coordinates of the grid.
+        transform_func: Function to transform (x, y, z) coordinates. Must accept numpy arrays.
+
+    Returns:
+        (vertices, faces): (N, 3) numpy.ndarray (float64) of vertices and (M, 3) numpy.ndarray of
+        vertex indices. Triangles are in counter-clockwise order.
+    """
+    inside, boundary = cellMasks(geom, grid)
+    rows, cols = z_arr.shape
+    xmin, ymax, xres, yres = grid.xmin, grid.ymax, grid.xres, grid.yres
+
+    # interior cells
+    r, c = np.nonzero(inside)
+    node = lambda r, c: r * cols + c
+    p00, p01, p10, p11 = node(r, c), node(r, c + 1), node(r + 1, c), node(r + 1, c + 1)
+    tris = np.concatenate([np.column_stack([p00, p10, p01]), np.column_stack([p10, p11, p01])])
+
+    used, faces = np.unique(tris, return_inverse=True)
+    vr, vc = np.divmod(used, cols)
+    x, y, z = transform_func(xmin + vc * xres, ymax - vr * yres, z_arr[vr, vc].astype(np.float64))
+    vertices = np.column_stack([x, y, z])
+    faces = faces.reshape(-1, 3)
+
+    # boundary cells: clip the polygon with each cell and triangulate the pieces
+    pieces = []
+    br, bc = np.nonzero(boundary)
+    for col in np.unique(bc):
+        rs = br[bc == col]
+        x0, x1 = xmin + col * xres, xmin + (col + 1) * xres
+        band = geom.clipped(QgsRectangle(x0, ymax - (rs.max() + 1) * yres, x1, ymax - rs.min() * yres))
+        if not band or band.isEmpty():
+            continue
+
+        for row in rs:
+            piece = band.clipped(QgsRectangle(x0, ymax - (row + 1) * yres, x1, ymax - row * yres))
+            if piece and not piece.isEmpty():
+                pieces.append(piece)
+
+    if not pieces:
+        return vertices, faces
+
+    tin = TINGeometry.fromQgsGeometry(QgsGeometry.collectGeometry(pieces), grid.surfaceZFunc(), transform_func, centroid=False)
+    bv, bf = tin.toArrays()
+
+    if not len(bf):
+        return vertices, faces
+
+    bf = bf + len(vertices)
+
+    # merge vertices on the same position so that boundary pieces share vertices with interior cells.
+    # the tolerance allows for the float32 precision of the tessellator.
+    vertices = np.concatenate([vertices, bv])
+    tol = min(xres, yres) * 1e-3
+    keys = np.round(vertices[:, :2] / tol).astype(np.int64)
+    _, index, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+
+    faces = inverse.ravel()[np.concatenate([faces, bf])]
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+    logger.debug(f"Clipped grid mesh: {np.count_nonzero(inside)} inside cells, {len(pieces)} boundary pieces")
+    return vertices[index], faces
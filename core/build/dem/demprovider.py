@@ -2,9 +2,11 @@
 # (C) 2014 Minoru Akagi
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import copy
+import os
 import struct
 from math import floor
-from osgeo import gdal
+from osgeo import gdal, osr
 from qgis.core import QgsPointXY
 
 try:
@@ -12,12 +14,22 @@ try:
 except ImportError:
     numpy = None
 
+from .block_worker import readWarpedVRTWindow
+from .warpcache import MIN_CACHED_PIXELS, warpCache
+from ....conf import DEM_BUILD_OVERVIEWS
 from ...geometry import GridGeometry
 from ...mapextent import MapExtent, GridRectangle
 from ....utils.logging import logger
 
 NODATA_VALUE = -3.4e38
 
+MAX_WINDOW_SIZE = 2048      # max width/height of a window read at once by readValuesAt()
+MIN_OVERVIEW_SOURCE_PIXELS = 2048 * 2048    # overviews are not built for smaller DEMs
+
+# tile classes returned by GDALDEMProvider.classifyTiles()
+TILE_EMPTY = 0          # no valid values
+TILE_PARTIAL = 1        # some values are no data
+TILE_FULL = 2           # all values are valid
 
 class GDALDEMProvider:
 
@@ -40,6 +52,23 @@ class GDALDEMProvider:
         self.width = self.ds.RasterXSize
         self.height = self.ds.RasterYSize
 
+        self._samplingGrid = None
+        self._sameCRS = None
+
+        # warped VRT reader mode
+        self._vrtMode = False
+
+        # warped VRTs and overviews built by this provider, which are shared with clones.
+        # resampling algorithm -> VRT dataset, decimation factor -> overview dataset
+        self._vrts = {}
+        self._overviews = {}
+
+        # source file modification time, which is a part of the key of cached arrays
+        try:
+            self._mtime = os.path.getmtime(filename)
+        except (OSError, TypeError):
+            self._mtime = None      # not a local file
+
         self._opts = {
             "format": "MEM",
             "dstSRS": self.dest_wkt,
@@ -62,6 +91,47 @@ class GDALDEMProvider:
     def setResampleAlg(self, alg):
         self._opts["resampleAlg"] = alg
 
+    def setWarpedVRTMode(self, enabled):
+        """Enable or disable warped VRT reader mode.
+
+        In this mode, a warped VRT that covers the whole layer in the destination CRS is built once
+        and each block is read as a window of it, instead of warping the source for every block.
+        It is efficient when many blocks are read from the same source.
+        """
+        self._vrtMode = bool(enabled)
+
+    def clone(self):
+        """Return a provider that shares the dataset handle, warped VRTs and overviews with this provider,
+        and has its own read options."""
+        p = copy.copy(self)
+        p._opts = dict(self._opts)
+        return p
+
+    def warpSource(self, width, height, gt):
+        """Return a picklable description of how a block is read, for `block_worker.warpArray()`.
+
+        The block is read from the same overview, in the same reader mode and stored in the same DEM cache
+        file as `readAsArray()` does. Returns None if the block cannot be read in a worker process in the same
+        way, which is when the overview is not stored in a file, or the array is already in the DEM cache.
+        """
+        src_ds, factor, useVRT, cache, key = self._readPlan(width, height, gt)
+
+        if cache and os.path.exists(cache.path(key)):
+            return None
+
+        filename = self.filename
+        if factor != 1:
+            filename = src_ds.GetDescription()
+            if not os.path.isfile(filename):
+                return None
+
+        return {
+            "filename": filename,
+            "opts": {k: v for k, v in self._opts.items() if k not in ("width", "height", "outputBounds")},
+            "vrt": self._vrtOptions() if useVRT else None,
+            "cachePath": cache.path(key) if cache else None
+        }
+
     def extent(self):
         gt = self.ds.GetGeoTransform()
         width = gt[1] * self.width
@@ -74,21 +144,98 @@ class GDALDEMProvider:
     def gridRectangle(self):
         return GridRectangle.fromGeotransform(self.ds.GetGeoTransform(), self.width, self.height)
 
+    def classifyTiles(self, ulx, uly, segments, columns, rows):
+        """Classify tiles aligned with the source pixels by whether they have valid values.
+
+        The tiles are laid out from the pixel whose upper-left corner is at (ulx, uly), and each tile
+        has `segments` + 1 pixels on each side, which are shared with neighboring tiles. A tile that has
+        valid values only on its right or bottom edge is classified as empty, since it has no triangles.
+
+        Returns:
+            2D numpy.ndarray of TILE_EMPTY, TILE_PARTIAL or TILE_FULL for (rows, columns) of tiles,
+            or None if the DEM has no nodata value (all tiles are full).
+        """
+        if self.nodata is None or numpy is None:
+            return None
+
+        gt = self.ds.GetGeoTransform()
+        xoff = round((ulx - gt[0]) / gt[1])
+        yoff = round((uly - gt[3]) / gt[5])
+
+        classes = numpy.full((rows, columns), TILE_EMPTY, dtype=numpy.int8)
+
+        # pixel range of the tile grid that is inside the dataset
+        width = columns * segments + 1
+        x0, x1 = max(xoff, 0), min(xoff + width, self.width)
+        if x0 >= x1:
+            return classes
+
+        mask = self.ds.GetRasterBand(1).GetMaskBand()
+
+        # read the mask in strips of a row of tiles. pixels outside the dataset are not valid,
+        # so tiles that extend past the dataset are not full
+        for row in range(rows):
+            y = yoff + row * segments
+            y0, y1 = max(y, 0), min(y + segments + 1, self.height)
+            if y0 >= y1:
+                continue
+
+            valid = numpy.zeros((segments + 1, width), dtype=bool)
+            valid[y0 - y:y1 - y, x0 - xoff:x1 - xoff] = mask.ReadAsArray(x0, y0, x1 - x0, y1 - y0) != 0
+
+            # excluding the shared right and bottom edges
+            anyValid = valid[:segments, :-1].reshape(segments, columns, segments).any(axis=(0, 2))
+
+            colAll = valid.all(axis=0)
+            allValid = colAll[:-1].reshape(columns, segments).all(axis=1) & colAll[segments::segments]
+
+            classes[row] = numpy.where(allValid, TILE_FULL, numpy.where(anyValid, TILE_PARTIAL, TILE_EMPTY))
+
+        return classes
+
+    def _readPlan(self, width, height, gt):
+        """Return (dataset to warp, decimation factor, whether to read from the warped VRT, DEM cache, cache key).
+
+        The cache and the key are None if the array is not cached."""
+        src_ds, factor = self._sourceDataset(gt)
+        useVRT = self._vrtMode and numpy is not None and gt[2] == 0 and gt[4] == 0 and factor == 1
+
+        cache = warpCache() if self._mtime is not None and width * height >= MIN_CACHED_PIXELS else None
+        if cache is None:
+            return src_ds, factor, useVRT, None, None
+
+        key = cache.key(self.filename, self._mtime, self.source_wkt, self.dest_wkt,
+                        self._opts.get("srcNodata"), list(gt), width, height, self._opts["resampleAlg"],
+                        "vrt" if useVRT else "warp", factor)
+        return src_ds, factor, useVRT, cache, key
+
     def _read(self, width, height, gt, asList=False, asNumpyArray=False):
-        self._opts["width"] = width
-        self._opts["height"] = height
-        self._opts["outputBounds"] = [gt[0], gt[3] + gt[5] * height, gt[0] + gt[1] * width, gt[3]]
+        src_ds, factor, useVRT, cache, key = self._readPlan(width, height, gt)
+        arr = cache.get(key) if cache else None
 
-        warped_ds = gdal.Warp("", self.ds, **self._opts)
-        band = warped_ds.GetRasterBand(1)
+        if arr is None:
+            if useVRT:
+                arr = self._readWarpedVRT(width, height, gt)
 
-        if numpy is None:
-            ba = band.ReadRaster(0, 0, width, height, buf_type=gdal.GDT_Float32)
-            if asList:
-                return struct.unpack("f" * width * height, ba)
-            return ba
+            if arr is None:
+                self._opts["width"] = width
+                self._opts["height"] = height
+                self._opts["outputBounds"] = [gt[0], gt[3] + gt[5] * height, gt[0] + gt[1] * width, gt[3]]
+
+                warped_ds = gdal.Warp("", src_ds, **self._opts)
+                band = warped_ds.GetRasterBand(1)
+
+                if numpy is None:
+                    ba = band.ReadRaster(0, 0, width, height, buf_type=gdal.GDT_Float32)
+                    if asList:
+                        return struct.unpack("f" * width * height, ba)
+                    return ba
+
+                arr = band.ReadAsArray()
+
+            if cache:
+                cache.put(key, arr)
 
-        arr = band.ReadAsArray()
         if asNumpyArray:
             return arr
 
@@ -97,11 +244,133 @@ class GDALDEMProvider:
 
         return arr.tobytes()
 
+    def _sourceDataset(self, gt):
+        """Return a dataset to warp for a block with given geotransform and its decimation factor.
+
+        If the block is much coarser than the DEM and the DEM has no overviews, an overview whose
+        resolution is closest to but not coarser than the block resolution is returned. Overviews are
+        built on first use by averaging pixels, and are persisted in the DEM cache directory if possible.
+        If the DEM has its own overviews, GDAL selects one of them when warping.
+        """
+        if not DEM_BUILD_OVERVIEWS or self.width * self.height < MIN_OVERVIEW_SOURCE_PIXELS \
+                or self.ds.GetRasterBand(1).GetOverviewCount():
+            return self.ds, 1
+
+        (xres, yres), _ = self._pointSamplingGrid()
+        ratio = min(abs(gt[1]) / xres, abs(gt[5]) / yres)
+
+        factor = 1
+        while factor * 2 <= ratio and min(self.width, self.height) // (factor * 2) >= 2:
+            factor *= 2
+
+        if factor == 1:
+            return self.ds, 1
+
+        ds = self._overview(factor)
+        if ds is None:
+            return self.ds, 1
+        return ds, factor
+
+    def _overview(self, factor):
+        """Return an overview dataset of which pixels are `factor` times larger than the source pixels."""
+        if factor in self._overviews:
+            return self._overviews[factor]
+
+        # build from the next finer level
+        src_ds = self._overview(factor // 2) if factor > 2 else self.ds
+        if src_ds is None:
+            return None
+
+        opts = {
+            "width": -(-self.width // factor),
+            "height": -(-self.height // factor),
+            "outputType": gdal.GDT_Float32,
+            "resampleAlg": "average"
+        }
+
+        cache = warpCache() if self._mtime is not None else None
+        if cache:
+            key = cache.key("overview", self.filename, self._mtime, self.source_wkt, self._opts.get("srcNodata"), factor)
+            path = cache.path(key, ".tif")
+            if os.path.exists(path):
+                ds = gdal.Open(path, gdal.GA_ReadOnly)
+                if ds is not None:
+                    os.utime(path)      # mark as recently used
+                    self._overviews[factor] = ds
+                    return ds
+
+            temp_path = f"{path}.{os.getpid()}.{id(self)}.tmp"
+            temp_ds = gdal.Translate(temp_path, src_ds, format="GTiff",
+                                     creationOptions=["TILED=YES", "COMPRESS=DEFLATE", "PREDICTOR=3"], **opts)
+            if temp_ds is not None:
+                temp_ds = None      # close to flush
+                try:
+                    os.replace(temp_path, path)
+                    ds = gdal.Open(path, gdal.GA_ReadOnly)
+                    cache.track(path)
+                except OSError as e:
+                    logger.warning(f"Failed to write DEM overview file: {e}")
+
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        else:
+            ds = gdal.Translate("", src_ds, format="MEM", **opts)
+
+        if ds is None:
+            logger.warning(f"Failed to build an overview of {self.filename}. The DEM is read at full resolution.")
+            self._overviews[factor] = None
+            return None
+
+        logger.debug(f"Built an overview of {self.filename} (1/{factor})")
+        self._overviews[factor] = ds
+        return ds
+
+    def _vrtOptions(self):
+        """Return gdal.Warp options to create a warped VRT that covers the whole layer in the destination CRS."""
+        opts = {k: v for k, v in self._opts.items() if k not in ("format", "width", "height", "outputBounds")}
+        opts["format"] = "VRT"
+
+        if self._isSameCRS():
+            # keep the source grid
+            gt = self.ds.GetGeoTransform()
+            opts["width"] = self.width
+            opts["height"] = self.height
+            opts["outputBounds"] = [gt[0], gt[3] + gt[5] * self.height, gt[0] + gt[1] * self.width, gt[3]]
+
+        return opts
+
+    def _warpedVRT(self):
+        """Return a warped VRT dataset that covers the whole layer in the destination CRS,
+        or None if it cannot be created."""
+        alg = self._opts["resampleAlg"]
+        if alg in self._vrts:
+            return self._vrts[alg]
+
+        vrt = self._vrts[alg] = gdal.Warp("", self.ds, **self._vrtOptions())
+        if vrt is None:
+            logger.warning(f"Failed to create a warped VRT for {self.filename}. Each block is warped separately.")
+            self._vrtMode = False
+
+        return vrt
+
+    def _readWarpedVRT(self, width, height, gt):
+        """Read a block as a window of the warped VRT.
+
+        Returns:
+            numpy.ndarray (float32), or None if the block extends beyond the VRT.
+        """
+        vrt = self._warpedVRT()
+        if vrt is None:
+            return None
+
+        return readWarpedVRTWindow(vrt, width, height, gt, self._opts["resampleAlg"], self.nodata)
+
     def read(self, width, height, extent):
         """read data into a byte array"""
         return self._read(width, height, extent.geotransform(width, height))
 
     def readAsArray(self, width, height, extent):
+        """read data into a numpy array. The array can be read-only."""
         return self._read(width, height, extent.geotransform(width, height), asNumpyArray=True)
 
     def readValues(self, width, height, extent):
@@ -119,6 +388,83 @@ class GDALDEMProvider:
         geotransform = [x - res / 2, res, 0, y + res / 2, 0, -res]
         return self._read(1, 1, geotransform, asList=True)[0]
 
+    def readValuesAt(self, xs, ys):
+        """Get values at multiple positions.
+
+        Points are grouped into windows aligned to the DEM pixels. Each window is warped once and
+        values are interpolated bilinearly with NumPy.
+
+        Args:
+            xs: Sequence of x coordinates in the destination CRS.
+            ys: Sequence of y coordinates in the destination CRS.
+
+        Returns:
+            numpy.ndarray (float64) of values. A list if NumPy is not available.
+        """
+        if numpy is None:
+            return [self.readValue(x, y) for x, y in zip(xs, ys)]
+
+        xs = numpy.asarray(xs, dtype=numpy.float64)
+        ys = numpy.asarray(ys, dtype=numpy.float64)
+        values = numpy.empty(len(xs), dtype=numpy.float64)
+
+        if len(xs) == 0:
+            return values
+
+        (xres, yres), origin = self._pointSamplingGrid()
+        for idx, gt, width, height in pointWindows(xs, ys, xres, yres, origin):
+            arr = self._read(width, height, gt, asNumpyArray=True)
+            values[idx] = interpolateBilinear(arr, gt, xs[idx], ys[idx], self.nodata)
+
+        return values
+
+    def _pointSamplingGrid(self):
+        """Return pixel size in the destination CRS and the coordinates of a pixel center
+        that windows for point sampling are aligned to (None if the CRS differs from the source CRS)."""
+        if self._samplingGrid is not None:
+            return self._samplingGrid
+
+        gt = self.ds.GetGeoTransform()
+        xres, yres = abs(gt[1]), abs(gt[5])
+        origin = None
+
+        if self._isSameCRS():
+            # pixel centers of windows coincide with the source pixel centers
+            origin = (gt[0] + gt[1] / 2, gt[3] + gt[5] / 2)
+
+        else:
+            # approximate pixel size in the destination CRS at the center of the DEM
+            src_srs, dest_srs = self._srsPair()
+            src_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+            dest_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+            ct = osr.CoordinateTransformation(src_srs, dest_srs)
+
+            cx = gt[0] + gt[1] * self.width / 2
+            cy = gt[3] + gt[5] * self.height / 2
+            try:
+                x0, y0, _ = ct.TransformPoint(cx, cy)
+                x1, y1, _ = ct.TransformPoint(cx + gt[1], cy + gt[5])
+                xres, yres = abs(x1 - x0), abs(y1 - y0)
+            except RuntimeError:
+                logger.warning("Failed to calculate pixel size of the DEM in the destination CRS.")
+
+        self._samplingGrid = ((xres, yres), origin)
+        return self._samplingGrid
+
+    def _srsPair(self):
+        src_srs = osr.SpatialReference()
+        src_srs.ImportFromWkt(self.source_wkt or self.ds.GetProjection())
+        dest_srs = osr.SpatialReference()
+        dest_srs.ImportFromWkt(self.dest_wkt)
+        return src_srs, dest_srs
+
+    def _isSameCRS(self):
+        """Return True if the source CRS is the same as the destination CRS or is unknown."""
+        if self._sameCRS is None:
+            src_srs, dest_srs = self._srsPair()
+            self._sameCRS = bool(not src_srs.ExportToWkt() or src_srs.IsSame(dest_srs))
+        return self._sameCRS
+
     def readValueOnTriangles(self, x, y, xmin, ymin, xres, yres):
         mx0 = floor((x - xmin) / xres)
         my0 = floor((y - ymin) / yres)
@@ -163,5 +509,90 @@ class FlatDEMProvider:
     def readValue(self, x, y):
         return self.value
 
+    def readValuesAt(self, xs, ys):
+        if numpy is None:
+            return [self.value] * len(xs)
+        return numpy.full(len(xs), self.value, dtype=numpy.float64)
+
     def setResampleAlg(self, _alg):
         pass
+
+
+def pointWindows(xs, ys, xres, yres, origin=None, max_size=MAX_WINDOW_SIZE):
+    """Divide points into windows each of which can be read with a single raster read.
+
+    Args:
+        xs, ys: numpy.ndarray of point coordinates.
+        xres, yres: Pixel size of windows.
+        origin: Coordinates of a pixel center that windows are aligned to. If None, the upper-left corner of
+            the bounding box of the points is used.
+        max_size: Max number of pixels in a window side.
+
+    Yields:
+        (indices, geotransform, width, height) for each window. Every point in a window has the four
+        surrounding pixel centers inside the window.
+    """
+    ox, oy = origin if origin else (xs.min(), ys.max())
+
+    # column and row of the pixel center to the upper-left of each point
+    cols = numpy.floor((xs - ox) / xres).astype(numpy.int64)
+    rows = numpy.floor((oy - ys) / yres).astype(numpy.int64)
+
+    step = max(max_size - 1, 1)
+    wcols = (cols - cols.min()) // step
+    wrows = (rows - rows.min()) // step
+    keys = wrows * (int(wcols.max()) + 1) + wcols
+
+    order = numpy.argsort(keys, kind="stable")
+    _, starts = numpy.unique(keys[order], return_index=True)
+
+    for idx in numpy.split(order, starts[1:]):
+        c0, c1 = int(cols[idx].min()), int(cols[idx].max()) + 1
+        r0, r1 = int(rows[idx].min()), int(rows[idx].max()) + 1
+
+        gt = [ox + (c0 - 0.5) * xres, xres, 0, oy - (r0 - 0.5) * yres, 0, -yres]
+        yield idx, gt, c1 - c0 + 1, r1 - r0 + 1
+
+
+def interpolateBilinear(arr, gt, xs, ys, nodata=None):
+    """Interpolate grid values at given points bilinearly.
+
+    Pixels with the nodata value are excluded from interpolation and the weights of the remaining
+    pixels are renormalized. If all four surrounding pixels are nodata, the value is nodata.
+
+    Args:
+        arr: 2D numpy.ndarray of grid values.
+        gt: Geotransform of the grid (without rotation).
+        xs, ys: numpy.ndarray of point coordinates.
+        nodata: No data value.
+
+    Returns:
+        numpy.ndarray (float64) of interpolated values.
+    """
+    rows, cols = arr.shape
+
+    fx = numpy.clip((xs - gt[0]) / gt[1] - 0.5, 0, cols - 1)
+    fy = numpy.clip((ys - gt[3]) / gt[5] - 0.5, 0, rows - 1)
+
+    c0 = numpy.minimum(fx.astype(numpy.int64), max(cols - 2, 0))
+    r0 = numpy.minimum(fy.astype(numpy.int64), max(rows - 2, 0))
+    c1 = numpy.minimum(c0 + 1, cols - 1)
+    r1 = numpy.minimum(r0 + 1, rows - 1)
+
+    dx = fx - c0
+    dy = fy - r0
+
+    z = numpy.stack([arr[r0, c0], arr[r0, c1], arr[r1, c0], arr[r1, c1]])
+    w = numpy.stack([(1 - dx) * (1 - dy), dx * (1 - dy), (1 - dx) * dy, dx * dy])
+
+    if nodata is None:
+        return (z * w).sum(axis=0)
+
+    valid = z != nodata
+    w[~valid] = 0
+    wsum = w.sum(axis=0)
+
+    values = numpy.full(len(xs), nodata, dtype=numpy.float64)
+    ok = wsum > 0
+    values[ok] = (numpy.where(valid, z, 0) * w).sum(axis=0)[ok] / wsum[ok]
+    return values
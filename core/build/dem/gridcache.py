@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Minoru Akagi
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import os
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+from .demprovider import GDALDEMProvider, interpolateBilinear
+from ...geometry import GridGeometry
+from ....conf import DEM_GRID_CACHE_MAX_SIZE
+from ....utils.logging import logger
+
+
+_gridCache = None
+
+
+def gridCache():
+    """Return the DEM grid cache of this process."""
+    global _gridCache
+    if _gridCache is None or _gridCache.pid != os.getpid():
+        _gridCache = DEMGridCache(DEM_GRID_CACHE_MAX_SIZE * 1024 * 1024)
+    return _gridCache
+
+
+class DEMGridCache:
+    """In-memory cache of DEM grids read in a scene build.
+
+    A DEM layer, polygon layers overlaid on it and vector layers whose heights are relative to it
+    read values of the same DEM over the same extent. Grids are keyed by DEM layer id, the source
+    and read options of the provider, the extent and the grid size, and all of them get the same
+    read-only array. The cache is cleared at the start of each scene build. In preview, grids are
+    kept while layers are rebuilt, and a grid of a changed extent or source is simply not hit.
+    Grids of providers other than `GDALDEMProvider` are not cached.
+    """
+
+    def __init__(self, maxSize):
+        """
+        Args:
+            maxSize: Max total size of cached grids in bytes.
+        """
+        self.pid = os.getpid()
+        self.maxSize = maxSize
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = Lock()
+        self._grids = OrderedDict()     # key -> (extent, array)
+        self._size = 0
+
+    @staticmethod
+    def sourceKey(provider):
+        return (provider.filename, provider._mtime, provider.dest_wkt, provider.source_wkt)
+
+    @classmethod
+    def key(cls, layerId, provider, width, height, extent):
+        """Return a cache key, or None if grids of the provider are not cached."""
+        if not isinstance(provider, GDALDEMProvider):
+            return None
+
+        c = extent.center()
+        return (layerId, cls.sourceKey(provider), provider._opts["resampleAlg"],
+                (c.x(), c.y(), extent.width(), extent.height(), extent.rotation()), width, height)
+
+    def contains(self, layerId, provider, width, height, extent):
+        key = self.key(layerId, provider, width, height, extent)
+        with self._lock:
+            return key in self._grids
+
+    def readAsArray(self, layerId, provider, width, height, extent):
+        """Return a read-only 2D numpy.ndarray of DEM values, reading it with the provider if it is not cached."""
+        key = self.key(layerId, provider, width, height, extent)
+        if key is None:
+            return provider.readAsArray(width, height, extent)
+
+        with self._lock:
+            entry = self._grids.get(key)
+            if entry:
+                self._grids.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+
+        arr = provider.readAsArray(width, height, extent)
+        if arr.flags.writeable:
+            arr.flags.writeable = False
+
+        self._put(key, extent, arr)
+        return arr
+
+    def readAsGridGeometry(self, layerId, provider, width, height, extent):
+        """Return a grid geometry whose values are the cached array."""
+        if self.key(layerId, provider, width, height, extent) is None:
+            return provider.readAsGridGeometry(width, height, extent)
+
+        arr = self.readAsArray(layerId, provider, width, height, extent)
+        return GridGeometry(extent, width - 1, height - 1, arr.ravel())
+
+    def valuesAt(self, layerId, provider, xs, ys):
+        """Get values at multiple positions.
+
+        Values are interpolated bilinearly in the finest cached grid of the DEM layer that covers all
+        the positions and is not coarser than the DEM. If there is no such grid, the values are read
+        with `provider.readValuesAt()`.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+
+        grid = self._coveringGrid(layerId, provider, xs, ys) if len(xs) else None
+        if grid is None:
+            return provider.readValuesAt(xs, ys)
+
+        extent, arr = grid
+        rows, cols = arr.shape
+        return interpolateBilinear(arr, extent.geotransform(cols, rows), xs, ys, provider.nodata)
+
+    def _coveringGrid(self, layerId, provider, xs, ys):
+        if not isinstance(provider, GDALDEMProvider):
+            return None
+
+        (xres, yres), _ = provider._pointSamplingGrid()
+        xmin, xmax, ymin, ymax = xs.min(), xs.max(), ys.min(), ys.max()
+        sourceKey = self.sourceKey(provider)
+
+        best = None
+        with self._lock:
+            for key, (extent, arr) in self._grids.items():
+                if key[0] != layerId or key[1] != sourceKey or extent.rotation():
+                    continue
+
+                rows, cols = arr.shape
+                gxres, gyres = extent.width() / (cols - 1), extent.height() / (rows - 1)
+                if gxres > xres or gyres > yres:
+                    continue
+
+                r = extent.unrotatedRect()
+                if xmin < r.xMinimum() or r.xMaximum() < xmax or ymin < r.yMinimum() or r.yMaximum() < ymax:
+                    continue
+
+                if best is None or gxres < best[0]:
+                    best = (gxres, extent, arr)
+
+        return best[1:] if best else None
+
+    def _put(self, key, extent, arr):
+        if arr.nbytes > self.maxSize:
+            return
+
+        with self._lock:
+            if key in self._grids:
+                return
+
+            self._grids[key] = (extent, arr)
+            self._size += arr.nbytes
+
+            while self._size > self.maxSize:
+                _, (_, old) = self._grids.popitem(last=False)
+                self._size -= old.nbytes
+
+    def clear(self):
+        with self._lock:
+            if self._grids:
+                logger.debug(f"DEM grid cache: {len(self._grids)} grids, {self._size / 1024 / 1024:.1f} MB, "
+                             f"{self.hits} hits, {self.misses} misses")
+
+            self._grids.clear()
+            self._size = 0
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"count": len(self._grids), "size": self._size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Minoru Akagi
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock
+
+from .gridcache import gridCache
+from .providerpool import providerPool
+from ....utils.logging import logger
+
+
+_pool = None
+_poolSize = 0
+_poolLock = Lock()
+
+
+def threadPool(threads):
+    """Return the shared thread pool for DEM reads that has at least `threads` threads."""
+    global _pool, _poolSize
+    with _poolLock:
+        if _pool is None or _poolSize < threads:
+            # the previous pool is not shut down since other threads can still be using it.
+            # its threads exit after it is released and its queued work is done.
+            _pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="DEMRead")
+            _poolSize = threads
+        return _pool
+
+
+class DEMReadPrefetcher:
+    """Reads grids of upcoming DEM blocks in background threads.
+
+    GDAL releases the GIL while it warps rasters, so reading grids of the next blocks overlaps
+    with encoding of the current block and emission of its data. At most `depth` reads are in flight
+    or waiting to be taken at a time. GDAL dataset handles must not be shared between threads, so
+    each thread reads with its own provider from the provider pool, with the same read options as
+    the provider of the layer.
+    """
+
+    def __init__(self, layerId, provider, depth, useGridCache=False):
+        """
+        Args:
+            layerId: DEM layer id.
+            provider: GDALDEMProvider of the layer.
+            depth: Max number of reads in flight.
+            useGridCache: Whether grids are read through the DEM grid cache.
+        """
+        self.layerId = layerId
+        self.provider = provider
+        self.depth = depth
+        self.useGridCache = useGridCache
+
+        self._scheduled = deque()       # (key, width, height, extent)
+        self._futures = {}              # key -> future
+        self.hits = 0
+
+    @staticmethod
+    def key(width, height, extent):
+        c = extent.center()
+        return (width, height, c.x(), c.y(), extent.width(), extent.height(), extent.rotation())
+
+    def schedule(self, reads):
+        """Schedule reads in the order the blocks are built.
+
+        Args:
+            reads: Iterable of (width, height, extent).
+        """
+        for width, height, extent in reads:
+            self._scheduled.append((self.key(width, height, extent), width, height, extent))
+        self._fill()
+
+    def readAsArray(self, width, height, extent):
+        """Return a prefetched grid, or read it now if it has not been scheduled."""
+        future = self._futures.pop(self.key(width, height, extent), None)
+        self._fill()
+
+        if future is None:
+            return self._read(self.provider, width, height, extent)
+
+        self.hits += 1
+        return future.result()
+
+    def close(self):
+        """Cancel reads that have not started yet and wait for running reads to finish."""
+        self._scheduled.clear()
+
+        futures = list(self._futures.values())
+        self._futures.clear()
+
+        for future in futures:
+            future.cancel()
+        wait(futures)
+
+        logger.debug(f"DEM read prefetch: {self.hits} hits, {len(futures)} reads drained")
+
+    def _fill(self):
+        while self._scheduled and len(self._futures) < self.depth:
+            key, width, height, extent = self._scheduled.popleft()
+            if key not in self._futures:
+                self._futures[key] = threadPool(self.depth).submit(self._readInThread, width, height, extent)
+
+    def _readInThread(self, width, height, extent):
+        p = self.provider
+        provider = providerPool().get(self.layerId, p.filename, p.dest_wkt, source_wkt=p.source_wkt)
+        provider.setResampleAlg(p._opts["resampleAlg"])
+        provider.setWarpedVRTMode(p._vrtMode)
+        return self._read(provider, width, height, extent)
+
+    def _read(self, provider, width, height, extent):
+        if self.useGridCache:
+            return gridCache().readAsArray(self.layerId, provider, width, height, extent)
+        return provider.readAsArray(width, height, extent)
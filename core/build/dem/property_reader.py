@@ -5,10 +5,20 @@
 from qgis.PyQt.QtCore import QSize
 
 from ....conf import DEF_SETS
+from ....utils.basic import parseFloat
 
 
 class DEMPropertyReader:
 
+    @staticmethod
+    def adaptiveMeshMaxError(properties):
+        """Return max vertical error of adaptive mesh, or None if adaptive mesh is not used."""
+        if not properties.get("checkBox_AdaptiveMesh") or properties.get("radioButton_OriginalValues") \
+                or properties.get("radioButton_ClipPolygon"):
+            return None
+
+        return max(parseFloat(properties.get("lineEdit_MaxError"), DEF_SETS.MAX_ERROR), 0)
+
     @staticmethod
     def opacity(mtlProperties):
         return mtlProperties.get("spinBox_Opacity", 100) / 100
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Minoru Akagi
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import os
+import threading
+
+from .demprovider import GDALDEMProvider
+from ....utils.logging import logger
+
+
+_providerPool = None
+
+
+def providerPool():
+    """Return the pool of GDAL DEM providers of this process."""
+    global _providerPool
+    if _providerPool is None or _providerPool.pid != os.getpid():
+        _providerPool = DEMProviderPool()
+    return _providerPool
+
+
+class DEMProviderPool:
+    """Pool of GDAL DEM providers keyed by layer id.
+
+    GDAL dataset handles must not be used from multiple threads at the same time, so each thread
+    has its own providers. A pooled provider is reused while the source path, the CRSs and the
+    modification time of the source file are unchanged, and `get()` returns a clone of it that
+    shares the dataset handle, warped VRTs and overviews but has its own read options.
+    Providers keep their source files open, so they are released with `release()` when a scene is
+    built and when a layer is removed or its data source or CRS changes.
+    Worker processes open their own datasets (see `block_worker.warpArray()`).
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+
+        self._lock = threading.Lock()
+        self._providers = {}        # (thread id, layer id) -> (signature, provider)
+
+    def get(self, layerId, source, dest_wkt, source_wkt=None):
+        """Return a provider for a layer."""
+        try:
+            mtime = os.path.getmtime(source)
+        except (OSError, TypeError, ValueError):
+            mtime = None        # not a local file
+
+        signature = (source, dest_wkt, source_wkt, mtime)
+
+        key = (threading.get_ident(), layerId)
+        with self._lock:
+            entry = self._providers.get(key)
+
+        if entry is None or entry[0] != signature:
+            if entry:
+                logger.debug(f"DEM provider for layer {layerId} is renewed.")
+            entry = (signature, GDALDEMProvider(source, dest_wkt, source_wkt=source_wkt))
+            with self._lock:
+                self._providers[key] = entry
+
+        return entry[1].clone()
+
+    def release(self, layerId=None):
+        """Release providers for a layer, or all providers if layerId is None, in all threads.
+
+        Providers of threads that have finished are also released. Dataset handles are closed
+        when the providers cloned from them are no longer in use.
+        """
+        with self._lock:
+            alive = set(t.ident for t in threading.enumerate())
+            for key in list(self._providers):
+                if layerId is None or key[1] == layerId or key[0] not in alive:
+                    del self._providers[key]
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Minoru Akagi
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+# Adaptive right-triangulated irregular network (RTIN) meshing of a DEM grid.
+# The algorithm is based on Martini (https://github.com/mapbox/martini), but each level of
+# the triangle hierarchy is processed at once with NumPy, and the error of a triangle is measured
+# at all grid points it covers instead of the midpoint of its hypotenuse, so that the error of
+# the mesh is bounded by the max error.
+
+import numpy as np
+
+
+def isRTINSize(size):
+    """Return True if a grid with `size` points on each side can be triangulated (size = 2^k + 1)."""
+    n = size - 1
+    return n > 0 and n & (n - 1) == 0
+
+
+def rtinGridSize(segments):
+    """Return the smallest power of 2 that is greater than or equal to the number of segments."""
+    return 1 << max(int(segments) - 1, 0).bit_length()
+
+
+def _rootTriangles(n):
+    # triangles are represented with (x, y) of the two ends of the hypotenuse (a, b) and the right-angle vertex (c)
+    a = np.array([[0, 0], [n, n]], dtype=np.int32)
+    b = np.array([[n, n], [0, 0]], dtype=np.int32)
+    c = np.array([[n, 0], [0, n]], dtype=np.int32)
+    return a, b, c
+
+
+def _split(a, b, c):
+    m = (a + b) // 2
+    return np.concatenate([c, b]), np.concatenate([a, c]), np.concatenate([m, m])
+
+
+def _trianglePoints(u, v):
+    """Return offsets from the right-angle vertex and barycentric weights (of a and b) of grid points
+    in a triangle whose legs are `u` (to a) and `v` (to b)."""
+    corners = np.array([[0, 0], u, v])
+    (x0, y0), (x1, y1) = corners.min(axis=0), corners.max(axis=0)
+    d = np.stack(np.mgrid[x0:x1 + 1, y0:y1 + 1], axis=-1).reshape(-1, 2)
+
+    l2 = np.dot(u, u)
+    s = d @ u / l2
+    t = d @ v / l2
+    inside = (s >= 0) & (t >= 0) & (s + t <= 1)
+    return d[inside], s[inside], t[inside]
+
+
+def rtinErrors(z, nodata=None, lockEdges=True):
+    """Calculate the approximation error of each grid point in the triangle hierarchy.
+
+    The error of a triangle is the max vertical error of the grid points it covers, measured
+    against the plane of the triangle. The error of a point is the max error of the triangles
+    that are split at the point and all of their descendants.
+
+    Args:
+        z: Square 2D numpy.ndarray of grid values. The number of points on a side must be 2^k + 1.
+        nodata: No data value. Triangles that cover no data points are always split.
+        lockEdges: If True, points on the grid edges are always used so that the mesh fits to
+            neighboring blocks.
+
+    Returns:
+        1D numpy.ndarray (float64) of errors.
+    """
+    size = z.shape[0]
+    n = size - 1
+    zf = z.astype(np.float64).ravel()
+
+    errors = np.zeros(size * size, dtype=np.float64)
+    if lockEdges:
+        edge = np.zeros((size, size), dtype=bool)
+        edge[[0, -1], :] = edge[:, [0, -1]] = True
+        errors[edge.ravel()] = np.inf
+
+    invalid = (zf == nodata) if nodata is not None else None
+
+    # triangles that can be split, from the largest to the smallest
+    levels = []
+    a, b, c = _rootTriangles(n)
+    while np.abs(a[0] - c[0]).sum() > 1:
+        levels.append((a, b, c))
+        a, b, c = _split(a, b, c)
+
+    index = lambda p: p[..., 1] * size + p[..., 0]
+
+    for i in range(len(levels) - 1, -1, -1):
+        a, b, c = levels[i]
+        ia, ib, ic = index(a), index(b), index(c)
+
+        # triangles of a level are congruent, and those of an orientation (signs of the legs) cover the same offsets
+        legs = np.hstack([a - c, b - c])
+        orientation = (np.sign(legs) + 1) @ np.array([27, 9, 3, 1])
+
+        err = np.empty(len(a), dtype=np.float64)
+        for o in np.unique(orientation):
+            sel = np.nonzero(orientation == o)[0]
+            ux, uy, vx, vy = legs[sel[0]]
+            d, s, t = _trianglePoints((ux, uy), (vx, vy))
+
+            ip = index(c[sel, None, :] + d)
+            za, zb, zc = zf[ia[sel], None], zf[ib[sel], None], zf[ic[sel], None]
+            e = np.abs(zc + s * (za - zc) + t * (zb - zc) - zf[ip]).max(axis=1)
+            if invalid is not None:
+                e[invalid[ip].any(axis=1)] = np.inf
+            err[sel] = e
+
+        if i < len(levels) - 1:
+            # accumulate errors of children
+            err = np.maximum(err, errors[index((a + c) // 2)])
+            err = np.maximum(err, errors[index((b + c) // 2)])
+
+        np.maximum.at(errors, index((a + b) // 2), err)
+
+    return errors
+
+
+def rtinMesh(z, maxError, nodata=None, lockEdges=True):
+    """Triangulate a grid adaptively so that the vertical error does not exceed `maxError`.
+
+    The vertical error is the difference between a grid value and the surface of the triangle that covers
+    the grid point.
+
+    Args:
+        z: Square 2D numpy.ndarray of grid values. The number of points on a side must be 2^k + 1.
+        maxError: Max vertical error.
+        nodata: No data value. Triangles that have no data vertices are removed.
+        lockEdges: If True, all points on the grid edges are used.
+
+    Returns:
+        (points, faces): points is a (N, 2) numpy.ndarray of (row, column) of vertices, and faces is
+        a (M, 3) numpy.ndarray of vertex indices in counter-clockwise order (north up).
+    """
+    size = z.shape[0]
+    if z.shape[1] != size or not isRTINSize(size):
+        raise ValueError(f"Grid size must be 2^k + 1 square: {z.shape}")
+
+    errors = rtinErrors(z, nodata, lockEdges)
+    index = lambda p: p[:, 1] * size + p[:, 0]
+
+    triangles = []
+    a, b, c = _rootTriangles(size - 1)
+    while len(a):
+        split = np.abs(a - c).sum(axis=1) > 1
+        split[split] = errors[index((a[split] + b[split]) // 2)] > maxError
+
+        keep = ~split
+        triangles.append(np.stack([index(a[keep]), index(b[keep]), index(c[keep])], axis=1))
+
+        a, b, c = _split(a[split], b[split], c[split])
+
+    tris = np.concatenate(triangles)
+
+    if nodata is not None:
+        tris = tris[np.all(z.ravel()[tris] != nodata, axis=1)]
+
+    # counter-clockwise in the map coordinates (y axis points up while row index increases downward)
+    rows, cols = np.divmod(tris, size)
+    cross = (cols[:, 1] - cols[:, 0]) * (rows[:, 0] - rows[:, 2]) - (rows[:, 0] - rows[:, 1]) * (cols[:, 2] - cols[:, 0])
+    cw = cross < 0
+    tris[cw] = tris[cw][:, [0, 2, 1]]
+
+    used, faces = np.unique(tris, return_inverse=True)
+    points = np.column_stack(np.divmod(used, size))
+
+    return points, faces.reshape(-1, 3).astype(np.int64)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Minoru Akagi
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import hashlib
+import json
+import os
+import uuid
+from threading import Lock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from ....conf import DEM_CACHE_ENABLED, DEM_CACHE_MAX_SIZE
+from ....utils.basic import cacheDir
+from ....utils.logging import logger
+
+MIN_CACHED_PIXELS = 64 * 64     # smaller reads (e.g. point sampling) are not cached
+CACHE_FILE_EXTS = (".npy", ".tif")
+
+
+_warpCache = None
+
+
+def warpCache():
+    """Return the shared cache of warped DEM arrays, or None if the cache is disabled."""
+    global _warpCache
+    if _warpCache is None and DEM_CACHE_ENABLED and numpy is not None:
+        try:
+            _warpCache = WarpedArrayCache(cacheDir("dem"), DEM_CACHE_MAX_SIZE * 1024 * 1024)
+        except OSError as e:
+            logger.warning(f"DEM cache is disabled: {e}")
+    return _warpCache
+
+
+class WarpedArrayCache:
+    """Content-addressed on-disk cache of warped DEM arrays.
+
+    Each array is stored as a `.npy` file named after the hash of the parameters that were used
+    to produce it, and is loaded with memory mapping. Overviews of DEMs built by `GDALDEMProvider`
+    are stored as GeoTIFF files in the same directory. When the total size of the cache exceeds
+    `maxSize`, least recently used files are removed.
+    """
+
+    def __init__(self, directory, maxSize):
+        """
+        Args:
+            directory: Cache directory. It is created if it does not exist.
+            maxSize: Max total size of cached files in bytes.
+        """
+        self.directory = directory
+        self.maxSize = maxSize
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = Lock()
+        self._size = None       # total size of cached files. calculated on first write.
+
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*items):
+        """Return a cache key for given JSON serializable items."""
+        s = json.dumps(items, separators=(",", ":"), default=str)
+        return hashlib.sha1(s.encode("utf-8"), usedforsecurity=False).hexdigest()
+
+    def path(self, key, ext=".npy"):
+        return os.path.join(self.directory, key + ext)
+
+    def get(self, key):
+        """Return a read-only memory-mapped array for the key, or None if the key is not in the cache."""
+        path = self.path(key)
+        try:
+            arr = numpy.load(path, mmap_mode="r")
+            os.utime(path)      # mark as recently used
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return arr
+
+    def put(self, key, arr):
+        """Store an array in the cache."""
+        path = self.path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                numpy.save(f, numpy.ascontiguousarray(arr, dtype=numpy.float32))
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write DEM cache file: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        self.track(path)
+
+    def track(self, path):
+        """Count a file that has been written to the cache directory in the total size, and remove
+        least recently used files if the total size exceeds the limit."""
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += os.path.getsize(path)
+
+            if self._size > self.maxSize:
+                self._evict()
+
+    def _entries(self):
+        """Yield (path, size, mtime) of cached files."""
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(CACHE_FILE_EXTS):
+                    st = entry.stat()
+                    yield entry.path, st.st_size, st.st_mtime
+
+    def _evict(self):
+        # remove least recently used files until the total size falls below 80% of the limit
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        size = sum(e[1] for e in entries)
+        limit = self.maxSize * 0.8
+
+        for path, fsize, _ in entries:
+            if size <= limit:
+                break
+            try:
+                os.remove(path)
+                size -= fsize
+            except OSError:
+                pass        # in use on Windows
+
+        self._size = size
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in list(self._entries()):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size = None
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": self._size
+            }
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Minoru Akagi
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from ...utils.logging import logger
+
+
+class BlockExecutor:
+    """Executes build tasks and yields their results in the order the tasks were given.
+
+    Tasks that provide a parallel job with `parallelJob()` are executed in worker processes.
+    Other tasks are built in the calling thread. If the number of workers is 0, or worker
+    processes are not available, all tasks are built in the calling thread.
+    """
+
+    def __init__(self, workers=0):
+        """
+        Args:
+            workers: Number of worker processes.
+        """
+        self.workers = workers
+        self._pool = None
+        self._disabled = (workers <= 0)
+
+    def pool(self):
+        if self._pool is None and not self._disabled:
+            executable = pythonExecutable()
+            if executable is None:
+                logger.warning("Python executable not found. Blocks are built in the builder thread.")
+                self._disabled = True
+                return None
+
+            ctx = multiprocessing.get_context("spawn")
+            ctx.set_executable(executable)
+            try:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to start worker processes: {e}")
+                self._disabled = True
+
+        return self._pool
+
+    def run(self, tasks):
+        """Build tasks and yield results in the task order.
+
+        At most twice as many tasks as workers are in flight at a time. When the generator is
+        closed, pending jobs are cancelled.
+        """
+        maxPending = 2 * self.workers
+        pending = deque()       # (future or None, job or result)
+
+        try:
+            for task in tasks:
+                logger.debug("Building a block.")
+
+                job = task.parallelJob() if hasattr(task, "parallelJob") and self.pool() else None
+                if job:
+                    func, args, _ = job
+                    pending.append((self._pool.submit(func, *args), job))
+                else:
+                    pending.append((None, task.build()))
+
+                while pending and (len(pending) > maxPending or pending[0][0] is None or pending[0][0].done()):
+                    yield self._result(*pending.popleft())
+
+            while pending:
+                yield self._result(*pending.popleft())
+
+        finally:
+            for future, _ in pending:
+                if future:
+                    future.cancel()
+
+    def _result(self, future, value):
+        if future is None:
+            return value
+
+        func, args, finalize = value
+        try:
+            result = future.result()
+
+        except BrokenProcessPool as e:
+            logger.warning(f"Worker process pool is broken: {e}. Blocks are built in the builder thread.")
+            self.shutdown()
+            self._disabled = True
+            result = func(*args)
+
+        return finalize(result)
+
+    def shutdown(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def pythonExecutable():
+    """Return the path to the Python interpreter, which differs from `sys.executable` in QGIS on some platforms."""
+    exe = sys.executable
+    if exe and os.path.basename(exe).lower().startswith("python"):
+        return exe
+
+    names = ["pythonw.exe", "python.exe", "python3.exe"] if os.name == "nt" else ["python3", "python"]
+    for d in [sys.exec_prefix, os.path.join(sys.exec_prefix, "bin")]:
+        for name in names:
+            path = os.path.join(d, name)
+            if os.path.isfile(path):
+                return path
+    return None
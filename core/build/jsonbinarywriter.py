@@ -6,30 +6,144 @@ import base64
 import json
 import struct
 import zlib
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import numpy as np
+
+from ...conf import BINARY_CODEC, BINARY_COMPRESSION_LEVEL, BINARY_FILTERS, BINARY_COMPRESSION_THREADS
+
+
+# item size in bytes and numpy type of each container type
+ITEM_TYPES = {
+    "f32": (4, np.float32),
+    "f64": (8, np.float64),
+    "I32": (4, np.uint32),
+    "I16": (2, np.uint16),
+    "q16": (2, np.uint16)
+}
+
+CODECS = ("zlib", "deflate-raw")
+
+# thread pool shared by writers that compress containers concurrently
+_pool = None
+_poolSize = 0
+_poolLock = Lock()
+
+
+def compress(data, codec="zlib", level=-1):
+    """Compress data with a codec that the browser's DecompressionStream supports.
+
+    Args:
+        codec: "zlib" (zlib format, "deflate" in DecompressionStream) or "deflate-raw".
+        level: Compression level. -1 for the default level.
+    """
+    if codec == "zlib":
+        return zlib.compress(data, level)
+
+    if codec == "deflate-raw":
+        c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        return c.compress(data) + c.flush()
+
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def shuffle(data, itemSize):
+    """Transpose bytes so that the n-th bytes of all items are stored contiguously."""
+    if itemSize == 1 or len(data) % itemSize:
+        return data
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, itemSize).T.tobytes()
+
+
+def delta(data, type):
+    """Replace each item with the difference from the previous item. Integer types only."""
+    _, dtype = ITEM_TYPES[type]
+    if not np.issubdtype(dtype, np.integer):
+        raise ValueError(f"Delta filter cannot be applied to {type} data")
+
+    arr = np.frombuffer(data, dtype=np.dtype(dtype).newbyteorder("<"))
+    return np.diff(arr, prepend=arr.dtype.type(0)).tobytes()       # wraps around
+
+
+FILTERS = {
+    "shuffle": lambda data, type: shuffle(data, ITEM_TYPES[type][0]),
+    "delta": delta
+}
 
 
 class BinaryContainer:
+    """Binary data embedded in JSON data.
 
-    def __init__(self, data: bytes, type: str, compress=True):
-        self._data = data
+    The data is not copied. It is filtered and compressed on the first call of `data()`, and
+    the result is cached, so the source data must not be modified after the container is created.
+    """
+
+    def __init__(self, data, type: str, compress=True, params=None, codec=None, level=None, filters=None):
+        """
+        Args:
+            data: Binary data in little-endian. Any object that supports the buffer protocol.
+                A numpy.ndarray is converted to the item type of the container if necessary.
+            type: Container type. "f32", "f64", "I32", "I16" or "q16".
+            compress: Whether to compress the data.
+            params: Type specific parameters to decode the data.
+            codec: Compression codec. See `compress()`. Defaults to BINARY_CODEC in conf.py.
+            level: Compression level. Defaults to BINARY_COMPRESSION_LEVEL in conf.py.
+            filters: List of filter names applied to the data in order before compression.
+                Defaults to the filters for the type in BINARY_FILTERS in conf.py.
+        """
+        if isinstance(data, np.ndarray):
+            data = np.ascontiguousarray(data, dtype=np.dtype(ITEM_TYPES[type][1]).newbyteorder("<"))
+
+        self._data = memoryview(data).cast("B")
+        self._encoded = None
         self.type = type
-        self.compress = compress
+        self.params = params
+
+        self.codec = codec or BINARY_CODEC
+        self.compress = compress and self.codec != "none"
+        self.level = BINARY_COMPRESSION_LEVEL if level is None else level
+        self.filters = (BINARY_FILTERS.get(type, []) if filters is None else filters) if self.compress else []
 
     def data(self):
-        return zlib.compress(self._data) if self.compress else self._data
+        """Return filtered and compressed data. The result is cached."""
+        if self._encoded is None:
+            data = self._data
+            for name in self.filters:
+                data = FILTERS[name](data, self.type)
+
+            self._encoded = compress(data, self.codec, self.level) if self.compress else data
+            self._data = None       # release the source data
+
+        return self._encoded
+
+    def isEncoded(self):
+        return self._encoded is not None
+
+    def metadata(self):
+        """Return metadata required to decode the data."""
+        d = {
+            "__type__": self.type,
+            "compressed": self.compress
+        }
+        if self.compress and self.codec != "zlib":
+            d["codec"] = self.codec
+        if self.filters:
+            d["filters"] = list(self.filters)
+        if self.params:
+            d["params"] = self.params
+        return d
 
     def toBase64(self):
         return base64.b64encode(self.data()).decode("ascii")
 
     def toJSONCompatible(self):
-        return {
-            "__type__": self.type,
-            "compressed": self.compress,
-            "data": self.toBase64()
-        }
+        d = self.metadata()
+        d["data"] = self.toBase64()
+        return d
 
     def __repr__(self):
-        return f"BinaryContainer(type={self.type}, compress={self.compress}, size={len(self.data())})"
+        size = f"size={len(self._encoded)}" if self._encoded is not None else f"source_size={len(self._data)}"
+        return f"BinaryContainer(type={self.type}, compress={self.compress}, {size})"
 
     @classmethod
     def fromFloat(cls, value, compress=False):
@@ -39,10 +153,40 @@ class BinaryContainer:
 
 class JSONBinaryWriter:
 
-    def __init__(self, data=None):
+    def __init__(self, data=None, threads=None):
+        """
+        Args:
+            data: Data that contains binary containers.
+            threads: Number of threads to compress containers concurrently. If 0 or 1, containers are
+                compressed one by one in the calling thread. Defaults to BINARY_COMPRESSION_THREADS in conf.py.
+        """
         self.data: dict = data or {}
+        self.threads = BINARY_COMPRESSION_THREADS if threads is None else threads
+
+    def containers(self):
+        """Return a list of binary containers in the data."""
+        items = []
+
+        def collect(value):
+            if isinstance(value, BinaryContainer):
+                items.append(value)
+                return value
+
+            return traverse_nested(value, collect)
+
+        collect(self.data)
+        return items
+
+    def encode(self):
+        """Compress containers concurrently in the thread pool. zlib releases the GIL while compressing."""
+        items = [c for c in self.containers() if c.compress and not c.isEncoded()]
+        if self.threads > 1 and len(items) > 1:
+            for _ in threadPool(self.threads).map(BinaryContainer.data, items):
+                pass
 
     def toJSONCompatible(self):
+        self.encode()
+
         def convert(value):
             if isinstance(value, BinaryContainer):
                 return value.toJSONCompatible()
@@ -51,7 +195,14 @@ class JSONBinaryWriter:
 
         return convert(self.data)
 
-    def write(self, filepath):
+    def write(self, filepath, default=None):
+        """Write the data to a file.
+
+        Args:
+            default: Function that returns a serializable version of objects that JSON cannot serialize.
+        """
+        self.encode()
+
         offset = 0
         chunks = []
 
@@ -60,12 +211,9 @@ class JSONBinaryWriter:
 
             if isinstance(value, BinaryContainer):
                 data = value.data()
-                metadata = {
-                    "__type__": value.type,
-                    "offset": offset,
-                    "size": len(data),
-                    "compressed": value.compress
-                }
+                metadata = value.metadata()
+                metadata["offset"] = offset
+                metadata["size"] = len(data)
                 offset += len(data)
                 chunks.append(data)
                 return metadata
@@ -73,7 +221,7 @@ class JSONBinaryWriter:
             return traverse_nested(value, convert)
 
         metadata = convert(self.data)
-        json_bytes = json.dumps(metadata, separators=(",", ":")).encode("ascii")
+        json_bytes = json.dumps(metadata, separators=(",", ":"), default=default).encode("ascii")
 
         with open(filepath, "wb") as f:
             f.write(struct.pack("<I", len(json_bytes)))
@@ -83,6 +231,40 @@ class JSONBinaryWriter:
                 f.write(chunk)
 
 
+def encodeJSONBinary(data, output=None, default=None):
+    """Encode data with binary containers.
+
+    Args:
+        data: Data to encode.
+        output: Tuple of (file path, url) to write the data to. If None, the data is encoded
+            into a JSON compatible object.
+        default: See `JSONBinaryWriter.write()`.
+
+    @returns {object | {url: string}}
+    """
+    jhb = JSONBinaryWriter(data)
+    if output is None:
+        return jhb.toJSONCompatible()
+
+    path, url = output
+    jhb.write(path, default=default)
+    return {
+        "url": url
+    }
+
+
+def threadPool(threads):
+    """Return the shared thread pool that has at least `threads` threads."""
+    global _pool, _poolSize
+    with _poolLock:
+        if _pool is None or _poolSize < threads:
+            # the previous pool is not shut down since other threads can still be using it.
+            # its threads exit after it is released and its queued work is done.
+            _pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="BinaryCompress")
+            _poolSize = threads
+        return _pool
+
+
 def traverse_nested(value, recurse):
     if isinstance(value, dict):
         return {k: recurse(v) for k, v in value.items()}
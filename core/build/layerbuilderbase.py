@@ -36,9 +36,26 @@ class LayerBuilderBase:
         """
         pass
 
-    def buildBlocks(self):
-        for buildTask in self.buildTasks():
-            yield buildTask.build()
+    def buildBlocks(self, executor=None):
+        """Build blocks in order.
+
+        Args:
+            executor: BlockExecutor that builds blocks providing parallel jobs in worker processes.
+                If None, all blocks are built in the calling thread.
+        """
+        if executor is None:
+            for buildTask in self.buildTasks():
+                yield buildTask.build()
+            return
+
+        tasks = self.buildTasks()
+        results = executor.run(tasks)
+        try:
+            yield from results
+        finally:
+            results.close()     # cancel pending jobs
+            if hasattr(tasks, "close"):
+                tasks.close()       # let the layer builder release resources such as pending DEM reads
 
     def blockCount(self):
         """Return the number of blocks in this layer.
@@ -50,6 +67,14 @@ class LayerBuilderBase:
     def buildTasks(self):
         return []
 
+    def buildDataDelta(self):
+        """Return layer data that has been added while blocks were built.
+
+        Used for data such as materials that is collected while blocks are built.
+        Returns a dict of lists to be appended to the layer body.
+        """
+        return {}
+
     def layerProperties(self):
         """Return a dictionary with common layer properties used in export."""
         return {
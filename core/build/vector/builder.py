@@ -4,16 +4,18 @@
 # begin: 2014-01-16
 
 import math
+from functools import partial
 from qgis.core import QgsCoordinateTransform, QgsFeatureRequest
 
 from .feature_block_builder import FeatureBlockBuilder
 from .layer import VectorLayer
 from .object import ObjectType
+from ..dem.gridcache import gridCache
 from ..layerbuilderbase import LayerBuilderBase
 from ..datamanager.material import MaterialManager
 from ..datamanager.model import ModelManager
 from ...const import LayerType
-from ...geometry import VectorGeometry
+from ...geometry import BulkZFunc, VectorGeometry
 from ....conf import DEF_SETS, FEATURES_PER_BLOCK
 from ....utils.js import css_color, int_color
 from ....utils.logging import logger
@@ -39,15 +41,15 @@ class VectorLayerBuilder(LayerBuilderBase):
         self.materialManager = MaterialManager(imageManager, settings.materialType())
         self.modelManager = ModelManager(settings)
 
-        self.clipExtent = None
-
         self.vlayer = VectorLayer(layer, settings, self.materialManager, self.modelManager)
         if self.vlayer.ot:
             self.log(f"Object type is {self.vlayer.ot.name}.")
         else:
             logger.error("Object type not found")
 
-        self.features = []
+        # numbers of materials and models that have been built
+        self._builtMaterialCount = 0
+        self._builtModelCount = 0
 
         self._objTypeClass = type(self.vlayer.ot)
         self._onePerBlock = (self._objTypeClass == ObjectType.Overlay
@@ -57,6 +59,9 @@ class VectorLayerBuilder(LayerBuilderBase):
     def build(self, build_blocks=False):
         """Generate the export data for this vector layer.
 
+        Features are read while blocks are built, so materials and models are added to
+        blocks that use them first. See `buildDataDelta()`.
+
         Args:
             build_blocks (bool): If True, construct and return feature blocks under `data['body']['blocks']`.
 
@@ -65,44 +70,14 @@ class VectorLayerBuilder(LayerBuilderBase):
         if self.layer.mapLayer is None or self.vlayer.ot is None:
             return
 
-        vlayer = self.vlayer
-        be = self.settings.baseExtent()
-        p = self.layer.properties
-
-        # feature request
-        request = QgsFeatureRequest()
-        if p.get("radioButton_IntersectingFeatures", False):
-            request.setFilterRect(vlayer.transform.transformBoundingBox(be.boundingBox(),
-                                                                        QgsCoordinateTransform.TransformDirection.Reverse))
-
-            # geometry for clipping
-            if p.get("checkBox_Clip") and self._objTypeClass != ObjectType.Polygon:
-                self.clipExtent = be.clone().scale(0.9999)    # clip to slightly smaller extent than map canvas extent
-        self.features = []
         data = {}
+        if build_blocks:
+            data["blocks"] = list(self.buildBlocks())
 
-        # materials/models
-        if self._objTypeClass == ObjectType.ModelFile:
-            for feat in vlayer.features(request):
-                feat.model = vlayer.ot.model(feat)
-                self.features.append(feat)
-
-            data["models"] = self.modelManager.build(bool(self.assetDestination is not None),
-                                                     base64=self.settings.requiresJsonSerializable)
+        data.update(self.buildDataDelta())
 
+        if self._objTypeClass == ObjectType.ModelFile:
             self.log("This layer references 3D model files. If associated files exist, please copy them to the data directory.", warning=True)
-        else:
-            for feat in vlayer.features(request):
-                feat.material = vlayer.ot.material(feat)
-                self.features.append(feat)
-
-            data["materials"] = self.materialManager.buildAll(
-                self.assetDestination,
-                base64=self.settings.requiresJsonSerializable
-            )
-
-        if build_blocks:
-            data["blocks"] = list(self.buildBlocks())
 
         d = {
             "type": "layer",
@@ -115,11 +90,27 @@ class VectorLayerBuilder(LayerBuilderBase):
 
         return d
 
-    def buildBlocks(self):
-        nb = nf = 0
-        for buildTask in self.buildTasks():
-            b = buildTask.build()
+    def buildDataDelta(self):
+        """Build materials (or models of 3D model layers) that have been added since the last call.
 
+        @returns {dict} with "materials" or "models" key
+        """
+        if self._objTypeClass == ObjectType.ModelFile:
+            models = self.modelManager.build(bool(self.assetDestination is not None),
+                                             base64=self.settings.requiresJsonSerializable,
+                                             start=self._builtModelCount)
+            self._builtModelCount = self.modelManager.count()
+            return {"models": models}
+
+        materials = self.materialManager.buildAll(self.assetDestination,
+                                                  base64=self.settings.requiresJsonSerializable,
+                                                  start=self._builtMaterialCount)
+        self._builtMaterialCount = self.materialManager.count()
+        return {"materials": materials}
+
+    def buildBlocks(self, executor=None):
+        nb = nf = 0
+        for b in super().buildBlocks(executor):
             nb += 1
             nf += b["featureCount"]
 
@@ -131,10 +122,12 @@ class VectorLayerBuilder(LayerBuilderBase):
             self.log(f"{nf} feature(s).")
 
     def blockCount(self):
+        # estimated from the feature count of the map layer, which includes features outside the extent
+        featureCount = max(self.layer.mapLayer.featureCount(), 1)
         if self._onePerBlock:
-            return len(self.features)
+            return featureCount
 
-        return math.ceil(len(self.features) / FEATURES_PER_BLOCK)
+        return math.ceil(featureCount / FEATURES_PER_BLOCK)
 
     def layerProperties(self):
         """
@@ -174,11 +167,12 @@ class VectorLayerBuilder(LayerBuilderBase):
         return p
 
     def buildTasks(self):
-        """Yield a FeatureBlockBuilder instance set up for the current features.
+        """Yield a FeatureBlockBuilder instance for each block of features.
 
-        This splits features into blocks of size `FEATURES_PER_BLOCK`.
+        Features are read from the layer as blocks are built, and a block is yielded as soon as
+        `FEATURES_PER_BLOCK` features are ready.
         """
-        if self.vlayer.ot is None:
+        if self.layer.mapLayer is None or self.vlayer.ot is None:
             return
 
         z_func = lambda x, y: 0
@@ -201,11 +195,11 @@ class VectorLayerBuilder(LayerBuilderBase):
                 dem_seg = self.settings.demGridSegments(demLayerId)
 
                 # prepare a grid geometry
-                grid = demProvider.readAsGridGeometry(dem_seg.width() + 1, dem_seg.height() + 1, self.settings.baseExtent())
-                z_func = lambda x, y: grid.valueOnSurface(x, y) or 0
+                grid = gridCache().readAsGridGeometry(demLayerId, demProvider, dem_seg.width() + 1, dem_seg.height() + 1, self.settings.baseExtent())
+                z_func = grid.surfaceZFunc()
 
             else:
-                z_func = demProvider.readValue      # readValue(x, y)
+                z_func = BulkZFunc(partial(gridCache().valuesAt, demLayerId, demProvider))
 
         builder = FeatureBlockBuilder(
             self.settings, self.vlayer, self.layer.jsLayerId,
@@ -217,36 +211,71 @@ class VectorLayerBuilder(LayerBuilderBase):
         bIndex = startFIdx = 0
         blockCount = self.blockCount()
 
-        for f in self.features or []:
-            if self.clipExtent and self.layer.type != LayerType.POINT:
-                if f.clipGeometry(self.clipExtent) is None:
-                    continue
-
-            # skip if geometry is empty or null
-            if f.geom.isEmpty() or f.geom.isNull():
-                if not self.clipExtent:
-                    logger.info("empty/null geometry skipped")
-                continue
-
+        for f in self.features():
             feats.append(f)
 
             if len(feats) == FEATURES_PER_BLOCK or self._onePerBlock:
-                b = builder.clone()
-                b.setBlockIndex(bIndex)
-                b.setFeatures(feats)
-                b.startFIdx = startFIdx
-                yield b
+                yield self._blockBuilder(builder.clone(), bIndex, startFIdx, feats)
 
                 bIndex += 1
                 startFIdx += len(feats)
                 feats = []
 
-                self.progress(bIndex, blockCount)
+                self.progress(bIndex, max(blockCount, bIndex + 1))
 
         if len(feats) or bIndex == 0:
-            builder.setBlockIndex(bIndex)
-            builder.setFeatures(feats)
-            builder.startFIdx = startFIdx
-            yield builder
+            yield self._blockBuilder(builder, bIndex, startFIdx, feats)
+
+            self.progress(bIndex + 1, bIndex + 1)
+
+    def _blockBuilder(self, builder, bIndex, startFIdx, feats):
+        builder.setBlockIndex(bIndex)
+        builder.setFeatures(feats)
+        builder.startFIdx = startFIdx
+
+        # blocks written to files are loaded in no particular order,
+        # so the materials are added to the layer data after all blocks have been built
+        if self.assetDestination is None:
+            builder.setDataDelta(self.buildDataDelta())
+        return builder
+
+    def features(self):
+        """Read features to export, with materials (or models) evaluated and geometries clipped.
+
+        Yields:
+            `Feature` objects that have non-empty geometry.
+        """
+        vlayer = self.vlayer
+        be = self.settings.baseExtent()
+        p = self.layer.properties
+
+        # feature request
+        request = QgsFeatureRequest()
+        clipExtent = None
+        if p.get("radioButton_IntersectingFeatures", False):
+            request.setFilterRect(vlayer.transform.transformBoundingBox(be.boundingBox(),
+                                                                        QgsCoordinateTransform.TransformDirection.Reverse))
+
+            # geometry for clipping
+            if p.get("checkBox_Clip") and self._objTypeClass != ObjectType.Polygon:
+                clipExtent = be.clone().scale(0.9999)    # clip to slightly smaller extent than map canvas extent
+
+        isModel = (self._objTypeClass == ObjectType.ModelFile)
+
+        for f in vlayer.features(request):
+            if isModel:
+                f.model = vlayer.ot.model(f)
+            else:
+                f.material = vlayer.ot.material(f)
+
+            if clipExtent and self.layer.type != LayerType.POINT:
+                if f.clipGeometry(clipExtent) is None:
+                    continue
+
+            # skip if geometry is empty or null
+            if f.geom.isEmpty() or f.geom.isNull():
+                if not clipExtent:
+                    logger.info("empty/null geometry skipped")
+                continue
 
-            self.progress(bIndex + 1, blockCount)
+            yield f
@@ -4,7 +4,7 @@
 
 from .object import ObjectType
 from ...const import LayerType, PropertyID as PID
-from ...geometry import VectorGeometry, PointGeometry, LineGeometry, PolygonGeometry, TINGeometry
+from ...geometry import VectorGeometry, PointGeometry, LineGeometry, PolygonGeometry, TINGeometry, offsetZFunc
 
 
 LayerType2GeomClass = {
@@ -40,8 +40,7 @@ class Feature:
         return self.geom
 
     def geometry(self, z_func, mapTo3d, useZM=VectorGeometry.NotUseZM, baseExtent=None, grid=None):
-        alt = self.prop(PID.ALT, 0)
-        zf = lambda x, y: z_func(x, y) + alt
+        zf = offsetZFunc(z_func, self.prop(PID.ALT, 0))
 
         transform_func = mapTo3d.transform
 
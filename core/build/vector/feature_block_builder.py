@@ -3,11 +3,15 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 import json
+from itertools import chain
+import numpy as np
 from qgis.PyQt.QtCore import QVariant
 
+from .object import ObjectType
+from ..jsonbinarywriter import BinaryContainer, encodeJSONBinary
 from ...const import PropertyID as PID
 from ...geometry import VectorGeometry
-from ....conf import DEBUG_MODE
+from ....conf import DEBUG_MODE, POINT_INSTANCING, POLYGON_MESH_BATCH, VECTOR_BINARY_BLOCKS
 from ....utils.basic import parseInt
 
 
@@ -17,6 +21,163 @@ def json_default(o):
     raise TypeError(repr(o) + " is not JSON serializable")
 
 
+def batchTriangleMeshes(meshes, materialIndices):
+    """Merge triangle meshes of features into a single vertex and index buffer.
+
+    Meshes are stored in order of material index, so that triangles of each material are drawn
+    with a single draw call.
+
+    Args:
+        meshes: List of (vertices, faces) of features. See `TINGeometry.toArrays()`.
+        materialIndices: List of material indices of features.
+
+    Returns:
+        dict with "vertices" (flat float32 array), "indices" (flat uint32 array), "ranges" (uint32 array
+        of start and count of indices of each feature in feature order) and "groups" (list of
+        [material index, start, count] of index runs).
+    """
+    count = len(meshes)
+    order = np.argsort(np.asarray(materialIndices, dtype=np.int64), kind="stable")
+
+    vcounts = np.array([len(v) for v, _ in meshes], dtype=np.int64)
+    icounts = np.array([f.size for _, f in meshes], dtype=np.int64)
+
+    # offsets of vertices and indices of features in the merged buffers
+    vstarts = np.zeros(count, dtype=np.int64)
+    istarts = np.zeros(count, dtype=np.int64)
+    vstarts[order] = np.cumsum(vcounts[order]) - vcounts[order]
+    istarts[order] = np.cumsum(icounts[order]) - icounts[order]
+
+    if count:
+        vertices = np.concatenate([meshes[i][0] for i in order]).astype(np.float32).ravel()
+        indices = np.concatenate([(meshes[i][1] + vstarts[i]).ravel() for i in order]).astype(np.uint32)
+    else:
+        vertices = np.zeros(0, dtype=np.float32)
+        indices = np.zeros(0, dtype=np.uint32)
+
+    groups = []
+    for i in order:
+        mtl = int(materialIndices[i])
+        if groups and groups[-1][0] == mtl:
+            groups[-1][2] += int(icounts[i])
+        else:
+            groups.append([mtl, int(istarts[i]), int(icounts[i])])
+
+    return {
+        "vertices": vertices,
+        "indices": indices,
+        "ranges": np.column_stack([istarts, icounts]).astype(np.uint32).ravel(),
+        "groups": [g for g in groups if g[2]]
+    }
+
+
+def batchInstances(instances, materialIndices):
+    """Merge transforms of instances of features into arrays.
+
+    Instances are stored in order of material index, so that instances of each material are drawn
+    with a single draw call. Instances of a feature keep their order.
+
+    Args:
+        instances: List of lists of (position, scale, rotation) of features. See `ObjectTypeBase.instances()`.
+        materialIndices: List of material indices of features.
+
+    Returns:
+        dict with "positions" (flat float64 array), "scales" and "rotations" (flat float32 arrays),
+        "features" (uint32 array of feature index of each instance) and "groups" (list of [material index, start, count] of runs
+        of instances).
+    """
+    counts = [len(insts) for insts in instances]
+    features = np.repeat(np.arange(len(instances), dtype=np.uint32), counts)
+    mtls = np.repeat(np.asarray(materialIndices, dtype=np.int64), counts)
+    order = np.argsort(mtls, kind="stable")
+
+    items = list(chain.from_iterable(instances))
+    arrays = {}
+    for i, (name, size, dtype) in enumerate([("positions", 3, np.float64), ("scales", 3, np.float32), ("rotations", 4, np.float32)]):
+        a = np.array([item[i] for item in items], dtype=dtype).reshape(-1, size)
+        arrays[name] = a[order].ravel()
+
+    groups = []
+    for mtl in np.unique(mtls).tolist():
+        start, end = np.searchsorted(mtls[order], [mtl, mtl + 1])
+        groups.append([mtl, int(start), int(end - start)])
+
+    arrays["features"] = features[order]
+    arrays["groups"] = groups
+    return arrays
+
+
+def encodeFeatureColumns(feats, groups=("geom", "mtl")):
+    """Move values of features that can be stored as binary data into columns.
+
+    Values of a key that all features have in a group dict are moved into a column if they are
+    all numbers, or all lists of numbers nested to the same depth, such as coordinate lists of
+    points, lines, or rings of polygons. The group dicts of the features are replaced with copies
+    that have the remaining values.
+
+    Args:
+        feats: List of feature dicts. Modified in place.
+        groups: Keys of dicts in feature dicts whose values are stored in columns.
+
+    Returns:
+        dict of {group: {key: column}}. See `encodeColumn()`.
+    """
+    columns = {}
+    for group in groups:
+        if not feats or not all(isinstance(d.get(group), dict) for d in feats):
+            continue
+
+        dicts = [dict(d[group]) for d in feats]
+        for d, g in zip(feats, dicts):
+            d[group] = g
+
+        cols = {}
+        for key in [k for k in dicts[0] if all(k in g for g in dicts)]:
+            c = encodeColumn([g[key] for g in dicts])
+            if c is not None:
+                cols[key] = c
+                for g in dicts:
+                    del g[key]
+
+        if cols:
+            columns[group] = cols
+
+    return columns
+
+
+def encodeColumn(values):
+    """Encode values of features into binary containers.
+
+    Returns:
+        {"values": BinaryContainer} if the values are numbers. If they are nested lists, values of
+        the innermost lists are concatenated into "values", and "counts" has a BinaryContainer of
+        lengths of lists for each level from the outermost. Numbers other than uint32 integers are
+        stored in float64, since they include map coordinates. None if the values cannot be encoded,
+        which includes integers that float64 cannot represent exactly.
+    """
+    counts = []
+    items = values
+    while items and all(isinstance(v, (list, tuple)) for v in items):
+        counts.append(BinaryContainer(np.array([len(v) for v in items], dtype=np.uint32), "I32"))
+        items = list(chain.from_iterable(items))
+
+    if not all(type(v) in (int, float) for v in items):
+        return None
+
+    if all(type(v) is int for v in items) and (not items or (0 <= min(items) and max(items) < 2 ** 32)):
+        c = {"values": BinaryContainer(np.array(items, dtype=np.uint32), "I32")}
+
+    elif any(type(v) is int and abs(v) > 2 ** 53 for v in items):
+        return None     # float64 cannot hold the integers exactly
+
+    else:
+        c = {"values": BinaryContainer(np.array(items, dtype=np.float64), "f64")}
+
+    if counts:
+        c["counts"] = counts
+    return c
+
+
 class FeatureBlockBuilder:
     """Generates blocks of 3D feature data from a vector layer. When the number of features is large,
         the data is divided into multiple data blocks."""
@@ -33,6 +194,7 @@ class FeatureBlockBuilder:
         self.blockIndex = None
         self.startFIdx = None
         self.features = []
+        self.dataDelta = {}
 
     def clone(self):
         return FeatureBlockBuilder(
@@ -47,6 +209,10 @@ class FeatureBlockBuilder:
     def setFeatures(self, features):
         self.features = features
 
+    def setDataDelta(self, delta):
+        """Set materials or models that the viewer loads before this block. See `VectorLayerBuilder.buildDataDelta()`."""
+        self.dataDelta = delta
+
     def build(self):
         """
         @returns {FeatureBlockData | FeatureBlockDataRef}
@@ -55,10 +221,25 @@ class FeatureBlockBuilder:
         obj_geom_func = self.vlayer.ot.geometry
         mapTo3d = self.settings.mapTo3d()
 
+        batch = POLYGON_MESH_BATCH and type(self.vlayer.ot) in (ObjectType.Polygon, ObjectType.Overlay)
+        instanced = POINT_INSTANCING and self.vlayer.ot.instanced
+        meshes = []
+        instances = []
+
         feats = []
         for f in self.features:
             d = {}
-            d["geom"] = obj_geom_func(f, f.geometry(self.z_func, mapTo3d, self.useZM, be, self.grid))
+            geom = f.geometry(self.z_func, mapTo3d, self.useZM, be, self.grid)
+            if batch:
+                # triangles are stored in the block mesh
+                meshes.append(geom.toArrays())
+                d["geom"] = obj_geom_func(f, geom, triangles=False)
+            elif instanced:
+                # transforms are stored in the block instances. points are used for labels
+                instances.append(self.vlayer.ot.instances(f, geom))
+                d["geom"] = {"pts": geom.toList()}
+            else:
+                d["geom"] = obj_geom_func(f, geom)
 
             if f.material is not None:
                 d["mtl"] = f.material
@@ -92,15 +273,69 @@ class FeatureBlockBuilder:
             "startIndex": self.startFIdx
         }
 
+        for key, items in self.dataDelta.items():
+            if items:
+                data[key] = items
+
+        if batch:
+            data["mesh"] = self.buildMesh(meshes, [f.material["idx"] for f in self.features])
+
+        elif instanced:
+            data["instances"] = self.buildInstances(instances, [f.material["idx"] for f in self.features])
+
+        if VECTOR_BINARY_BLOCKS:
+            columns = encodeFeatureColumns(feats)
+            if columns:
+                data["columns"] = columns
+
+        binary = batch or instanced or "columns" in data
+
         if self.assetDestination:
-            tail = f"{self.blockIndex}.json"
-            with open(self.assetDestination.path(tail), "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2 if DEBUG_MODE else None, default=json_default)
+            if binary:
+                tail = f"{self.blockIndex}.binjson"
+                encodeJSONBinary(data, (self.assetDestination.path(tail), self.assetDestination.url(tail)), default=json_default)
+
+            else:
+                tail = f"{self.blockIndex}.json"
+                with open(self.assetDestination.path(tail), "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2 if DEBUG_MODE else None, default=json_default)
 
             return {
                 "url": self.assetDestination.url(tail),
                 "featureCount": len(feats)
             }
 
+        elif binary:
+            return encodeJSONBinary(data)
+
         else:
             return data
+
+    def buildMesh(self, meshes, materialIndices):
+        """Build a binary mesh of triangles of all features in the block.
+
+        @returns {FeatureBlockMeshData}
+        """
+        m = batchTriangleMeshes(meshes, materialIndices)
+
+        return {
+            "vertices": BinaryContainer(m["vertices"], "f32"),
+            "indices": BinaryContainer(m["indices"], "I32"),
+            "ranges": BinaryContainer(m["ranges"], "I32"),
+            "groups": m["groups"]
+        }
+
+    def buildInstances(self, instances, materialIndices):
+        """Build binary transforms of objects of all features in the block.
+
+        @returns {FeatureBlockInstanceData}
+        """
+        m = batchInstances(instances, materialIndices)
+
+        return {
+            "positions": BinaryContainer(m["positions"], "f64"),
+            "scales": BinaryContainer(m["scales"], "f32"),
+            "rotations": BinaryContainer(m["rotations"], "f32"),
+            "features": BinaryContainer(m["features"], "I32"),
+            "groups": m["groups"]
+        }
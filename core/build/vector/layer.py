@@ -115,46 +115,49 @@ class VectorLayer:
         self.renderer = self.mapLayer.renderer().clone()
         self.renderer.startRender(self.renderContext, self.mapLayer.fields())
 
-        for f in self.mapLayer.getFeatures(request or QgsFeatureRequest()):
-            # geometry
-            geom = f.geometry()
-            if geom is None:
-                logger.info(f"[{self.name}] Null geometry skipped.")
-                continue
+        # features are read while blocks are built, and the reading can stop in the middle
+        try:
+            for f in self.mapLayer.getFeatures(request or QgsFeatureRequest()):
+                # geometry
+                geom = f.geometry()
+                if geom is None:
+                    logger.info(f"[{self.name}] Null geometry skipped.")
+                    continue
 
-            geom = QgsGeometry(geom)
+                geom = QgsGeometry(geom)
 
-            # coordinate transformation - layer crs to project crs
-            if geom.transform(self.transform) != 0:
-                logger.warning(f"[{self.name}] Failed to transform a geometry.")
-                continue
-
-            if rotation and self.onlyIntersecting:
-                # if map is rotated, check whether geometry intersects with the base extent
-                if not beGeom.intersects(geom):
+                # coordinate transformation - layer crs to project crs
+                if geom.transform(self.transform) != 0:
+                    logger.warning(f"[{self.name}] Failed to transform a geometry.")
                     continue
 
-            # set feature to expression context
-            self.expressionContext.setFeature(f)
+                if rotation and self.onlyIntersecting:
+                    # if map is rotated, check whether geometry intersects with the base extent
+                    if not beGeom.intersects(geom):
+                        continue
+
+                # set feature to expression context
+                self.expressionContext.setFeature(f)
 
-            # properties
-            props = self.evaluateProperties(f, self.pids)
+                # properties
+                props = self.evaluateProperties(f, self.pids)
 
-            if self.anim_exprs:
-                for pid, expr in self.anim_exprs.items():
-                    props[pid] = expr.evaluate(self.expressionContext)
+                if self.anim_exprs:
+                    for pid, expr in self.anim_exprs.items():
+                        props[pid] = expr.evaluate(self.expressionContext)
 
-            # attributes
-            if self.writeAttrs:
-                attrs = [fields[i].displayString(f.attribute(i)) for i in self.fieldIndices]
+                # attributes
+                if self.writeAttrs:
+                    attrs = [fields[i].displayString(f.attribute(i)) for i in self.fieldIndices]
 
-            # label
-            if self.hasLabel:
-                props[PID.LBLH] *= mapTo3d.zScale
+                # label
+                if self.hasLabel:
+                    props[PID.LBLH] *= mapTo3d.zScale
 
-            yield Feature(self, geom, props, attrs)
+                yield Feature(self, geom, props, attrs)
 
-        self.renderer.stopRender(self.renderContext)
+        finally:
+            self.renderer.stopRender(self.renderContext)
 
     def evaluateProperties(self, feat, pids):
         """Evaluate a set of property IDs for a feature.
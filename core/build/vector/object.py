@@ -3,11 +3,28 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 # begin: 2014-01-11
 
+from math import cos, radians, sin, sqrt
+
 from ..datamanager.material import MaterialManager, MaterialType
 from ...const import LayerType, PropertyID as PID
 from ....gui.propwidget import PropertyWidget, WVT
 
 
+NO_ROTATION = (0, 0, 0, 1)
+ROTATION_X90 = (sqrt(0.5), 0, 0, sqrt(0.5))     # makes y-axis of a mesh upright
+
+
+def dipRotation(dip, dipDirection):
+    """Return a quaternion (x, y, z, w) that tilts a horizontal mesh by dip and turns it to dip direction.
+
+    It is the rotation around the x-axis by -dip degrees followed by the rotation around the z-axis
+    by -dipDirection degrees.
+    """
+    a = -radians(dip) / 2
+    b = -radians(dipDirection) / 2
+    return (cos(b) * sin(a), sin(b) * sin(a), sin(b) * cos(a), cos(b) * cos(a))
+
+
 class ObjectTypeBase:
     """Base class for all 3D object types.
 
@@ -16,6 +33,7 @@ class ObjectTypeBase:
     """
 
     experimental = False
+    instanced = False       # whether objects are instances of the same mesh. See `instances()`.
 
     def __init__(self, settings, mtlManager=None):
         """
@@ -67,6 +85,20 @@ class ObjectTypeBase:
         """
         pass
 
+    def instances(self, feat, geom):
+        """Get transforms of objects of a feature that are instances of the same mesh.
+
+        Object types whose `instanced` is True implement this method.
+
+        Args:
+            feat: Feature object
+            geom: VectorGeometry subclass object
+
+        Returns:
+            A list of (position, scale, rotation) of the objects, where rotation is a quaternion (x, y, z, w)
+        """
+        pass
+
     def defaultValue(self):
         """Get default size value.
 
@@ -145,6 +177,7 @@ class PointType(PointTypeBase):
 class SphereType(PointBasicTypeBase):
 
     name = "Sphere"
+    instanced = True
     pids = [PID.C, PID.OP, PID.G0, PID.M0]
 
     def setupWidgets(self, ppage):
@@ -168,10 +201,15 @@ class SphereType(PointBasicTypeBase):
             "r": feat.prop(PID.G0)
         }
 
+    def instances(self, feat, geom):
+        r = feat.prop(PID.G0)
+        return [(pt, (r, r, r), NO_ROTATION) for pt in geom.toList()]
+
 
 class CylinderType(PointBasicTypeBase):
 
     name = "Cylinder"
+    instanced = True
     pids = [PID.C, PID.OP, PID.G0, PID.G1, PID.M0]
 
     def setupWidgets(self, ppage):
@@ -197,6 +235,11 @@ class CylinderType(PointBasicTypeBase):
             "h": feat.prop(PID.G1) * self.settings.mapTo3d().zScale
         }
 
+    def instances(self, feat, geom):
+        r = feat.prop(PID.G0)
+        h = feat.prop(PID.G1) * self.settings.mapTo3d().zScale
+        return [((x, y, z + h / 2), (r, h, r), ROTATION_X90) for x, y, z in geom.toList()]
+
 
 class ConeType(CylinderType):
 
@@ -206,6 +249,7 @@ class ConeType(CylinderType):
 class BoxType(PointBasicTypeBase):
 
     name = "Box"
+    instanced = True
     pids = [PID.C, PID.OP, PID.G0, PID.G1, PID.G2]
 
     def setupWidgets(self, ppage):
@@ -227,10 +271,16 @@ class BoxType(PointBasicTypeBase):
             "h": feat.prop(PID.G2) * self.settings.mapTo3d().zScale
         }
 
+    def instances(self, feat, geom):
+        w, d = feat.prop(PID.G0), feat.prop(PID.G1)
+        h = feat.prop(PID.G2) * self.settings.mapTo3d().zScale
+        return [((x, y, z + h / 2), (w, h, d), ROTATION_X90) for x, y, z in geom.toList()]
+
 
 class DiskType(PointTypeBase):
 
     name = "Disk"
+    instanced = True
     pids = [PID.C, PID.OP, PID.G0, PID.G1, PID.G2]
 
     def setupWidgets(self, ppage):
@@ -267,10 +317,17 @@ class DiskType(PointTypeBase):
             "dd": feat.prop(PID.G2)
         }
 
+    def instances(self, feat, geom):
+        r = feat.prop(PID.G0)
+        scale = (r, r * self.settings.mapTo3d().zScale, 1)
+        rotation = dipRotation(feat.prop(PID.G1), feat.prop(PID.G2))
+        return [(pt, scale, rotation) for pt in geom.toList()]
+
 
 class PlaneType(PointTypeBase):
 
     name = "Plane"
+    instanced = True
     pids = [PID.C, PID.OP, PID.G0, PID.G1, PID.G2, PID.G3]
 
     def setupWidgets(self, ppage):
@@ -310,6 +367,11 @@ class PlaneType(PointTypeBase):
             "dd": feat.prop(PID.G3)
         }
 
+    def instances(self, feat, geom):
+        scale = (feat.prop(PID.G0), feat.prop(PID.G1) * self.settings.mapTo3d().zScale, 1)
+        rotation = dipRotation(feat.prop(PID.G2), feat.prop(PID.G3))
+        return [(pt, scale, rotation) for pt in geom.toList()]
+
 
 # Line
 class LineType(LineTypeBase):
@@ -456,8 +518,8 @@ class PolygonType(PolygonTypeBase):
             "idx": self.mtlManager.getMeshIndex(color=feat.prop(PID.C), opacity=feat.prop(PID.OP), doubleSide=True, flat=True)
         }
 
-    def geometry(self, feat, geom):
-        g = geom.toDict(flat=True)
+    def geometry(self, feat, geom, triangles=True):
+        g = geom.toDict(flat=True, triangles=triangles)
         return g
 
 
@@ -526,8 +588,8 @@ class OverlayType(PolygonTypeBase):
             mtl["brdr"] = self.mtlManager.getLineIndex(color=feat.prop(PID.C2), opacity=feat.prop(PID.OP))
         return mtl
 
-    def geometry(self, feat, geom):
-        g = geom.toDict(flat=True)  # TINGeometry
+    def geometry(self, feat, geom, triangles=True):
+        g = geom.toDict(flat=True, triangles=triangles)  # TINGeometry
 
         # border
         if feat.prop(PID.C2) is not None:
@@ -12,6 +12,7 @@ from qgis.PyQt.QtGui import QImage, QPainter
 
 from ..build.builder import ThreeJSBuilder, LayerBuilderFactory
 from ..build.datamanager.image import ImageManager
+from ..build.dem.gridcache import gridCache
 from ..build.vector.builder import VectorLayerBuilder
 from ..const import LayerType, ScriptFile
 from ..exportsettings import ExportSettings
@@ -373,10 +374,14 @@ class ThreeJSExporter(QObject):
     def buildScene(self, settings):
         builder = ThreeJSBuilder(self, self.progress, self.log, isInUiThread=False)
         obj = builder.buildScene(settings)
-        obj["layers"] = self.buildLayers(settings)
+        try:
+            obj["layers"] = self.buildLayers(settings, builder.executor)
+        finally:
+            gridCache().clear()     # release DEM grids shared between layers
+            builder.executor.shutdown()
         return obj
 
-    def buildLayers(self, settings):
+    def buildLayers(self, settings, executor=None):
         layers = []
         layer_list = [layer for layer in settings.layers() if layer.visible]
         total = len(layer_list)
@@ -385,13 +390,14 @@ class ThreeJSExporter(QObject):
                 raise ExportCancelled()
 
             self.progress(i, total, f"Building {layer.name} layer...")
-            obj = self.buildLayer(layer, settings)
+            obj = self.buildLayer(layer, settings, executor)
             if obj:
                 layers.append(obj)
 
         return layers
 
-    def buildLayer(self, layer, settings):
+    def buildLayer(self, layer, settings, executor=None):
+        """Build a layer. Blocks that provide parallel jobs are built in worker processes of the executor."""
         title = js_utils.abchex(self.nextLayerIndex())
 
         if settings.localMode:
@@ -414,13 +420,23 @@ class ThreeJSExporter(QObject):
         obj = builder.build(build_blocks=False)
 
         blocks = []
-        for block in builder.buildBlocks():
-            if self.aborted:
-                raise ExportCancelled()
+        results = builder.buildBlocks(executor)
+        try:
+            for block in results:
+                if self.aborted:
+                    raise ExportCancelled()
+
+                blocks.append(block)
+        finally:
+            results.close()
+
+        body = obj.setdefault("body", {})
+        body["blocks"] = blocks
 
-            blocks.append(block)
+        # materials and models of features read while the blocks were built
+        for key, items in builder.buildDataDelta().items():
+            body.setdefault(key, []).extend(items)
 
-        obj.setdefault("body", {})["blocks"] = blocks
         return obj
 
 
@@ -14,7 +14,8 @@ from qgis.core import QgsMapSettings, QgsPoint, QgsPointXY, QgsProject
 from .const import ATConst, GEOM_WIDGET_MAX_COUNT, LayerType
 from .mapextent import MapExtent
 from .mapto3d import MapTo3D
-from .build.dem.demprovider import GDALDEMProvider, FlatDEMProvider
+from .build.dem.demprovider import FlatDEMProvider
+from .build.dem.providerpool import providerPool
 from .plugin.pluginmanager import pluginManager
 from ..conf import DEF_SETS, DEBUG_MODE, PLUGIN_VERSION_INT
 from ..utils.basic import createUid, getTemplateConfig, parseFloat
@@ -527,7 +528,8 @@ class ExportSettings:
         else:
             layer = QgsProject.instance().mapLayer(id)
             if layer:
-                return GDALDEMProvider(layer.source(), str(self.crs.toWkt()), source_wkt=str(layer.crs().toWkt()))    # use CRS set to the layer in QGIS
+                # pooled provider. use CRS set to the layer in QGIS
+                return providerPool().get(id, layer.source(), str(self.crs.toWkt()), source_wkt=str(layer.crs().toWkt()))
 
         return FlatDEMProvider()
 
@@ -3,12 +3,13 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 from math import ceil, floor
+import numpy as np
 from qgis.core import (
     Qgis, QgsGeometry, QgsPointXY, QgsRectangle, QgsFeature, QgsSpatialIndex, QgsCoordinateTransform, QgsFeatureRequest,
     QgsPoint, QgsMultiPoint, QgsLineString, QgsMultiLineString, QgsPolygon, QgsMultiPolygon, QgsGeometryCollection,
     QgsProject, QgsTessellator, QgsVertexId, QgsWkbTypes)
 
-from .geom_types import Face, Vector3, TransformFunc, Triangle, ZFunc
+from .geom_types import Vector3, TransformFunc, ZFunc
 from ..utils.logging import logger
 
 
@@ -81,15 +82,17 @@ class PointGeometry(VectorGeometry):
         geom = cls()
         if useZM == VectorGeometry.NotUseZM:
             pts = cls.nestedPointXYList(geometry)
-            geom.pts = [transform_func(pt.x(), pt.y(), z_func(pt.x(), pt.y())) for pt in pts]
+            zs = zValues(z_func, pts)
+            geom.pts = [transform_func(pt.x(), pt.y(), z) for pt, z in zip(pts, zs)]
 
         else:
             pts = cls.nestedPointList(geometry.constGet())
+            zs = zValues(z_func, pts)
             if useZM == VectorGeometry.UseZ:
-                geom.pts = [transform_func(pt.x(), pt.y(), pt.z() + z_func(pt.x(), pt.y())) for pt in pts]
+                geom.pts = [transform_func(pt.x(), pt.y(), pt.z() + z) for pt, z in zip(pts, zs)]
 
             else:   # UseM
-                geom.pts = [transform_func(pt.x(), pt.y(), pt.m() + z_func(pt.x(), pt.y())) for pt in pts]
+                geom.pts = [transform_func(pt.x(), pt.y(), pt.m() + z) for pt, z in zip(pts, zs)]
 
         return geom
 
@@ -164,15 +167,17 @@ class LineGeometry(VectorGeometry):
         geom = cls()
         if useZM == VectorGeometry.NotUseZM:
             lines = cls.nestedPointXYList(geometry)
-            geom.lines = [[transform_func(pt.x(), pt.y(), z_func(pt.x(), pt.y())) for pt in line] for line in lines]
+            zs = iter(zValues(z_func, [pt for line in lines for pt in line]))
+            geom.lines = [[transform_func(pt.x(), pt.y(), next(zs)) for pt in line] for line in lines]
 
         else:
             lines = cls.nestedPointList(geometry.constGet())
+            zs = iter(zValues(z_func, [pt for line in lines for pt in line]))
             if useZM == VectorGeometry.UseZ:
-                geom.lines = [[transform_func(pt.x(), pt.y(), pt.z() + z_func(pt.x(), pt.y())) for pt in line] for line in lines]
+                geom.lines = [[transform_func(pt.x(), pt.y(), pt.z() + next(zs)) for pt in line] for line in lines]
 
             else:   # UseM
-                geom.lines = [[transform_func(pt.x(), pt.y(), pt.m() + z_func(pt.x(), pt.y())) for pt in line] for line in lines]
+                geom.lines = [[transform_func(pt.x(), pt.y(), pt.m() + next(zs)) for pt in line] for line in lines]
 
         return geom
 
@@ -325,31 +330,44 @@ class TINGeometry(PolygonGeometry):
     """Used with Polygon and Overlay (relative to DEM)"""
 
     def __init__(self):
-        self.triangles: list[Triangle] = []
+        self.vertices = np.empty((0, 3), dtype=np.float64)     # (N, 3) transformed vertices of triangles
+        self.faces = np.empty((0, 3), dtype=np.int64)          # (M, 3) vertex indices of triangles
         self.centroids: list[Vector3] = []
 
-    def toDict(self, flat=True):
-        tris = IndexedTriangles3D()
-        for v0, v1, v2 in self.triangles:
-            tris.addTriangle(v0, v1, v2)
-
-        if flat:
-            v = []
-            for pt in tris.vertices:
-                v.extend(pt)
-
-            f = []
-            for c in tris.faces:
-                f.extend(c)
-
-        else:
-            v = tris.vertices
-            f = tris.faces
-
-        d = {
-            "vertices": v,
-            "indices": f
-        }
+    def toArrays(self):
+        """Return vertices and faces with vertices on the same position merged.
+
+        Returns:
+            (vertices, faces): (N, 3) numpy.ndarray (float64) of unique vertices in order of first appearance,
+            and (M, 3) numpy.ndarray (int64) of indices into them.
+        """
+        if not len(self.faces):
+            return np.empty((0, 3), dtype=np.float64), np.empty((0, 3), dtype=np.int64)
+
+        corners = self.vertices[self.faces.ravel()]
+        uniq, first, inverse = np.unique(corners, axis=0, return_index=True, return_inverse=True)
+
+        # renumber unique vertices in order of first appearance
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+
+        return uniq[order], rank[inverse.ravel()].reshape(-1, 3)
+
+    def toDict(self, flat=True, triangles=True):
+        """
+        Args:
+            triangles: Whether to include vertices and indices of triangles.
+        """
+        d = {}
+        if triangles:
+            v, f = self.toArrays()
+            if flat:
+                v = v.ravel()
+                f = f.ravel()
+
+            d["vertices"] = v.tolist()
+            d["indices"] = f.tolist()
 
         if self.centroids:
             d["centroids"] = [[x, y, z if z == z else 0] for x, y, z in self.centroids]
@@ -358,14 +376,15 @@ class TINGeometry(PolygonGeometry):
     @classmethod
     def fromQgsGeometry(cls, geometry, z_func: ZFunc, transform_func: TransformFunc, centroid=True, drop_z=False,
                         ccw2d=False, use_z_func_cache=False):
+        """Triangulate polygons.
+
+        `transform_func` is called once with numpy.ndarrays of coordinates of all vertices.
+        """
         geom = cls()
 
-        if z_func:
-            if use_z_func_cache:
-                cache = FunctionCacheXY(z_func)
-                z_func = cache.func
-        else:
-            z_func = lambda x, y: 0
+        if z_func and use_z_func_cache and not isinstance(z_func, BulkZFunc):
+            cache = FunctionCacheXY(z_func)
+            z_func = cache.func
 
         if drop_z:
             g = geometry.get()
@@ -375,23 +394,18 @@ class TINGeometry(PolygonGeometry):
 
         if centroid:
             pt = geometry.centroid().asPoint()
+            cz = z_func(pt.x(), pt.y()) if z_func else 0
             if drop_z:
-                c = transform_func(pt.x(), pt.y(), z_func(pt.x(), pt.y()))
+                c = transform_func(pt.x(), pt.y(), cz)
             else:
                 # use z coordinate of first vertex (until QgsAbstractGeometry supports z coordinate of centroid)
                 try:
-                    c = transform_func(pt.x(), pt.y(), g.vertexAt(QgsVertexId(0, 0, 0)).z() + z_func(pt.x(), pt.y()))
+                    c = transform_func(pt.x(), pt.y(), g.vertexAt(QgsVertexId(0, 0, 0)).z() + cz)
                 except TypeError:   # if isinstance(g, QgsTriangle)
-                    c = transform_func(pt.x(), pt.y(), g.vertexAt(0).z() + z_func(pt.x(), pt.y()))
+                    c = transform_func(pt.x(), pt.y(), g.vertexAt(0).z() + cz)
 
             geom.centroids.append(c)
 
-        # vertex transform function
-        if drop_z:
-            v_func = lambda x, y, z: transform_func(x, y, z_func(x, y))
-        else:
-            v_func = lambda x, y, z: transform_func(x, y, z + z_func(x, y))
-
         # triangulation
         tes = QgsTessellator()
         tes.setTriangulationAlgorithm(Qgis.TriangulationAlgorithm.Earcut)
@@ -399,44 +413,115 @@ class TINGeometry(PolygonGeometry):
         for poly in cls.singleGeometries(g):
             tes.addPolygon(poly, 0)
 
-        fv = memoryview(tes.vertexBuffer()).cast("f")    # [x0, z0, -y0, ...]
-        floats_per_vertex = tes.stride() // 4            # stride = n * sizeof( float )
+        floats_per_vertex = tes.stride() // 4           # stride = n * sizeof( float )
+        fv = np.frombuffer(memoryview(tes.vertexBuffer()), dtype=np.float32).reshape(-1, floats_per_vertex)
+        indices = np.frombuffer(memoryview(tes.indexBuffer()), dtype=np.uint32)
 
-        verts = [
-            v_func(fv[i], -fv[i + 2], fv[i + 1])
-            for i in range(0, len(fv), floats_per_vertex)
-        ]
+        if not len(indices):
+            return geom
 
-        indices = memoryview(tes.indexBuffer()).cast("I")
+        # [x, z, -y] in float32 to float64 coordinates
+        xs = fv[:, 0].astype(np.float64)
+        ys = -fv[:, 2].astype(np.float64)
+        zs = zArray(z_func, xs, ys) if z_func else np.zeros(len(xs))
+
+        if not drop_z:
+            zs += fv[:, 1]
+
+        x, y, z = transform_func(xs, ys, zs)
+        geom.vertices = np.column_stack(np.broadcast_arrays(x, y, z)).astype(np.float64)
+        geom.faces = indices.astype(np.int64).reshape(-1, 3)
 
-        tris = []
         if ccw2d:
             # orient triangles to counter-clockwise order
-            is_clockwise = GeometryUtils.isClockwise
+            v0, v1, v2 = (geom.vertices[geom.faces[:, i]] for i in range(3))
+            cross = (v1[:, 0] - v0[:, 0]) * (v2[:, 1] - v0[:, 1]) - (v2[:, 0] - v0[:, 0]) * (v1[:, 1] - v0[:, 1])
+            cw = cross < 0
+            geom.faces[cw] = geom.faces[cw][:, [0, 2, 1]]
 
-            for i in range(0, len(indices), 3):
-                v0 = verts[indices[i]]
-                v1 = verts[indices[i + 1]]
-                v2 = verts[indices[i + 2]]
+        return geom
 
-                if is_clockwise([v0, v1, v2, v0]):
-                    tris.append((v0, v2, v1))
-                else:
-                    tris.append((v0, v1, v2))
-        else:
-            # use original vertex order
-            tris = [
-                (
-                    verts[indices[i]],
-                    verts[indices[i + 1]],
-                    verts[indices[i + 2]]
-                )
-                for i in range(0, len(indices), 3)
-            ]
-
-        geom.triangles = tris
 
-        return geom
+class BulkZFunc:
+    """z function that can also calculate z values of many points at once.
+
+    Instances can be used as ordinary z functions (`z = f(x, y)`), but geometry classes
+    call `values()` to get z values of all vertices of a geometry with a single call.
+    """
+
+    def __init__(self, values_func, offset=0):
+        """
+        Args:
+            values_func: Function that takes sequences of x and y coordinates and returns a sequence of z values.
+            offset: Value added to z values.
+        """
+        self.values_func = values_func
+        self.offset = offset
+
+    def __call__(self, x, y):
+        return self.values([x], [y])[0]
+
+    def values(self, xs, ys):
+        zs = self.values_func(xs, ys)
+        zs = zs.tolist() if hasattr(zs, "tolist") else list(zs)    # numpy.ndarray to list
+        if self.offset:
+            return [z + self.offset for z in zs]
+        return zs
+
+    def withOffset(self, offset):
+        return BulkZFunc(self.values_func, self.offset + offset)
+
+
+def zValues(z_func, xs, ys=None):
+    """Calculate z values of multiple points.
+
+    Args:
+        z_func: z function. If it is a `BulkZFunc`, z values are calculated with a single call.
+        xs: Sequence of x coordinates, or sequence of points (QgsPointXY or QgsPoint) if `ys` is None.
+        ys: Sequence of y coordinates.
+
+    Returns:
+        list of z values.
+    """
+    if ys is None:
+        ys = [pt.y() for pt in xs]
+        xs = [pt.x() for pt in xs]
+
+    if isinstance(z_func, BulkZFunc):
+        return z_func.values(xs, ys) if len(xs) else []
+
+    return [z_func(x, y) for x, y in zip(xs, ys)]
+
+
+def zArray(z_func, xs, ys):
+    """Calculate z values of multiple points as a numpy.ndarray.
+
+    Args:
+        z_func: z function. If it is a `BulkZFunc`, z values are calculated with a single call.
+        xs: numpy.ndarray of x coordinates.
+        ys: numpy.ndarray of y coordinates.
+
+    Returns:
+        numpy.ndarray (float64) of z values.
+    """
+    if not len(xs):
+        return np.zeros(0)
+
+    if isinstance(z_func, BulkZFunc):
+        zs = np.array(z_func.values_func(xs, ys), dtype=np.float64)
+        if z_func.offset:
+            zs += z_func.offset
+        return zs
+
+    return np.array([z_func(x, y) for x, y in zip(xs.tolist(), ys.tolist())], dtype=np.float64)
+
+
+def offsetZFunc(z_func, offset):
+    """Return a z function that adds `offset` to z values of `z_func`."""
+    if isinstance(z_func, BulkZFunc):
+        return z_func.withOffset(offset)
+
+    return lambda x, y: z_func(x, y) + offset
 
 
 class FunctionCacheXY:
@@ -495,7 +580,7 @@ class GridGeometry:
         self.extent = extent
         self.x_segments = x_segments
         self.y_segments = y_segments
-        self.values = values
+        self.values = None if values is None else np.asarray(values, dtype=np.float32).ravel()
 
         center = extent.center()
         self.width, self.height = (extent.width(), extent.height())
@@ -578,7 +663,6 @@ class GridGeometry:
 
         xmin, ymax = (self.xmin, self.ymax)
         xres, yres = (self.xres, self.yres)
-        z_func = self.valueOnSurface
 
         polys = []
         for polygon in PolygonGeometry.nestedPointXYList(geom):
@@ -587,7 +671,7 @@ class GridGeometry:
                 if GeometryUtils.isClockwise(bnd) ^ (i > 0):   # xor
                     bnd.reverse()       # outer boundary should be ccw. inner boundaries should be cw.
 
-                ring = QgsLineString()
+                xs, ys = [], []
 
                 v = bnd[0]     # QgsPointXY
                 x0, y0 = (v.x(), v.y())
@@ -612,20 +696,60 @@ class GridGeometry:
                         p.remove(1)
 
                     for m in sorted(p):
-                        x = x0 + (x1 - x0) * m
-                        y = y0 + (y1 - y0) * m
-                        ring.addVertex(QgsPoint(x, y, z_func(x, y)))
+                        xs.append(x0 + (x1 - x0) * m)
+                        ys.append(y0 + (y1 - y0) * m)
 
                     x0, y0 = (x1, y1)
                     nx0, ny0, ns0 = (nx1, ny1, ns1)
 
-                ring.addVertex(QgsPoint(x0, y0, z_func(x0, y0)))    # last vertex
-                rings.addGeometry(ring)
+                xs.append(x0)       # last vertex
+                ys.append(y0)
+
+                zs = self.valuesOnSurface(xs, ys, outside=0)
+                rings.addGeometry(QgsLineString(xs, ys, zs.tolist()))
             polys.append(QgsGeometry(rings))
         return polys
 
     def value(self, x, y):
-        return self.values[x + y * (self.x_segments + 1)]
+        return float(self.values[x + y * (self.x_segments + 1)])
+
+    def surfaceZFunc(self):
+        """Return a z function that calculates values on the grid surface in bulk. Values outside the grid are 0."""
+        return BulkZFunc(lambda xs, ys: self.valuesOnSurface(xs, ys, outside=0))
+
+    def valuesOnSurface(self, xs, ys, outside=np.nan):
+        """Calculate values on the surface of the grid triangles at multiple points.
+
+        This is the vectorized version of `valueOnSurface()`.
+
+        Args:
+            xs, ys: Sequences of x and y coordinates.
+            outside: Value for points outside the grid.
+
+        Returns:
+            numpy.ndarray (float64) of values.
+        """
+        x = (np.asarray(xs, dtype=np.float64) - self.xmin) / self.width
+        y = (np.asarray(ys, dtype=np.float64) - self.ymin) / self.height
+        inside = (0 <= x) & (x <= 1) & (0 <= y) & (y <= 1)
+
+        values = np.full(x.shape, outside, dtype=np.float64)
+
+        mx = x[inside] * self.x_segments
+        my = (1 - y[inside]) * self.y_segments     # inverted. top is 0.
+        mx0 = np.minimum(np.floor(mx), self.x_segments - 1)     # on right edge, sdx is 1
+        my0 = np.minimum(np.floor(my), self.y_segments - 1)     # on bottom edge, sdy is 1
+        sdx = mx - mx0
+        sdy = my - my0
+
+        cols = self.x_segments + 1
+        i = my0.astype(np.int64) * cols + mx0.astype(np.int64)
+        z0, z1, z2, z3 = self.values[np.stack([i, i + 1, i + cols, i + cols + 1])].astype(np.float64)
+
+        values[inside] = np.where(sdx <= sdy,
+                                  z0 + (z1 - z0) * sdx + (z2 - z0) * sdy,
+                                  z3 + (z2 - z3) * (1 - sdx) + (z1 - z3) * (1 - sdy))
+        return values
 
     def valueOnSurface(self, x, y):
         x = (x - self.xmin) / self.width
@@ -656,31 +780,6 @@ class GridGeometry:
         return z3 + (z2 - z3) * (1 - sdx) + (z1 - z3) * (1 - sdy)
 
 
-class IndexedTriangles3D:
-
-    def __init__(self):
-        self.vertices: list[Vector3] = []
-        self.faces: list[Face] = []
-        self.vidx: dict[Vector3, int] = {}
-
-    def addTriangle(self, v1: Vector3, v2: Vector3, v3: Vector3):
-        vi1 = self._vertexIndex(v1)
-        vi2 = self._vertexIndex(v2)
-        vi3 = self._vertexIndex(v3)
-        self.faces.append([vi1, vi2, vi3])
-
-    def _vertexIndex(self, v: Vector3) -> int:
-        vi = self.vidx.get(v)
-        if vi is not None:
-            return vi
-
-        vi = len(self.vertices)
-        self.vertices.append(v)
-
-        self.vidx[v] = vi
-        return vi
-
-
 def dissolvePolygonsWithinExtent(polygon_layer, extent, crs):
     """dissolve polygons of the polygon_layer and clip the dissolution with the extent
        polygon_layer: QgsVectorLayer
@@ -416,6 +416,7 @@ class DEMPropertyPage(PropertyPage, Ui_DEMPropertiesWidget):
         else:
             widgets += [self.radioButton_OriginalValues, self.spinBox_TileSideSegments]
             widgets += [self.horizontalSlider_DEMSize, self.spinBox_Roughening]
+            widgets += [self.checkBox_AdaptiveMesh, self.lineEdit_MaxError]
             widgets += [self.radioButton_ClipPolygon, self.comboBox_ClipLayer, self.radioButton_NoClip]
 
         widgets += [self.checkBox_Tiles, self.spinBox_Size]
@@ -575,12 +576,11 @@ class DEMPropertyPage(PropertyPage, Ui_DEMPropertiesWidget):
         resamp = checked
         self.setLayoutEnabled(self.formLayoutOriginalValues, not resamp)
         self.setLayoutEnabled(self.horizontalLayoutResamp, resamp)
-        self.radioButton_ClipPolygon.setEnabled(resamp)
+        self.setLayoutEnabled(self.horizontalLayoutAdaptiveMesh, resamp)
+        self.lineEdit_MaxError.setEnabled(resamp and self.checkBox_AdaptiveMesh.isChecked())
+        self.radioButton_ClipPolygon.setEnabled(self.hasPolygonLayer and not (resamp and self.checkBox_Tiles.isChecked()))
         self.radioButton_NoClip.setEnabled(not resamp)
 
-        if not resamp and self.radioButton_ClipPolygon.isChecked():
-            self.radioButton_ClipBaseExtent.setChecked(True)
-
         if resamp and self.radioButton_NoClip.isChecked():
             self.radioButton_ClipBaseExtent.setChecked(True)
 
@@ -602,9 +602,10 @@ Grid Spacing: {3:.5f} x {4:.5f}{5}"""
 
     def tilesToggled(self, checked):
         self.setLayoutEnabled(self.gridLayoutTiles, checked)
-        self.radioButton_ClipPolygon.setEnabled(not checked and self.radioButton_Resampling.isChecked() and self.hasPolygonLayer)
+        resamp = self.radioButton_Resampling.isChecked()
+        self.radioButton_ClipPolygon.setEnabled(self.hasPolygonLayer and not (checked and resamp))
 
-        if checked and self.radioButton_ClipPolygon.isChecked():
+        if checked and resamp and self.radioButton_ClipPolygon.isChecked():
             self.radioButton_ClipBaseExtent.setChecked(True)
 
     def rougheningChanged(self, v):
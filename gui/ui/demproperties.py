@@ -74,6 +74,21 @@ class Ui_DEMPropertiesWidget(object):
         self.labelResampLevel.setObjectName("labelResampLevel")
         self.horizontalLayoutResamp.addWidget(self.labelResampLevel)
         self.verticalLayout_5.addLayout(self.horizontalLayoutResamp)
+        self.horizontalLayoutAdaptiveMesh = QtWidgets.QHBoxLayout()
+        self.horizontalLayoutAdaptiveMesh.setContentsMargins(20, -1, -1, -1)
+        self.horizontalLayoutAdaptiveMesh.setObjectName("horizontalLayoutAdaptiveMesh")
+        self.checkBox_AdaptiveMesh = QtWidgets.QCheckBox(parent=self.groupBoxResampMethod)
+        self.checkBox_AdaptiveMesh.setMinimumSize(QtCore.QSize(110, 0))
+        self.checkBox_AdaptiveMesh.setObjectName("checkBox_AdaptiveMesh")
+        self.horizontalLayoutAdaptiveMesh.addWidget(self.checkBox_AdaptiveMesh)
+        self.labelMaxError = QtWidgets.QLabel(parent=self.groupBoxResampMethod)
+        self.labelMaxError.setObjectName("labelMaxError")
+        self.horizontalLayoutAdaptiveMesh.addWidget(self.labelMaxError)
+        self.lineEdit_MaxError = QtWidgets.QLineEdit(parent=self.groupBoxResampMethod)
+        self.lineEdit_MaxError.setEnabled(False)
+        self.lineEdit_MaxError.setObjectName("lineEdit_MaxError")
+        self.horizontalLayoutAdaptiveMesh.addWidget(self.lineEdit_MaxError)
+        self.verticalLayout_5.addLayout(self.horizontalLayoutAdaptiveMesh)
         self.radioButton_OriginalValues = QtWidgets.QRadioButton(parent=self.groupBoxResampMethod)
         self.radioButton_OriginalValues.setObjectName("radioButton_OriginalValues")
         self.verticalLayout_5.addWidget(self.radioButton_OriginalValues)
@@ -366,10 +381,13 @@ class Ui_DEMPropertiesWidget(object):
         self.radioButton_Resampling.toggled['bool'].connect(self.groupBoxTiles.setEnabled) # type: ignore
         self.horizontalSlider_Opacity.valueChanged['int'].connect(self.spinBox_Opacity.setValue) # type: ignore
         self.spinBox_Opacity.valueChanged['int'].connect(self.horizontalSlider_Opacity.setValue) # type: ignore
+        self.checkBox_AdaptiveMesh.toggled['bool'].connect(self.lineEdit_MaxError.setEnabled) # type: ignore
         QtCore.QMetaObject.connectSlotsByName(DEMPropertiesWidget)
         DEMPropertiesWidget.setTabOrder(self.lineEdit_Altitude, self.radioButton_Resampling)
         DEMPropertiesWidget.setTabOrder(self.radioButton_Resampling, self.horizontalSlider_DEMSize)
-        DEMPropertiesWidget.setTabOrder(self.horizontalSlider_DEMSize, self.radioButton_OriginalValues)
+        DEMPropertiesWidget.setTabOrder(self.horizontalSlider_DEMSize, self.checkBox_AdaptiveMesh)
+        DEMPropertiesWidget.setTabOrder(self.checkBox_AdaptiveMesh, self.lineEdit_MaxError)
+        DEMPropertiesWidget.setTabOrder(self.lineEdit_MaxError, self.radioButton_OriginalValues)
         DEMPropertiesWidget.setTabOrder(self.radioButton_OriginalValues, self.spinBox_TileSideSegments)
         DEMPropertiesWidget.setTabOrder(self.spinBox_TileSideSegments, self.radioButton_ClipBaseExtent)
         DEMPropertiesWidget.setTabOrder(self.radioButton_ClipBaseExtent, self.radioButton_ClipPolygon)
@@ -416,6 +434,10 @@ class Ui_DEMPropertiesWidget(object):
         self.radioButton_Resampling.setText(_translate("DEMPropertiesWidget", "Bilinear resampling"))
         self.labelResamp.setText(_translate("DEMPropertiesWidget", "Resampling level"))
         self.labelResampLevel.setText(_translate("DEMPropertiesWidget", "2"))
+        self.checkBox_AdaptiveMesh.setToolTip(_translate("DEMPropertiesWidget", "Reduce triangles in flat areas. The value is the max vertical error in DEM units."))
+        self.checkBox_AdaptiveMesh.setText(_translate("DEMPropertiesWidget", "Adaptive mesh"))
+        self.labelMaxError.setText(_translate("DEMPropertiesWidget", "Max error"))
+        self.lineEdit_MaxError.setText(_translate("DEMPropertiesWidget", "1"))
         self.radioButton_OriginalValues.setText(_translate("DEMPropertiesWidget", "Use original DEM values"))
         self.labelTileSize.setText(_translate("DEMPropertiesWidget", "Tile side segments"))
         self.groupBoxClip.setTitle(_translate("DEMPropertiesWidget", "Clipping"))
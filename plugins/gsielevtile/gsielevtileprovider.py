@@ -11,21 +11,22 @@
 
 import math
 import numpy
+import os
 import struct
 
 from osgeo import gdal
-from qgis.PyQt.QtCore import QSettings
+from qgis.PyQt.QtCore import QSettings, QUrl
 from qgis.core import Qgis, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsPointXY, QgsRectangle, QgsProject
 
 from .downloader import Downloader
+from .tilecache import NODATA_VALUE, TILE_SIZE, parseTile, tileCache
+from ...conf import GSI_ELEV_TILE_CONNECTIONS, GSI_ELEV_TILE_URL
 from ...core.geometry import GridGeometry
 from ...utils.logging import logger
 
-TILE_SIZE = 256
 TSIZE1 = 20037508.342789244
-NODATA_VALUE = 0
-NODATA_VALUE_BYTES = b"0"
 ZMAX = 14
+DOWNLOAD_TIMEOUT = 60       # seconds
 
 
 class GSIElevTileProvider:
@@ -45,7 +46,11 @@ class GSIElevTileProvider:
         # approximate bbox of this data
         self.boundingbox = QgsRectangle(13667807, 2320477, 17230031, 5713298)
 
-        self.downloader = Downloader()
+        # URL template of tiles. The environment variable overrides the configuration,
+        # e.g. to use a local mirror in air-gapped environments.
+        self.urlTemplate = os.environ.get("QGIS2THREEJS_GSI_ELEV_TILE_URL") or GSI_ELEV_TILE_URL
+
+        self.downloader = Downloader(maxConnections=GSI_ELEV_TILE_CONNECTIONS)
         self.downloader.userAgent = "QGIS/{0} Qgis2threejs GSIElevTileProvider".format(Qgis.QGIS_VERSION_INT)  # will be overwritten in QgsNetworkAccessManager::createRequest() since 2.2
         self.downloader.DEFAULT_CACHE_EXPIRATION = QSettings().value("/qgis/defaultTileExpiry", 24, type=int)
 
@@ -78,6 +83,10 @@ class GSIElevTileProvider:
         geotransform = extent.geotransform(width, height)
         return self._read(ds, width, height, geotransform)
 
+    def readAsArray(self, width, height, extent):
+        """read data into a numpy array"""
+        return numpy.frombuffer(self.read(width, height, extent), dtype=numpy.float32).reshape(height, width)
+
     def readValues(self, width, height, extent):
         """read data into a list"""
         return struct.unpack("f" * width * height, self.read(width, height, extent))
@@ -88,24 +97,77 @@ class GSIElevTileProvider:
                             self.readValues(width, height, extent))
 
     def readValue(self, x, y):
-        """Get value at specified position using 1px * 1px memory raster. The value is calculated using a tile of max zoom level"""
-        # coordinate transformation into EPSG:3857
-        pt = self.transform.transform(QgsPointXY(x, y))
+        """Get value at specified position. The value is interpolated from tiles of max zoom level"""
+        return float(self.readValuesAt([x], [y])[0])
+
+    def readValuesAt(self, xs, ys):
+        """Get values at multiple positions.
 
-        # if the point is not within the bounding box of this data, return nodata value
-        if not self.boundingbox.contains(pt):
-            return NODATA_VALUE
+        Points are mapped to pixels of tiles of max zoom level in EPSG:3857, each tile that the points
+        need is loaded once from the tile cache (missing tiles are fetched at once), and values are
+        interpolated bilinearly without warping.
+        """
+        values = numpy.full(len(xs), NODATA_VALUE, dtype=numpy.float64)
+        if len(xs) == 0:
+            return values
+
+        # coordinate transformation into EPSG:3857
+        pts = [self.transform.transform(QgsPointXY(x, y)) for x, y in zip(xs, ys)]
+        mxs = numpy.array([pt.x() for pt in pts], dtype=numpy.float64)
+        mys = numpy.array([pt.y() for pt in pts], dtype=numpy.float64)
+
+        # points that are not within the bounding box of this data have nodata value
+        bbox = self.boundingbox
+        inside = numpy.nonzero((bbox.xMinimum() <= mxs) & (mxs <= bbox.xMaximum())
+                               & (bbox.yMinimum() <= mys) & (mys <= bbox.yMaximum()))[0]
+        if len(inside) == 0:
+            return values
+
+        # pixel coordinates of points in the tile matrix of max zoom level. pixel centers are at integers.
+        matrixSize = 2 ** ZMAX
+        pixels = matrixSize * TILE_SIZE
+        res = 2 * TSIZE1 / pixels
+        fx = numpy.clip((mxs[inside] + TSIZE1) / res - 0.5, 0, pixels - 1)
+        fy = numpy.clip((TSIZE1 - mys[inside]) / res - 0.5, 0, pixels - 1)
+
+        c0 = numpy.minimum(fx.astype(numpy.int64), pixels - 2)
+        r0 = numpy.minimum(fy.astype(numpy.int64), pixels - 2)
+        dx = fx - c0
+        dy = fy - r0
+
+        # four surrounding pixels of each point, which can be in different tiles
+        cs = numpy.stack([c0, c0 + 1, c0, c0 + 1])
+        rs = numpy.stack([r0, r0, r0 + 1, r0 + 1])
+
+        keys, inverse = numpy.unique((rs // TILE_SIZE) * matrixSize + cs // TILE_SIZE, return_inverse=True)
+        tiles = self.loadTiles(ZMAX, [(int(k % matrixSize), int(k // matrixSize)) for k in keys])
+
+        stack = numpy.full((len(tiles), TILE_SIZE, TILE_SIZE), NODATA_VALUE, dtype=numpy.float32)
+        for i, tile in enumerate(tiles):
+            if tile is not None:
+                stack[i] = tile
 
-        res = 0.1
-        hres = res / 2
-        ds = self.getDataset(pt.x() - hres, pt.y() - hres, pt.x() + hres, pt.y() + hres, res)
+        z = stack[inverse.reshape(cs.shape), rs % TILE_SIZE, cs % TILE_SIZE]
+        w = numpy.stack([(1 - dx) * (1 - dy), dx * (1 - dy), (1 - dx) * dy, dx * dy])
+        values[inside] = (z * w).sum(axis=0)
 
-        geotransform = [x - hres, res, 0, y + hres, 0, -res]
-        return struct.unpack("f", self._read(ds, 1, 1, geotransform))[0]
+        return values
 
     def readValueOnTriangles(self, x, y, xmin, ymin, xres, yres):
-        #TODO: implement
-        return self.readValue(x, y)
+        mx0 = math.floor((x - xmin) / xres)
+        my0 = math.floor((y - ymin) / yres)
+        px0 = xmin + xres * mx0
+        py0 = ymin + yres * my0
+
+        # values at the upper-left, upper-right, lower-left and lower-right grid points
+        z = self.readValuesAt([px0, px0 + xres, px0, px0 + xres], [py0 + yres, py0 + yres, py0, py0])
+
+        sdx = (x - px0) / xres
+        sdy = (y - py0) / yres
+
+        if sdx <= sdy:
+            return float(z[0] + (z[1] - z[0]) * sdx + (z[2] - z[0]) * (1 - sdy))
+        return float(z[3] + (z[2] - z[3]) * (1 - sdx) + (z[1] - z[3]) * sdy)
 
     def _read(self, ds, width, height, geotransform):
         # create a memory dataset
@@ -146,53 +208,82 @@ class GSIElevTileProvider:
         if self.last_dataset and self.last_dataset[0] == [zoom, ulx, uly, lrx, lry]:    # if same as last tile set, return cached dataset
             return self.last_dataset[1]
 
-        urltmpl = "https://cyberjapandata.gsi.go.jp/xyz/dem/{z}/{x}/{y}.txt"
-        #urltmpl = "http://localhost/xyz/dem/{z}/{x}/{y}.txt"
-        tiles = self.fetchFiles(urltmpl, zoom, ulx, uly, lrx, lry)
-
         # create a memory dataset
         width = cols * TILE_SIZE
         height = rows * TILE_SIZE
         res = size / TILE_SIZE
         geotransform = [ulx * size - TSIZE1, res, 0, TSIZE1 - uly * size, 0, -res]
 
-        #mem_driver = gdal.GetDriverByName("GTiff")
-        #ds = mem_driver.Create("D:/fetched_tile.tif", width, height, 1, gdal.GDT_Float32, [])
-
         ds = self.driver.Create("", width, height, 1, gdal.GDT_Float32, [])
         ds.SetProjection(str(self.crs3857.toWkt()))
         ds.SetGeoTransform(geotransform)
 
-        band = ds.GetRasterBand(1)
-        for i, tile in enumerate(tiles):
-            if tile:
-                col = i % cols
-                row = i // cols
-                band.WriteRaster(col * TILE_SIZE, row * TILE_SIZE, TILE_SIZE, TILE_SIZE, tile)
-
+        ds.GetRasterBand(1).WriteArray(self.fetchTiles(zoom, ulx, uly, lrx, lry))
         ds.FlushCache()
 
         self.last_dataset = [[zoom, ulx, uly, lrx, lry], ds]   # cache dataset
         return ds
 
-    def fetchFiles(self, urltmpl, zoom, xmin, ymin, xmax, ymax):
-        downloadTimeout = 60
+    def tileUrl(self, z, x, y):
+        return self.urlTemplate.replace("{x}", str(x)).replace("{y}", str(y)).replace("{z}", str(z))
 
-        urls = []
-        for y in range(ymin, ymax + 1):
-            for x in range(xmin, xmax + 1):
-                urls.append(urltmpl.replace("{x}", str(x)).replace("{y}", str(y)).replace("{z}", str(zoom)))
-        files = self.downloader.fetchFiles(urls, downloadTimeout)
+    def fetchTiles(self, zoom, xmin, ymin, xmax, ymax):
+        """Return a mosaic of tiles in a tile range as a 2D numpy.ndarray.
 
-        for url in urls:
+        Areas of tiles that are not available are filled with the nodata value.
+        """
+        xys = [(x, y) for y in range(ymin, ymax + 1) for x in range(xmin, xmax + 1)]
+        mosaic = numpy.full(((ymax - ymin + 1) * TILE_SIZE, (xmax - xmin + 1) * TILE_SIZE), NODATA_VALUE, dtype=numpy.float32)
+
+        for (x, y), tile in zip(xys, self.loadTiles(zoom, xys)):
+            if tile is not None:
+                r, c = (y - ymin) * TILE_SIZE, (x - xmin) * TILE_SIZE
+                mosaic[r:r + TILE_SIZE, c:c + TILE_SIZE] = tile
+
+        return mosaic
+
+    def loadTiles(self, zoom, xys):
+        """Load tiles from the tile cache. Missing tiles are fetched concurrently and cached.
+
+        Args:
+            zoom: Zoom level.
+            xys: List of (x, y) tile coordinates.
+
+        Returns:
+            List of tile arrays in the order of `xys`. None for tiles that are not available.
+        """
+        cache = tileCache()
+        tiles = [cache.get(self.urlTemplate, zoom, x, y) for x, y in xys]
+
+        missing = {self.tileUrl(zoom, x, y): i for i, (x, y) in enumerate(xys) if tiles[i] is None}
+        if not missing:
+            return tiles
+
+        files = self.fetchFiles(list(missing))
+        for url, i in missing.items():
             data = files.get(url)
-            if data:
-                array = numpy.fromstring(data.replace(b"e", NODATA_VALUE_BYTES).replace(b"\n", b","), dtype=numpy.float32, sep=",")
-            else:
-                array = numpy.empty(TILE_SIZE * TILE_SIZE, dtype=numpy.float32)
-                array.fill(NODATA_VALUE)
+            tile = parseTile(data) if data else None
+            if tile is not None:
+                x, y = xys[i]
+                cache.put(self.urlTemplate, zoom, x, y, tile)
+                tiles[i] = tile
 
-            yield array.tobytes()
+        logger.debug(f"GSI elevation tiles: {len(missing)} fetched. Cache stats: {cache.stats()}")
+        return tiles
+
+    def fetchFiles(self, urls):
+        """Fetch files and return a dict of URL to data. Local files are read directly."""
+        if not self.urlTemplate.startswith("file:"):
+            return self.downloader.fetchFiles(urls, DOWNLOAD_TIMEOUT)
+
+        files = {}
+        for url in urls:
+            try:
+                with open(QUrl(url).toLocalFile(), "rb") as f:
+                    files[url] = f.read()
+            except OSError:
+                files[url] = None
+        return files
 
     def setResampleAlg(self, _alg):
         pass
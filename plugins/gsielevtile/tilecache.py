@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Minoru Akagi
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import hashlib
+import io
+import os
+import time
+import uuid
+from collections import OrderedDict
+from threading import Lock
+
+import numpy
+from qgis.PyQt.QtCore import QSettings
+
+from ...conf import GSI_ELEV_TILE_DISK_CACHE, GSI_ELEV_TILE_MEMORY_CACHE
+from ...utils.basic import cacheDir
+from ...utils.logging import logger
+
+TILE_SIZE = 256
+NODATA_VALUE = 0
+NODATA_VALUE_BYTES = b"0"
+
+# numpy.loadtxt() has a fast C parser since NumPy 1.23
+_FAST_LOADTXT = tuple(int(v) for v in numpy.__version__.split(".")[:2]) >= (1, 23)
+
+
+_tileCache = None
+
+
+def tileCache():
+    """Return the tile cache shared by GSI elevation tile providers."""
+    global _tileCache
+    if _tileCache is None:
+        directory = cacheDir("gsielevtile") if GSI_ELEV_TILE_DISK_CACHE else None
+        expiration = QSettings().value("/qgis/defaultTileExpiry", 24, type=int)
+        _tileCache = TileCache(GSI_ELEV_TILE_MEMORY_CACHE, directory, expiration)
+    return _tileCache
+
+
+def parseTile(data):
+    """Parse a text tile of GSI elevation tiles.
+
+    A tile consists of 256 lines of 256 comma separated values, and "e" means no data.
+
+    Returns:
+        numpy.ndarray (float32) of shape (256, 256), or None if the data is not a valid tile.
+    """
+    data = bytes(data).replace(b"e", NODATA_VALUE_BYTES)
+    try:
+        if _FAST_LOADTXT:
+            arr = numpy.loadtxt(io.BytesIO(data), delimiter=",", dtype=numpy.float32, ndmin=2)
+        else:
+            arr = numpy.fromstring(data.replace(b"\n", b","), dtype=numpy.float32, sep=",")
+        return arr.reshape(TILE_SIZE, TILE_SIZE)
+
+    except ValueError as e:
+        logger.warning(f"Invalid elevation tile: {e}")
+        return None
+
+
+class TileCache:
+    """Cache of decoded elevation tiles.
+
+    Recently used tiles are kept in memory, and tiles are also stored as `.npy` files keyed by
+    z/x/y in a directory per tile URL template. Tiles stored on disk are used until they expire.
+    """
+
+    def __init__(self, maxTiles, directory=None, expiration=24):
+        """
+        Args:
+            maxTiles: Max number of tiles kept in memory.
+            directory: Root directory of the disk store. If None, tiles are not stored on disk.
+            expiration: Expiration of tiles stored on disk in hours.
+        """
+        self.maxTiles = maxTiles
+        self.directory = directory
+        self.expiration = expiration
+
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+
+        self._lock = Lock()
+        self._tiles = OrderedDict()     # (template, z, x, y) -> array
+
+    def path(self, template, z, x, y):
+        subdir = hashlib.sha1(template.encode("utf-8"), usedforsecurity=False).hexdigest()[:12]
+        return os.path.join(self.directory, subdir, str(z), str(x), f"{y}.npy")
+
+    def get(self, template, z, x, y):
+        """Return a read-only tile array, or None if the tile is not cached or has expired."""
+        key = (template, z, x, y)
+        with self._lock:
+            arr = self._tiles.get(key)
+            if arr is not None:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return arr
+
+        if self.directory:
+            path = self.path(template, z, x, y)
+            try:
+                if time.time() - os.path.getmtime(path) < self.expiration * 3600:
+                    arr = numpy.load(path)
+            except (OSError, ValueError):
+                pass
+
+            if arr is not None and arr.shape == (TILE_SIZE, TILE_SIZE):
+                self._remember(key, arr)
+                with self._lock:
+                    self.diskHits += 1
+                return arr
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, template, z, x, y, arr):
+        self._remember((template, z, x, y), arr)
+
+        if self.directory:
+            path = self.path(template, z, x, y)
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(tmp, "wb") as f:
+                    numpy.save(f, arr)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.warning(f"Failed to store an elevation tile: {e}")
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+    def _remember(self, key, arr):
+        arr.flags.writeable = False
+        with self._lock:
+            self._tiles[key] = arr
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.maxTiles:
+                self._tiles.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self.hits = self.diskHits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"tiles": len(self._tiles), "hits": self.hits, "diskHits": self.diskHits, "misses": self.misses}
@@ -8,12 +8,13 @@ import os
 from qgis.PyQt.QtCore import QSettings
 from qgis.PyQt.QtWidgets import QAction, QActionGroup
 from qgis.PyQt.QtGui import QIcon
-from qgis.core import QgsApplication, QgsProject
+from qgis.core import QgsApplication, QgsProject, QgsRasterLayer
 
 from .utils.logging import configureLoggers
 configureLoggers()
 
 from .conf import DEBUG_MODE, PLUGIN_NAME, WEBENGINE_INPROCESS_WEBGL_AVAILABLE
+from .core.build.dem.providerpool import providerPool
 from .core.exportsettings import ExportSettings
 from .core.processing.procprovider import Qgis2threejsProvider
 from .gui.webview.const import WebViewType, WebViewMode
@@ -38,6 +39,8 @@ class Qgis2threejs:
         self.liveExporter = None
         self.previewEnabled = True
 
+        self._watchedLayers = {}    # layer id -> (layer, slot to release its DEM providers)
+
     def initGui(self):
         # add a toolbar button
         icon = QIcon(pluginDir("Qgis2threejs.png"))
@@ -84,14 +87,22 @@ class Qgis2threejs:
             self.iface.addPluginToWebMenu(PLUGIN_NAME, action)
 
         # connect signal-slot
-        QgsProject.instance().removeAll.connect(self.allLayersRemoved)
+        project = QgsProject.instance()
+        project.removeAll.connect(self.allLayersRemoved)
+        project.layersAdded.connect(self.watchLayers)
+        project.layersWillBeRemoved.connect(self.layersWillBeRemoved)
+        self.watchLayers(project.mapLayers().values())
 
         # register processing provider
         QgsApplication.processingRegistry().addProvider(self.pprovider)
 
     def unload(self):
         # disconnect signal-slot
-        QgsProject.instance().removeAll.disconnect(self.allLayersRemoved)
+        project = QgsProject.instance()
+        project.removeAll.disconnect(self.allLayersRemoved)
+        project.layersAdded.disconnect(self.watchLayers)
+        project.layersWillBeRemoved.disconnect(self.layersWillBeRemoved)
+        self.layersWillBeRemoved(list(self._watchedLayers))
 
         # remove the web menu items and icon
         self.action.triggered.disconnect(self.openExporterLastAction)
@@ -185,6 +196,25 @@ class Qgis2threejs:
 
         self.liveExporter = None
 
+    def watchLayers(self, layers):
+        """Release pooled DEM providers of raster layers when their data source or CRS changes."""
+        for layer in layers:
+            if isinstance(layer, QgsRasterLayer) and layer.id() not in self._watchedLayers:
+                slot = lambda *args, layerId=layer.id(): providerPool().release(layerId)
+                layer.dataSourceChanged.connect(slot)
+                layer.crsChanged.connect(slot)
+                self._watchedLayers[layer.id()] = (layer, slot)
+
+    def layersWillBeRemoved(self, layerIds):
+        """Release pooled DEM providers of the layers so that their source files are closed."""
+        for layerId in layerIds:
+            providerPool().release(layerId)
+
+            layer, slot = self._watchedLayers.pop(layerId, (None, None))
+            if layer:
+                layer.dataSourceChanged.disconnect(slot)
+                layer.crsChanged.disconnect(slot)
+
     def allLayersRemoved(self):
         if self.liveExporter:
             return
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Minoru Akagi
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# Compare size and encode time of binary containers with each codec, level and filter chain.
+#
+#   usage: python scripts/benchmark_binjson.py [DEM file]
+#
+# DEM grid values are read from the DEM file (tests/data/testproject1/dem_srtm30.tif by default)
+# with GDAL, and a TIN (vertices and triangle indices) is built from the grid with the RTIN mesher.
+
+import importlib
+import os
+import sys
+import time
+
+import numpy as np
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+
+PKG = os.path.basename(PLUGIN_DIR)
+jbw = importlib.import_module(PKG + ".core.build.jsonbinarywriter")
+rtin = importlib.import_module(PKG + ".core.build.dem.rtin")
+
+DEFAULT_DEM = os.path.join(PLUGIN_DIR, "tests", "data", "testproject1", "dem_srtm30.tif")
+
+CODECS = [("none", None), ("zlib", 1), ("zlib", 6), ("zlib", 9), ("deflate-raw", 6)]
+FILTER_CHAINS = {
+    "f32": [[], ["shuffle"]],
+    "I32": [[], ["shuffle"], ["delta"], ["delta", "shuffle"]]
+}
+REPEAT = 5
+
+
+def readDEM(filename):
+    from osgeo import gdal
+    ds = gdal.Open(filename, gdal.GA_ReadOnly)
+    if ds is None:
+        sys.exit(f"Cannot open {filename}")
+    band = ds.GetRasterBand(1)
+    return band.ReadAsArray().astype(np.float32), band.GetNoDataValue()
+
+
+def buffers(z, nodata):
+    # DEM grid
+    yield "DEM grid", "f32", z.tobytes()
+
+    # TIN from the largest 2^k + 1 square at the top-left of the grid
+    size = (1 << (min(z.shape) - 1).bit_length() - 1) + 1
+    sq = z[:size, :size]
+    points, faces = rtin.rtinMesh(sq, 1.0, nodata)
+
+    rows, cols = points[:, 0], points[:, 1]
+    vertices = np.column_stack([cols, -rows, sq[rows, cols]]).astype(np.float32)
+    yield f"TIN vertices ({len(vertices)})", "f32", vertices.tobytes()
+    yield f"TIN indices ({len(faces)} triangles)", "I32", faces.astype(np.uint32).tobytes()
+
+
+def main():
+    filename = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DEM
+    z, nodata = readDEM(filename)
+
+    print(f"{'buffer':<32} {'codec':<12} {'level':>5} {'filters':<16} {'size':>10} {'ratio':>7} {'ms':>8}")
+    for name, type, data in buffers(z, nodata):
+        for codec, level in CODECS:
+            for filters in (FILTER_CHAINS[type] if codec != "none" else [[]]):
+                c = jbw.BinaryContainer(data, type, codec=codec, level=level, filters=filters)
+
+                t0 = time.perf_counter()
+                for _ in range(REPEAT):
+                    size = len(c.data())
+                ms = (time.perf_counter() - t0) / REPEAT * 1000
+
+                print(f"{name:<32} {codec:<12} {level if level is not None else '-':>5} {'+'.join(filters) or '-':<16}"
+                      f" {size:>10} {size / len(data):>7.3f} {ms:>8.2f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
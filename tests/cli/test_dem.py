@@ -0,0 +1,446 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Minoru Akagi
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import os
+import shutil
+import threading
+import zlib
+import numpy as np
+from osgeo import gdal
+from qgis.core import QgsGeometry, QgsPointXY
+from qgis.testing import unittest
+
+from .utils import start_app, stop_app
+from ..utils import dataPath, outputPath
+from ...core.build.executor import BlockExecutor
+from ...core.build.dem.block_builder import interpolateEdge
+from ...core.build.dem.block_worker import QUANTIZED_NODATA, buildGridBlock, quantizeHeights, warpArray
+from ...core.build.dem.clipper import clippedGridMesh
+from ...core.build.dem.gridcache import DEMGridCache
+from ...core.build.dem.demprovider import GDALDEMProvider, FlatDEMProvider, TILE_EMPTY, TILE_PARTIAL, TILE_FULL
+from ...core.build.dem.prefetch import DEMReadPrefetcher
+from ...core.build.dem.providerpool import DEMProviderPool
+from ...core.build.dem.rtin import rtinMesh
+from ...core.build.dem.warpcache import WarpedArrayCache
+from ...core.geometry import GridGeometry, TINGeometry
+from ...core.mapextent import MapExtent
+
+
+DEM_FILE = "testproject1/dem_srtm30.tif"
+
+
+class TestDEMProvider(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        start_app()
+
+    @classmethod
+    def tearDownClass(cls):
+        stop_app()
+
+    def createProvider(self):
+        filename = dataPath(DEM_FILE)
+        ds = gdal.Open(filename)
+        return GDALDEMProvider(filename, ds.GetProjection())
+
+    def samplePoints(self, provider, count=200):
+        ext = provider.extent()
+        rng = np.random.default_rng(0)
+        xs = ext.center().x() + ext.width() * rng.uniform(-0.45, 0.45, count)
+        ys = ext.center().y() + ext.height() * rng.uniform(-0.45, 0.45, count)
+        return xs, ys
+
+    def test01_readValuesAt(self):
+        """readValuesAt() returns the same values as readValue()"""
+        provider = self.createProvider()
+        xs, ys = self.samplePoints(provider)
+
+        values = provider.readValuesAt(xs, ys)
+        expected = [provider.readValue(x, y) for x, y in zip(xs, ys)]
+
+        self.assertEqual(len(values), len(xs))
+        np.testing.assert_allclose(values, expected, rtol=1e-4, atol=1e-2)
+
+    def test02_readValuesAt_flat(self):
+        provider = FlatDEMProvider(10)
+        values = provider.readValuesAt([0, 1, 2], [0, 1, 2])
+        np.testing.assert_array_equal(values, [10, 10, 10])
+
+    def test03_warpedVRTMode(self):
+        """blocks read from a warped VRT are the same as blocks warped separately"""
+        provider = self.createProvider()
+        provider.setResampleAlg(gdal.GRA_NearestNeighbour)
+
+        gt = provider.geotransform()
+        xres, yres = gt[1], gt[5]
+        blocks = [
+            [gt[0] + 10 * xres, xres, 0, gt[3] + 20 * yres, 0, yres],       # inside the layer
+            [gt[0] - 30 * xres, xres, 0, gt[3] + 20 * yres, 0, yres],       # partially outside
+            [gt[0] - 200 * xres, xres, 0, gt[3] + 20 * yres, 0, yres]       # outside
+        ]
+
+        for bgt in blocks:
+            provider.setWarpedVRTMode(False)
+            expected = provider._read(64, 64, bgt, asNumpyArray=True)
+
+            provider.setWarpedVRTMode(True)
+            arr = provider._read(64, 64, bgt, asNumpyArray=True)
+
+            np.testing.assert_array_equal(arr, expected)
+
+    def test04_classifyTiles(self):
+        """tiles are classified by valid values"""
+        filename = outputPath("classify_tiles.tif")
+        arr = np.full((25, 23), -9999, dtype=np.float32)
+        arr[0:9, 0:9] = 1       # upper-left tile including its shared edges
+        arr[12, 14] = 1
+        arr[16, 3] = 1          # on the bottom edge of a tile and the top edge of the tile below
+
+        ds = gdal.GetDriverByName("GTiff").Create(filename, 23, 25, 1, gdal.GDT_Float32)
+        ds.SetGeoTransform([0, 1, 0, 0, 0, -1])
+        ds.GetRasterBand(1).SetNoDataValue(-9999)
+        ds.GetRasterBand(1).WriteArray(arr)
+        ds = None
+
+        provider = GDALDEMProvider(filename, "")
+        classes = provider.classifyTiles(0, 0, 8, 3, 3)
+        np.testing.assert_array_equal(classes, [[TILE_FULL, TILE_PARTIAL, TILE_EMPTY],
+                                                [TILE_PARTIAL, TILE_PARTIAL, TILE_EMPTY],
+                                                [TILE_PARTIAL, TILE_EMPTY, TILE_EMPTY]])
+
+    def test05_classifyTiles_outside(self):
+        """tiles that extend past the dataset are not full"""
+        filename = outputPath("classify_tiles_outside.tif")
+        ds = gdal.GetDriverByName("GTiff").Create(filename, 20, 20, 1, gdal.GDT_Float32)
+        ds.SetGeoTransform([0, 1, 0, 0, 0, -1])
+        ds.GetRasterBand(1).SetNoDataValue(-9999)
+        ds.GetRasterBand(1).WriteArray(np.ones((20, 20), dtype=np.float32))
+        ds = None
+
+        # the tile grid starts 4 pixels left of and above the dataset, and ends after it
+        provider = GDALDEMProvider(filename, "")
+        classes = provider.classifyTiles(-4, 4, 8, 4, 4)
+        np.testing.assert_array_equal(classes, [[TILE_PARTIAL, TILE_PARTIAL, TILE_PARTIAL, TILE_EMPTY],
+                                                [TILE_PARTIAL, TILE_FULL, TILE_PARTIAL, TILE_EMPTY],
+                                                [TILE_PARTIAL, TILE_PARTIAL, TILE_PARTIAL, TILE_EMPTY],
+                                                [TILE_EMPTY, TILE_EMPTY, TILE_EMPTY, TILE_EMPTY]])
+
+    def test06_warpSource(self):
+        """a block read in a worker process has the same values as the block read with the provider"""
+        provider = self.createProvider()
+        gt = provider.geotransform()
+        bgt = [gt[0] + 10.5 * gt[1], gt[1] * 1.5, 0, gt[3] + 20 * gt[5], 0, gt[5] * 1.5]
+
+        for vrtMode in [False, True]:
+            provider.setWarpedVRTMode(vrtMode)
+
+            # smaller than the min size of cached arrays
+            source = provider.warpSource(60, 60, bgt)
+            self.assertEqual(source["vrt"] is not None, vrtMode)
+
+            np.testing.assert_array_equal(warpArray(source, 60, 60, bgt), provider._read(60, 60, bgt, asNumpyArray=True))
+
+    def test07_buildGridBlock(self):
+        """a grid block built in a worker process reports its peak memory usage"""
+        provider = self.createProvider()
+        gt = provider.geotransform()
+        bgt = [gt[0], gt[1] * 0.5, 0, gt[3], 0, gt[5] * 0.5]
+
+        source = provider.warpSource(60, 60, bgt)      # not cached
+        data, peak = buildGridBlock(source, 60, 60, bgt, provider.nodata, None)
+        self.assertEqual((data["columns"], data["rows"]), (60, 60))
+        self.assertGreaterEqual(peak, 60 * 60 * 4)      # at least the float32 grid
+
+
+class TestDEMProviderPool(unittest.TestCase):
+
+    def test01_get(self):
+        """providers share dataset handles per thread until the source or CRS changes or they are released"""
+        filename = outputPath("provider_pool.tif")
+        shutil.copyfile(dataPath(DEM_FILE), filename)
+        wkt = gdal.Open(filename).GetProjection()
+        pool = DEMProviderPool()
+
+        p1 = pool.get("dem", filename, wkt)
+        p2 = pool.get("dem", filename, wkt)
+        self.assertIsNot(p1, p2)
+        self.assertIs(p1.ds, p2.ds)
+
+        p2.setResampleAlg(gdal.GRA_NearestNeighbour)
+        self.assertEqual(p1._opts["resampleAlg"], gdal.GRA_Bilinear)     # read options are not shared
+
+        self.assertIsNot(pool.get("dem", filename, wkt, source_wkt=wkt).ds, p1.ds)     # CRS changed
+
+        p3 = pool.get("dem", filename, wkt, source_wkt=wkt)
+        st = os.stat(filename)
+        os.utime(filename, (st.st_atime, st.st_mtime + 10))      # source file updated
+        self.assertIsNot(pool.get("dem", filename, wkt, source_wkt=wkt).ds, p3.ds)
+
+        p3 = pool.get("dem", filename, wkt, source_wkt=wkt)
+        self.assertIs(pool.get("dem", filename, wkt, source_wkt=wkt).ds, p3.ds)
+
+        # other threads have their own handles
+        result = []
+        t = threading.Thread(target=lambda: result.append(pool.get("dem", filename, wkt, source_wkt=wkt)))
+        t.start()
+        t.join()
+        self.assertIsNot(result[0].ds, p3.ds)
+
+        # providers of a layer are released in all threads
+        pool.get("dem2", filename, wkt)
+        pool.release("dem")
+        self.assertEqual(set(key[1] for key in pool._providers), {"dem2"})      # and of the finished thread
+        self.assertIsNot(pool.get("dem", filename, wkt, source_wkt=wkt).ds, p3.ds)
+
+        pool.release()
+        self.assertEqual(pool._providers, {})
+
+
+class TestDEMGridCache(unittest.TestCase):
+
+    def test01_shared(self):
+        """layers get the same array for the same grid, and point values are interpolated in it"""
+        filename = dataPath(DEM_FILE)
+        provider = GDALDEMProvider(filename, gdal.Open(filename).GetProjection())
+        cache = DEMGridCache(64 * 1024 * 1024)
+
+        ext = provider.extent()
+        extent = MapExtent(ext.center(), ext.width() / 2, ext.height() / 2)
+        arr = cache.readAsArray("dem", provider, 201, 201, extent)
+        grid = cache.readAsGridGeometry("dem", provider, 201, 201, extent)
+
+        self.assertTrue(np.shares_memory(grid.values, arr))
+        self.assertFalse(arr.flags.writeable)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        self.assertIsNot(cache.readAsArray("other", provider, 201, 201, extent), arr)   # another layer
+
+        # values at grid points
+        cols, rows = np.array([3, 100, 150]), np.array([7, 100, 20])
+        xs, ys = grid.xmin + cols * grid.xres, grid.ymax - rows * grid.yres
+        np.testing.assert_allclose(cache.valuesAt("dem", provider, xs, ys), arr[rows, cols], rtol=1e-6)
+
+        cache.clear()
+        self.assertEqual(cache.stats()["count"], 0)
+
+
+class TestDEMReadPrefetcher(unittest.TestCase):
+
+    def test01_sameValues(self):
+        """prefetched grids are the same as grids read in this thread"""
+        filename = dataPath(DEM_FILE)
+        provider = GDALDEMProvider(filename, gdal.Open(filename).GetProjection())
+
+        ext = provider.extent()
+        c = ext.center()
+        extents = [MapExtent(QgsPointXY(c.x() + i * ext.width() / 8, c.y()), ext.width() / 4, ext.height() / 4) for i in range(-2, 3)]
+
+        prefetcher = DEMReadPrefetcher("dem", provider, 2)
+        prefetcher.schedule((65, 65, extent) for extent in extents)
+        for extent in extents[:3]:
+            np.testing.assert_array_equal(prefetcher.readAsArray(65, 65, extent), provider.readAsArray(65, 65, extent))
+
+        self.assertEqual(prefetcher.hits, 3)
+        prefetcher.close()      # pending reads are drained
+        np.testing.assert_array_equal(prefetcher.readAsArray(65, 65, extents[4]), provider.readAsArray(65, 65, extents[4]))
+
+
+class TestEdgeInterpolation(unittest.TestCase):
+
+    def test01_interpolateEdge(self):
+        line = np.array([0, 5, 5, 3, 5, 5, 6, 9], dtype=np.float32)
+        knots = interpolateEdge(line, 3)
+
+        np.testing.assert_array_equal(knots, [0, 3, 6])
+        np.testing.assert_array_equal(line, [0, 1, 2, 3, 4, 5, 6, 9])     # the last value is not a knot
+
+
+class TestRTIN(unittest.TestCase):
+
+    def test01_plane(self):
+        """a plane is triangulated with two triangles"""
+        y, x = np.mgrid[0:65, 0:65]
+        z = (2 * x + 3 * y).astype(np.float32)
+
+        points, faces = rtinMesh(z, 0.01, lockEdges=False)
+        self.assertEqual((len(points), len(faces)), (4, 2))
+
+    def test02_fullResolution(self):
+        """all grid points are used if max error is 0"""
+        z = np.random.default_rng(0).uniform(0, 100, (33, 33)).astype(np.float32)
+
+        points, faces = rtinMesh(z, 0)
+        self.assertEqual((len(points), len(faces)), (33 * 33, 32 * 32 * 2))
+
+    def test03_maxError(self):
+        """vertical errors of grid points against the triangles that cover them do not exceed max error"""
+        rng = np.random.default_rng(1)
+        y, x = np.mgrid[0:65, 0:65]
+        z = (np.sin(x / 9) * 30 + np.cos(y / 13) * 40 + rng.normal(0, 2, x.shape)).astype(np.float32)
+
+        for maxError in [2, 10]:
+            points, faces = rtinMesh(z, maxError)
+
+            errors = []
+            for (r0, c0), (r1, c1), (r2, c2) in points[faces]:
+                rr, cc = np.mgrid[min(r0, r1, r2):max(r0, r1, r2) + 1, min(c0, c1, c2):max(c0, c1, c2) + 1]
+                d = (r1 - r2) * (c0 - c2) - (c1 - c2) * (r0 - r2)
+                w0 = ((r1 - r2) * (cc - c2) - (c1 - c2) * (rr - r2)) / d
+                w1 = ((r2 - r0) * (cc - c2) - (c2 - c0) * (rr - r2)) / d
+                w2 = 1 - w0 - w1
+                inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0)
+
+                zi = w0 * z[r0, c0] + w1 * z[r1, c1] + w2 * z[r2, c2]
+                errors.append(np.abs(zi - z[rr, cc])[inside].max())
+
+            self.assertLessEqual(max(errors), maxError * (1 + 1e-6))
+
+
+class TestClippedGridMesh(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        start_app()
+
+    @classmethod
+    def tearDownClass(cls):
+        stop_app()
+
+    def test01_sameSurface(self):
+        """clipping with a cell mask covers the same area as splitting polygons with the grid"""
+        y, x = np.mgrid[0:41, 0:51]
+        z_arr = (x + 2 * y).astype(np.float32)
+        grid = GridGeometry(MapExtent(QgsPointXY(50, 40), 100, 80), 50, 40, z_arr.ravel().tolist())
+
+        geom = QgsGeometry.fromWkt("POLYGON((3.3 5.1, 91.7 12.2, 70.4 77.7, 10.2 60.6, 3.3 5.1),"
+                                   "(30.5 30.5, 50.5 30.5, 40.1 50.2, 30.5 30.5))")
+        transform_func = lambda x, y, z: (x, y, z)
+
+        vertices, faces = clippedGridMesh(grid, z_arr, geom, transform_func)
+
+        def areas(vertices, faces):
+            v = np.asarray(vertices, dtype=np.float64)[np.asarray(faces)]
+            return np.cross(v[:, 1, :2] - v[:, 0, :2], v[:, 2, :2] - v[:, 0, :2]) / 2
+
+        area = areas(vertices, faces)
+        self.assertTrue(np.all(area > 0))      # counter-clockwise
+        self.assertAlmostEqual(area.sum(), geom.area(), delta=geom.area() * 1e-5)
+
+        # heights are on the grid surface
+        np.testing.assert_allclose(vertices[:, 2], vertices[:, 0] / 2 + (80 - vertices[:, 1]), atol=1e-3)
+
+        # the same area as the mesh built by splitting the polygon with the grid
+        d = TINGeometry.fromQgsGeometry(grid.splitPolygon(geom), None, transform_func, centroid=False).toDict(flat=False)
+        self.assertAlmostEqual(area.sum(), areas(d["vertices"], d["indices"]).sum(), delta=geom.area() * 1e-5)
+
+
+class TestGridGeometry(unittest.TestCase):
+
+    def test01_valuesOnSurface(self):
+        """values calculated in bulk are the same as values calculated one by one"""
+        rng = np.random.default_rng(0)
+        grid = GridGeometry(MapExtent(QgsPointXY(10, 20), 60, 40), 30, 20, rng.uniform(0, 100, 31 * 21).tolist())
+
+        xs = np.concatenate([rng.uniform(-25, 45, 500), [40, -20, 40, -20]])     # including corners
+        ys = np.concatenate([rng.uniform(-5, 45, 500), [40, 0, 0, 40]])
+
+        values = grid.valuesOnSurface(xs, ys)
+        expected = [grid.valueOnSurface(x, y) for x, y in zip(xs, ys)]
+        np.testing.assert_allclose(values, [np.nan if v is None else v for v in expected])
+
+
+class TestTINGeometry(unittest.TestCase):
+
+    def test01_fromQgsGeometry(self):
+        """triangles share vertices, are lifted onto the surface and oriented counter-clockwise"""
+        geom = QgsGeometry.fromWkt("POLYGON((0 0, 10 0, 10 10, 5 15, 0 10, 0 0), (2 2, 2 4, 4 4, 4 2, 2 2))")
+        z_func = GridGeometry(MapExtent(QgsPointXY(5, 7.5), 10, 15), 2, 3, list(range(12))).surfaceZFunc()
+
+        tin = TINGeometry.fromQgsGeometry(geom, z_func, lambda x, y, z: (x, y, 2 * z), centroid=False, ccw2d=True)
+        vertices, faces = tin.toArrays()
+
+        self.assertEqual(len(vertices), 9)
+        self.assertEqual(len(np.unique(vertices, axis=0)), 9)
+
+        expected = [2 * z_func(x, y) for x, y in vertices[:, :2]]
+        np.testing.assert_allclose(vertices[:, 2], expected, atol=1e-4)
+
+        v0, v1, v2 = (vertices[faces[:, i]] for i in range(3))
+        cross = (v1[:, 0] - v0[:, 0]) * (v2[:, 1] - v0[:, 1]) - (v2[:, 0] - v0[:, 0]) * (v1[:, 1] - v0[:, 1])
+        self.assertTrue(np.all(cross > 0))
+        self.assertAlmostEqual(cross.sum() / 2, 125 - 4, places=3)
+
+
+class TestHeightQuantization(unittest.TestCase):
+
+    def test01_quantizeHeights(self):
+        """quantized heights are within the error bound"""
+        nodata = -9999
+        z = np.random.default_rng(0).uniform(100, 900, (50, 50)).astype(np.float32)
+        z[10:20, 10:20] = nodata
+
+        c = quantizeHeights(z, 0.05, nodata, delta=False)
+        codes = np.frombuffer(c.data() if not c.compress else zlib.decompress(c.data()), dtype="<u2").reshape(z.shape)
+        values = c.params["base"] + codes * c.params["scale"]
+
+        valid = (z != nodata)
+        self.assertLessEqual(np.abs(values[valid] - z[valid]).max(), 0.05 + 1e-3)
+        self.assertTrue(np.all(codes[~valid] == QUANTIZED_NODATA))
+
+    def test02_outOfRange(self):
+        """None is returned if the range of heights is too large for the error bound"""
+        self.assertIsNone(quantizeHeights(np.array([[0, 1e6]], dtype=np.float32), 0.01))
+
+
+class TestWarpedArrayCache(unittest.TestCase):
+
+    def test01_put_get(self):
+        cache = WarpedArrayCache(outputPath("demcache01"), 1024 * 1024)
+        cache.clear()
+
+        arr = np.arange(100 * 100, dtype=np.float32).reshape(100, 100)
+        key = cache.key("dem.tif", 0, [0, 1, 0, 0, 0, -1], 100, 100)
+
+        self.assertIsNone(cache.get(key))
+        cache.put(key, arr)
+        np.testing.assert_array_equal(cache.get(key), arr)
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test02_eviction(self):
+        arr = np.zeros((100, 100), dtype=np.float32)      # about 40 KB per file
+        cache = WarpedArrayCache(outputPath("demcache02"), 100 * 1024)
+        cache.clear()
+
+        keys = [cache.key(i) for i in range(5)]
+        for i, key in enumerate(keys):
+            cache.put(key, arr)
+            os.utime(cache.path(key), (i, i))       # make access order deterministic
+
+        self.assertIsNone(cache.get(keys[0]))
+        self.assertIsNotNone(cache.get(keys[-1]))
+
+
+class TestBlockExecutor(unittest.TestCase):
+
+    class Task:
+
+        def __init__(self, value):
+            self.value = value
+
+        def build(self):
+            return self.value
+
+    def test01_inThread(self):
+        """results are yielded in the task order"""
+        executor = BlockExecutor(0)
+        tasks = [self.Task(i) for i in range(10)]
+        self.assertEqual(list(executor.run(tasks)), list(range(10)))
+        self.assertIsNone(executor.pool())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Minoru Akagi
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import zlib
+import numpy as np
+from qgis.testing import unittest
+
+from ...core.build.jsonbinarywriter import BinaryContainer, JSONBinaryWriter
+
+
+def decode(c):
+    """Decode the data of a container in the same way as the web page does."""
+    meta = c.metadata()
+    data = c.data()
+    if meta["compressed"]:
+        wbits = -zlib.MAX_WBITS if meta.get("codec") == "deflate-raw" else zlib.MAX_WBITS
+        data = zlib.decompress(data, wbits)
+
+    dtype = {"f32": "<f4", "f64": "<f8", "I32": "<u4", "I16": "<u2", "q16": "<u2"}[meta["__type__"]]
+    itemSize = np.dtype(dtype).itemsize
+
+    for name in reversed(meta.get("filters", [])):
+        if name == "shuffle":
+            data = np.frombuffer(data, dtype=np.uint8).reshape(itemSize, -1).T.tobytes()
+        elif name == "delta":
+            data = np.cumsum(np.frombuffer(data, dtype=dtype), dtype=dtype).tobytes()
+
+    return np.frombuffer(data, dtype=dtype)
+
+
+class TestBinaryContainer(unittest.TestCase):
+
+    def test01_roundtrip(self):
+        """data is restored with every codec and filter chain"""
+        rng = np.random.default_rng(0)
+        arrays = {
+            "f32": rng.uniform(-100, 100, 1000).astype(np.float32),
+            "f64": rng.uniform(-1e7, 1e7, 1000),
+            "I32": np.array([0, 5, 3, 2**32 - 1, 7] * 100, dtype=np.uint32),    # decreasing values wrap around
+            "I16": np.array([0, 5, 3, 2**16 - 1, 7] * 100, dtype=np.uint16)
+        }
+
+        for type, arr in arrays.items():
+            chains = [[], ["shuffle"]] + ([["delta"], ["delta", "shuffle"]] if type[0] != "f" else [])
+            for codec in ["none", "zlib", "deflate-raw"]:
+                for filters in chains:
+                    with self.subTest(type=type, codec=codec, filters=filters):
+                        c = BinaryContainer(arr.tobytes(), type, codec=codec, filters=filters)
+                        np.testing.assert_array_equal(decode(c), arr)
+
+    def test02_metadata(self):
+        """codec and filters are recorded in the metadata"""
+        c = BinaryContainer(b"\0" * 8, "I32", codec="deflate-raw", level=1, filters=["delta", "shuffle"])
+        meta = c.metadata()
+        self.assertEqual(meta["codec"], "deflate-raw")
+        self.assertEqual(meta["filters"], ["delta", "shuffle"])
+
+        meta = BinaryContainer(b"\0" * 8, "f32", compress=False).metadata()
+        self.assertNotIn("codec", meta)
+        self.assertNotIn("filters", meta)
+
+    def test03_memoized(self):
+        """data is compressed only once and arrays are converted to the container type"""
+        c = BinaryContainer(np.arange(100, dtype=np.int64), "I32")
+        self.assertIs(c.data(), c.data())
+        np.testing.assert_array_equal(decode(c), np.arange(100))
+
+    def test04_parallelCompression(self):
+        """output of a writer that compresses containers in threads is the same as serial output"""
+        rng = np.random.default_rng(0)
+        arrays = [rng.uniform(0, 100, 10000).astype(np.float32) for _ in range(4)]
+
+        outputs = []
+        for threads in [0, 4]:
+            data = {str(i): BinaryContainer(arr, "f32") for i, arr in enumerate(arrays)}
+            outputs.append(JSONBinaryWriter(data, threads=threads).toJSONCompatible())
+
+        self.assertEqual(outputs[0], outputs[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,11 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 # begin: 2015-09-16
 
+import os
+import shutil
+import numpy as np
+from qgis.PyQt.QtCore import QUrl
+from qgis.core import QgsCoordinateReferenceSystem
 from qgis.testing import unittest
 
 from .testbase import CLITestBase
@@ -10,6 +15,9 @@ from .utils import loadProject
 from ..utils import dataPath
 from ...core.export.export import ThreeJSExporter
 from ...core.plugin.pluginmanager import pluginManager
+from ...conf import GSI_ELEV_TILE_MEMORY_CACHE
+from ...plugins.gsielevtile import tilecache
+from ...plugins.gsielevtile.gsielevtileprovider import GSIElevTileProvider
 
 
 class TestPlugins(CLITestBase):
@@ -19,6 +27,15 @@ class TestPlugins(CLITestBase):
     def setUp(self):
         pluginManager(True)   # enables all plugins
 
+        # cache tiles in the output directory, not in the cache directory of the user
+        directory = self.outputPath("gsitilecache")
+        shutil.rmtree(directory, ignore_errors=True)
+        self._tileCache = tilecache._tileCache
+        tilecache._tileCache = tilecache.TileCache(GSI_ELEV_TILE_MEMORY_CACHE, directory)
+
+    def tearDown(self):
+        tilecache._tileCache = self._tileCache
+
     def test01_gsielevtile(self):
         """test exporting with GSI elevation tile plugin"""
         mapSettings = loadProject(dataPath(self.PROJ_FILE))
@@ -32,6 +49,52 @@ class TestPlugins(CLITestBase):
         exporter.setMapSettings(mapSettings)
         exporter.export(out_path)
 
+    def mirrorProvider(self, tiles):
+        """Return a GSI elevation tile provider that reads tiles from a local mirror.
+
+        Args:
+            tiles: dict of (z, x, y) -> 2D numpy.ndarray of tile values.
+        """
+        for (z, x, y), tile in tiles.items():
+            path = self.outputPath("gsimirror", str(z), str(x), f"{y}.txt")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write("\n".join(",".join("e" if v == 0 else str(v) for v in row) for row in tile) + "\n")
+
+        provider = GSIElevTileProvider(QgsCoordinateReferenceSystem("EPSG:3857").toWkt())
+        provider.urlTemplate = QUrl.fromLocalFile(self.outputPath("gsimirror")).toString() + "/{z}/{x}/{y}.txt"
+        return provider
+
+    def test02_gsielevtile_mirror(self):
+        """tiles are read from a local mirror and cached"""
+        tile = np.arange(256 * 256, dtype=np.float32).reshape(256, 256) / 4
+        provider = self.mirrorProvider({(10, 900, 400): tile})
+        path = self.outputPath("gsimirror", "10", "900", "400.txt")
+
+        mosaic = provider.fetchTiles(10, 900, 400, 901, 400)
+        np.testing.assert_array_equal(mosaic[:, :256], tile)
+        np.testing.assert_array_equal(mosaic[:, 256:], 0)      # missing tile
+
+        os.remove(path)
+        np.testing.assert_array_equal(provider.fetchTiles(10, 900, 400, 900, 400), tile)     # cached tile
+
+        tilecache._tileCache = tilecache.TileCache(GSI_ELEV_TILE_MEMORY_CACHE, self.outputPath("gsitilecache"))
+        np.testing.assert_array_equal(provider.fetchTiles(10, 900, 400, 900, 400), tile)     # tile cached on disk
+
+    def test03_gsielevtile_readValuesAt(self):
+        """values at points are interpolated bilinearly in tiles of max zoom level"""
+        y, x = np.mgrid[0:256, 0:256]
+        provider = self.mirrorProvider({(14, 14550, 6450): (100 + x + 2 * y).astype(np.float32)})
+
+        size = 2 * 20037508.342789244 / 2 ** 14
+        res = size / 256
+        ulx, uly = 14550 * size - 20037508.342789244, 20037508.342789244 - 6450 * size
+
+        # pixel coordinates within the tile
+        px, py = np.array([0.5, 10.25, 100.5, 254.75]), np.array([0.5, 3.75, 200.5, 254.25])
+        values = provider.readValuesAt(ulx + px * res, uly - py * res)
+        np.testing.assert_allclose(values, 100 + (px - 0.5) + 2 * (py - 0.5), rtol=1e-6)
+
 
 if __name__ == "__main__":
     unittest.main()
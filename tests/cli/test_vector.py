@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# (C) 2026 Minoru Akagi
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import numpy as np
+from qgis.testing import unittest
+
+from .test_jsonbinary import decode
+from ...core.build.datamanager.material import MaterialManager
+from ...core.build.vector.feature_block_builder import batchInstances, batchTriangleMeshes, encodeFeatureColumns
+from ...core.build.vector.object import dipRotation
+
+
+class TestBatchTriangleMeshes(unittest.TestCase):
+
+    def test01_ranges_groups(self):
+        """triangles of each feature are found by its index range, and triangles are grouped by material"""
+        rng = np.random.default_rng(0)
+        meshes = []
+        for n in [3, 4, 0, 5, 3]:
+            vertices = rng.uniform(0, 100, (n, 3))
+            faces = rng.integers(0, n, (n - 2, 3)) if n else np.zeros((0, 3), dtype=np.int64)
+            meshes.append((vertices, faces))
+        materialIndices = [2, 0, 0, 2, 1]
+
+        m = batchTriangleMeshes(meshes, materialIndices)
+        vertices = m["vertices"].reshape(-1, 3)
+        ranges = m["ranges"].reshape(-1, 2)
+
+        for (v, f), (start, count) in zip(meshes, ranges):
+            self.assertEqual(count, f.size)
+            np.testing.assert_allclose(vertices[m["indices"][start:start + count]], v[f.ravel()], rtol=1e-6)
+
+        self.assertEqual([g[0] for g in m["groups"]], [0, 1, 2])
+        self.assertEqual(sum(g[2] for g in m["groups"]), len(m["indices"]))
+        for mtl, start, count in m["groups"]:
+            self.assertTrue(all(start <= s and s + c <= start + count
+                                for (s, c), i in zip(ranges, materialIndices) if i == mtl and c))
+
+
+class TestBatchInstances(unittest.TestCase):
+
+    def test01_groups(self):
+        """instances are grouped by material, and instances of a feature keep their order"""
+        instances = [
+            [((0, 0, 0), (1, 1, 1), (0, 0, 0, 1))],
+            [((1, 0, 0), (2, 2, 2), (0, 0, 0, 1)), ((2, 0, 0), (2, 2, 2), (0, 0, 0, 1))],
+            [],
+            [((3, 0, 0), (4, 4, 4), (0, 0, 1, 0))]
+        ]
+        m = batchInstances(instances, [1, 0, 2, 1])
+
+        self.assertEqual(m["groups"], [[0, 0, 2], [1, 2, 2]])
+        self.assertEqual(m["features"].tolist(), [1, 1, 0, 3])
+        self.assertEqual(m["positions"].reshape(-1, 3)[:, 0].tolist(), [1, 2, 0, 3])
+        self.assertEqual(m["scales"].reshape(-1, 3)[:, 0].tolist(), [2, 2, 1, 4])
+        self.assertEqual(m["rotations"].reshape(-1, 4)[3].tolist(), [0, 0, 1, 0])
+
+    def test02_dip_rotation(self):
+        """a horizontal mesh is tilted to dip direction"""
+        x, y, z, w = dipRotation(90, 90)
+        # rotate normal vector of the mesh (0, 0, 1) with the quaternion
+        n = (2 * (x * z + w * y), 2 * (y * z - w * x), 1 - 2 * (x * x + y * y))
+        np.testing.assert_allclose(n, (1, 0, 0), atol=1e-9)
+
+
+class TestFeatureColumns(unittest.TestCase):
+
+    def test01_encode(self):
+        """numbers and nested lists of numbers are moved into columns, and other values are kept"""
+        feats = [
+            {"geom": {"lines": [[0, 1, 2, 3, 4, 5], [6, 7, 8]], "r": 1.5, "s": "XYZ"}, "mtl": {"idx": 3, "edge": 1}},
+            {"geom": {"lines": [], "r": 2, "s": "ZYX"}, "mtl": {"idx": 0}}
+        ]
+        mtl = feats[0]["mtl"]
+
+        columns = encodeFeatureColumns(feats)
+
+        self.assertEqual(feats, [{"geom": {"s": "XYZ"}, "mtl": {"edge": 1}}, {"geom": {"s": "ZYX"}, "mtl": {}}])
+        self.assertEqual(mtl, {"idx": 3, "edge": 1})       # source dicts are not modified
+
+        lines = columns["geom"]["lines"]
+        self.assertEqual([decode(c).tolist() for c in lines["counts"]], [[2, 0], [6, 3]])
+        self.assertEqual(decode(lines["values"]).tolist(), list(range(9)))
+
+        self.assertEqual(decode(columns["geom"]["r"]["values"]).tolist(), [1.5, 2])
+        self.assertEqual(columns["mtl"]["idx"]["values"].type, "I32")
+        self.assertEqual(decode(columns["mtl"]["idx"]["values"]).tolist(), [3, 0])
+
+    def test02_precision(self):
+        """map coordinates and integers are stored exactly, and integers that float64 cannot hold are kept as they are"""
+        pts = [[4000000.1, -3999999.9, 12.3]]
+        feats = [{"geom": {"a": -3, "b": 2 ** 53 + 1, "pts": pts}}, {"geom": {"a": 2 ** 32, "b": 1, "pts": pts}}]
+
+        columns = encodeFeatureColumns(feats)
+
+        self.assertEqual(list(columns["geom"]), ["a", "pts"])
+        self.assertEqual(decode(columns["geom"]["a"]["values"]).tolist(), [-3, 2 ** 32])
+        self.assertEqual(decode(columns["geom"]["pts"]["values"]).tolist(), pts[0] * 2)
+        self.assertEqual(feats[0]["geom"], {"b": 2 ** 53 + 1})
+
+
+class TestMaterialManager(unittest.TestCase):
+
+    def test01_build_delta(self):
+        """materials added after the previous build are built with their indices kept"""
+        mm = MaterialManager(None)
+        mm.getMeshIndex(color="0xff0000")
+        mm.getLineIndex("0x00ff00")
+
+        self.assertEqual([m["c"] for m in mm.buildAll()], [0xff0000, 0x00ff00])
+
+        start = mm.count()
+        self.assertEqual(mm.getMeshIndex(color="0xff0000"), 0)
+        self.assertEqual(mm.buildAll(start=start), [])
+
+        self.assertEqual(mm.getMeshIndex(color="0x0000ff", opacity=0.5), 2)
+        self.assertEqual(mm.buildAll(start=start), [{"type": mm.defaultMaterialType, "c": 0x0000ff, "o": 0.5}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,7 +5,7 @@
 import os
 import configparser
 
-from PyQt6.QtCore import QDir, QUuid
+from PyQt6.QtCore import QDir, QStandardPaths, QUuid
 
 from ..conf import PLUGIN_NAME
 
@@ -25,6 +25,14 @@ def temporaryOutputDir(*subdirs):
     return temp_dir
 
 
+def cacheDir(*subdirs):
+    """Return the path of a persistent cache directory of this plugin."""
+    cache_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.GenericCacheLocation) + "/" + PLUGIN_NAME
+    if subdirs:
+        return os.path.join(cache_dir, *subdirs)
+    return cache_dir
+
+
 ### conversion ###
 def parseInt(string, def_val=None):
     try:
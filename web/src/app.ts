@@ -6,7 +6,7 @@ import { OrbitControls } from "three/addons/controls/OrbitControls.js";
 
 import { app, conf, deg2rad, gui, modules, Group, LayerType } from "./core.js";
 import { Scene } from "./scene.js";
-import { E, decompress, transformObjectValues } from "./utils.js";
+import { E, decodeBinaryChunk, transformObjectValues } from "./utils.js";
 
 import type { AppData, Q3DEventListener } from "./types.js";
 
@@ -402,21 +402,11 @@ app.loadJSONBinaryFile = (url: string): Promise<Record<string, ArrayBuffer>> =>
 
                 const data = await transformObjectValues(JSON.parse(jsonStr), async (value) => {
                     if (value.__type__ !== undefined) {
-                        let chunk = buf.slice(
+                        const chunk = buf.slice(
                             binaryOffset + value.offset,
                             binaryOffset + value.offset + value.size
                         );
-
-                        if (value.compressed) {
-                            chunk = await decompress(chunk);
-                        }
-
-                        switch (value.__type__) {
-                            case "f32":
-                                return new Float32Array(chunk);
-                            case "I32":
-                                return new Uint32Array(chunk);
-                        }
+                        return decodeBinaryChunk(value, chunk);
                     }
                 });
 
@@ -929,6 +919,9 @@ app.canvasClicked = (e) => {
         if (o.userData.isLabel) {
             o = o.userData.objs[o.userData.partIdx];    // label -> object
         }
+        else if (o.userData.featureAt) {
+            o = o.userData.featureAt(obj);              // block mesh -> object of the feature
+        }
 
         app.highlightFeature(o);
         app.render();
@@ -395,7 +395,7 @@ class DEMMeshBlock extends DEMBlockBase {
 
 		const build = (mesh_data: ParsedDEMMeshData) => {
 			this.setGeometryData(geom, mesh_data);
-			if (!geom.getAttribute("uvs")) {
+			if (!geom.getAttribute("uv")) {
 				this.calculateUVs(geom, data.extent, layer.sceneData.origin);
 			}
 			this.buildAuxiliaryObjects(layer, geom, mesh);
@@ -416,7 +416,7 @@ class DEMMeshBlock extends DEMBlockBase {
 	setGeometryData(geom: THREE.BufferGeometry, data: ParsedDEMMeshData) {
 		geom.setAttribute("position", new THREE.Float32BufferAttribute(data.vertices, 3));
 
-		geom.setIndex(new THREE.Uint32BufferAttribute(data.indices, 1));
+		geom.setIndex(new THREE.BufferAttribute(data.indices, 1));     // Uint16Array or Uint32Array
 
 		if (data.uvs) {
 			geom.setAttribute("uv", new THREE.Float32BufferAttribute(data.uvs, 2));
@@ -7,7 +7,7 @@ import { deg2rad, Group, LayerType, UV } from "../core.js";
 import { BuilderBase, VectorLayer } from "./vectorlayer.js";
 import { Models } from "../model.js";
 
-import type { GeomData, Vec3, VectorLayerData, FeatureBlockData } from "../types.js";
+import type { GeomData, Vec3, VectorLayerData, FeatureBlockData, ParsedFeatureBlockInstanceData } from "../types.js";
 import type { Scene } from "../scene.js";
 
 
@@ -47,6 +47,9 @@ export class PointLayer extends VectorLayer {
             }
             this.models.loadData(data.body.models);
         }
+        else if (data.type == "block" && data.models !== undefined) {
+            this.models.loadData(data.models);
+        }
         super.loadData(data, scene);
     }
 
@@ -77,6 +80,73 @@ class Builder extends BuilderBase {
 
     transform(mesh: THREE.Mesh, geom: GeomData, pt: Vec3) { }
 
+    buildInstances(features, startIndex, data: ParsedFeatureBlockInstanceData) {
+        const { geometry, layer } = this;
+        const { positions, scales, rotations } = data;
+
+        // index of the first instance of each feature. instances of a feature are contiguous
+        const first = new Array(features.length);
+        for (let i = data.features.length - 1; i >= 0; i--) {
+            first[data.features[i]] = i;
+        }
+
+        const position = new THREE.Vector3(), quaternion = new THREE.Quaternion(), scale = new THREE.Vector3();
+        const matrix = new THREE.Matrix4();
+
+        for (const [mtlIdx, start, count] of data.groups) {
+            const mesh = new THREE.InstancedMesh(geometry, layer.materials.mtl(mtlIdx), count);
+
+            // instance matrices are float32. place the mesh at the first instance and keep instance
+            // positions relative to it, so that large map coordinates do not lose precision
+            mesh.position.fromArray(positions, start * 3);
+
+            for (let i = 0; i < count; i++) {
+                const j = start + i;
+                position.fromArray(positions, j * 3).sub(mesh.position);
+                quaternion.fromArray(rotations, j * 4);
+                scale.fromArray(scales, j * 3);
+                mesh.setMatrixAt(i, matrix.compose(position, quaternion, scale));
+            }
+
+            // get the object of the intersected instance
+            mesh.userData.featureAt = (intersection) => {
+                const j = start + intersection.instanceId;
+                const fidx = data.features[j];
+                return features[fidx].objs[j - first[fidx]];
+            };
+
+            layer.addObject(mesh);
+        }
+
+        // objects that represent features in picking and highlighting. they are not added to the scene,
+        // so they are created when they are used first.
+        features.forEach((f, fidx) => {
+            let objs;
+            Object.defineProperty(f, "objs", {
+                get: () => {
+                    if (objs === undefined) {
+                        objs = [];
+                        for (let j = first[fidx]; j < data.features.length && data.features[j] == fidx; j++) {
+                            const obj = new THREE.Mesh(geometry);
+                            obj.position.fromArray(positions, j * 3);
+                            obj.quaternion.fromArray(rotations, j * 4);
+                            obj.scale.fromArray(scales, j * 3);
+                            obj.userData.layerId = layer.id;
+                            obj.userData.featureIdx = startIndex + fidx;
+                            obj.userData.properties = f.prop;
+                            objs.push(obj);
+                        }
+                    }
+                    return objs;
+                },
+                configurable: true,
+                enumerable: true
+            });
+
+            layer.features[startIndex + fidx] = f;
+        });
+    }
+
 }
 
 
@@ -7,6 +7,8 @@ import { deg2rad, LayerType, UV } from "../core.js";
 import { BuilderBase, VectorLayer } from "./vectorlayer.js";
 import { arrayToVec2Array } from "../utils.js";
 
+import type { ParsedFeatureBlockMeshData } from "../types.js";
+
 
 export class PolygonLayer extends VectorLayer {
 
@@ -58,6 +60,73 @@ class Builder extends BuilderBase {
 
 	createObject(f) { }
 
+	buildMesh(features, startIndex, data: ParsedFeatureBlockMeshData) {
+		const { layer } = this;
+		const { ranges } = data;
+
+		const geom = new THREE.BufferGeometry();
+		geom.setAttribute("position", new THREE.BufferAttribute(data.vertices, 3));
+		geom.setIndex(new THREE.BufferAttribute(data.indices, 1));
+		this.setupMeshGeometry(geom);
+
+		const mtls = data.groups.map(([mtlIdx, start, count], i) => {
+			geom.addGroup(start, count, i);
+			return this.materials.mtl(mtlIdx);
+		});
+
+		const mesh = new THREE.Mesh(geom, mtls);
+		this.setupMesh(mesh);
+
+		// objects that represent features in picking and highlighting. they are not added to the scene.
+		for (let i = 0; i < features.length; i++) {
+			const f = features[i];
+
+			const g = new THREE.BufferGeometry();
+			for (const name in geom.attributes) {
+				g.setAttribute(name, geom.getAttribute(name));
+			}
+			g.setIndex(new THREE.BufferAttribute(data.indices.subarray(ranges[i * 2], ranges[i * 2] + ranges[i * 2 + 1]), 1));
+
+			const obj = new THREE.Mesh(g);
+			obj.position.copy(mesh.position);
+			obj.quaternion.copy(mesh.quaternion);
+			obj.userData.layerId = layer.id;
+			obj.userData.featureIdx = startIndex + i;
+			obj.userData.properties = f.prop;
+
+			for (const child of this.createAuxiliaryObjects(f)) {
+				child.userData.featureIdx = startIndex + i;
+				mesh.add(child);
+			}
+
+			f.objs = [obj];
+			layer.features[startIndex + i] = f;
+		}
+
+		// get the object of the feature that has an intersected face
+		mesh.userData.featureAt = (intersection) => {
+			let idx = intersection.object.userData.featureIdx;
+			if (idx === undefined) {
+				const pos = intersection.faceIndex * 3;
+				for (let i = 0; i < features.length; i++) {
+					if (ranges[i * 2] <= pos && pos < ranges[i * 2] + ranges[i * 2 + 1]) {
+						idx = startIndex + i;
+						break;
+					}
+				}
+			}
+			return (idx === undefined) ? mesh : layer.features[idx].objs[0];
+		};
+
+		layer.addObject(mesh);
+	}
+
+	setupMesh(mesh: THREE.Mesh) { }
+
+	setupMeshGeometry(geom: THREE.BufferGeometry) { }
+
+	createAuxiliaryObjects(f): THREE.Object3D[] { return []; }
+
 }
 
 
@@ -66,11 +135,11 @@ class PolygonBuilder extends Builder {
 	type = "Polygon";
 
 	createObject(f) {
-		const t = f.geom.triangles;
+		const { vertices, indices } = f.geom;
 
 		const geom = new THREE.BufferGeometry();
-		geom.setAttribute("position", new THREE.Float32BufferAttribute(t.v, 3));
-		geom.setIndex(t.f);
+		geom.setAttribute("position", new THREE.Float32BufferAttribute(vertices, 3));
+		geom.setIndex(new THREE.Uint32BufferAttribute(indices, 1));
 		return new THREE.Mesh(geom, this.materials.mtl(f.mtl.idx));
 	}
 
@@ -154,15 +223,24 @@ class OverlayBuilder extends Builder {
 	type = "Overlay";
 
 	createObject(f) {
-		const { sceneData } = this.layer;
+		const { vertices, indices } = f.geom;
 
-		const t = f.geom.triangles;
 		const geom = new THREE.BufferGeometry();
-		geom.setIndex(t.f);
-		geom.setAttribute("position", new THREE.Float32BufferAttribute(t.v, 3));
-		geom.computeVertexNormals();
+		geom.setIndex(new THREE.Uint32BufferAttribute(indices, 1));
+		geom.setAttribute("position", new THREE.Float32BufferAttribute(vertices, 3));
+		this.setupMeshGeometry(geom);
 
 		const mesh = new THREE.Mesh(geom, this.materials.mtl(f.mtl.idx));
+		this.setupMesh(mesh);
+
+		for (const obj of this.createAuxiliaryObjects(f)) {
+			mesh.add(obj);
+		}
+		return mesh;
+	}
+
+	setupMesh(mesh: THREE.Mesh) {
+		const { sceneData } = this.layer;
 
 		const { rotation } = sceneData.baseExtent;
 		if (rotation) {
@@ -172,21 +250,28 @@ class OverlayBuilder extends Builder {
 			mesh.position.add(sceneData.pivot);
 			mesh.rotateOnAxis(UV.k, rotation * deg2rad);
 		}
+	}
 
-		if (f.geom.brdr === undefined) return mesh;
+	setupMeshGeometry(geom: THREE.BufferGeometry) {
+		geom.computeVertexNormals();
+	}
+
+	// borders
+	createAuxiliaryObjects(f) {
+		if (f.geom.brdr === undefined) return [];
 
-		// borders
 		const bMtl = this.materials.mtl(f.mtl.brdr);
+		const lines = [];
 
 		for (const boundaries of f.geom.brdr) {
 			for (const vertices of boundaries) {
-				mesh.add(new THREE.Line(
+				const line = new THREE.Line(
 					new THREE.BufferGeometry().setAttribute("position", new THREE.Float32BufferAttribute(vertices, 3)),
-					bMtl)
-				);
+					bMtl);
+				lines.push(line);
 			}
 		}
-		return mesh;
+		return lines;
 	}
 
 }
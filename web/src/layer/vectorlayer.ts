@@ -5,8 +5,9 @@ import { THREE } from "../three.js";
 
 import { app, conf, Group } from "../core.js";
 import { MapLayer } from "./layer.js";
+import { decodeBase64TypedArrayObject } from "../utils.js";
 
-import type { FeatureBlockData, FeatureData, VectorLayerData, VectorLayerProperties } from "../types.js";
+import type { FeatureBlockData, FeatureColumns, FeatureData, ParsedFeatureBlockInstanceData, ParsedFeatureBlockMeshData, VectorLayerData, VectorLayerProperties } from "../types.js";
 import type { Scene } from "../scene.js";
 import type { Materials } from "../material.js";
 
@@ -21,7 +22,7 @@ export class VectorLayer extends MapLayer {
 	declare properties: VectorLayerProperties;
 	declare BuilderFactory: Record<string, BuilderConstructor>;
 
-	build(features, startIndex) {
+	build(features, startIndex, mesh?: ParsedFeatureBlockMeshData, instances?: ParsedFeatureBlockInstanceData) {
 		const { objType } = this.properties;
 
 		if (!this.builder || this.builder.type !== objType) {
@@ -31,7 +32,15 @@ export class VectorLayer extends MapLayer {
 			this.builder = new BuilderClass(this, this.sceneData.zScale);
 		}
 
-		this.builder.build(features, startIndex);
+		if (mesh !== undefined) {
+			this.builder.buildMesh(features, startIndex, mesh);
+		}
+		else if (instances !== undefined) {
+			this.builder.buildInstances(features, startIndex, instances);
+		}
+		else {
+			this.builder.build(features, startIndex);
+		}
 	}
 
 	addFeature(featureIdx, f, objs) {
@@ -164,7 +173,7 @@ export class VectorLayer extends MapLayer {
 				if (hasConn) {
 					// a connector
 					const geom = new THREE.BufferGeometry();
-					geom.setAttribute("position", new THREE.Float32BufferAttribute(vec.toArray().concat(pt), 3));
+					geom.setAttribute("position", new THREE.Float32BufferAttribute(vec.toArray().concat(Array.from(pt)), 3));
 
 					const conn = new THREE.Line(geom, line_mtl);
 					conn.userData = sprite.userData;
@@ -216,12 +225,14 @@ export class VectorLayer extends MapLayer {
 		}
 
 		(data.body.blocks || []).forEach((block) => {
-			if (block.url !== undefined) {
-				app.loadJSONFile(block.url);
+			if (block.url === undefined) {
+				this.loadBlockData(block, scene);
+			}
+			else if (block.url.endsWith(".binjson")) {
+				app.loadJSONBinaryFile(block.url).then((block) => app.loadData(block));
 			}
 			else {
-				this.build(block.features, block.startIndex);
-				if (this.properties.label !== undefined) this.buildLabels(block.features);
+				app.loadJSONFile(block.url);
 			}
 		});
 	}
@@ -229,8 +240,31 @@ export class VectorLayer extends MapLayer {
 	loadBlockData(data: FeatureBlockData, scene: Scene) {
 		super.loadBlockData(data, scene);
 
-		this.build(data.features, data.startIndex);
-		if (this.properties.label !== undefined) this.buildLabels(data.features);
+		// materials used first by features of this block. blocks that have them are loaded in order
+		if (data.materials !== undefined) {
+			this.materials.loadData(data.materials);
+		}
+
+		if (data.columns === undefined && data.mesh === undefined && data.instances === undefined) {
+			this.buildBlock(data);
+		}
+		else {
+			// binary data is base64 encoded in preview, and has been decoded if loaded from a file
+			decodeBase64TypedArrayObject(data).then((block) => this.buildBlock(block));
+		}
+	}
+
+	buildBlock(block: FeatureBlockData) {
+		if (block.columns !== undefined) {
+			decodeFeatureColumns(block.features, block.columns);
+		}
+
+		// binary data has been decoded to typed arrays
+		this.build(block.features, block.startIndex,
+			block.mesh as ParsedFeatureBlockMeshData, block.instances as ParsedFeatureBlockInstanceData);
+		if (this.properties.label !== undefined) this.buildLabels(block.features);
+
+		this.requestRender();
 	}
 
 	get visible() {
@@ -278,7 +312,52 @@ export class BuilderBase {
 
 	createObjects(f) { return []; }
 
+	// build features whose triangles are stored in a mesh of the block
+	buildMesh(features, startIndex, mesh: ParsedFeatureBlockMeshData) { }
+
+	// build features whose objects are instances of a mesh, with transforms stored in the block
+	buildInstances(features, startIndex, instances: ParsedFeatureBlockInstanceData) { }
+
 }
 
 
 export type BuilderConstructor = new (layer: VectorLayer) => BuilderBase;
+
+
+// restore values of features from columns of a binary feature block
+export const decodeFeatureColumns = (features: FeatureData[], columns: FeatureColumns) => {
+	for (const group in columns) {
+		for (const key in columns[group]) {
+			const { values, counts } = columns[group][key];
+
+			if (counts === undefined) {
+				for (let i = 0; i < features.length; i++) {
+					features[i][group][key] = values[i];
+				}
+				continue;
+			}
+
+			// innermost lists are views of the values
+			const innerCounts = counts[counts.length - 1];
+			let items: any[] = new Array(innerCounts.length);
+			for (let i = 0, offset = 0; i < innerCounts.length; i++) {
+				items[i] = values.subarray(offset, offset + innerCounts[i]);
+				offset += innerCounts[i];
+			}
+
+			// nest the lists from inner levels to the outermost level
+			for (let d = counts.length - 2; d >= 0; d--) {
+				const lists = new Array(counts[d].length);
+				for (let i = 0, n = 0; i < lists.length; i++) {
+					lists[i] = items.slice(n, n + counts[d][i]);
+					n += counts[d][i];
+				}
+				items = lists;
+			}
+
+			for (let i = 0; i < features.length; i++) {
+				features[i][group][key] = items[i];
+			}
+		}
+	}
+};
@@ -185,7 +185,7 @@ export type DEMBlockData = DEMBlockGridData | DEMBlockMeshData | DEMBlockMateria
 export interface DEMGridData {
     columns: number;
     rows: number;
-    dem_values: Base64F32;
+    dem_values: Base64F32 | Base64Q16;
     nodata?: Base64F32;
 }
 
@@ -208,7 +208,7 @@ export interface DEMMeshData {
 
 export interface ParsedDEMMeshData {
     vertices: Float32Array;
-    indices: Uint32Array;
+    indices: Uint32Array | Uint16Array;
     uvs?: Float32Array;
 }
 
@@ -230,6 +230,52 @@ export interface FeatureBlockData extends BlockData {
     features: FeatureData[];
     featureCount: number;
     startIndex: number;
+    mesh?: FeatureBlockMeshData | ParsedFeatureBlockMeshData;     /* triangles of Polygon and Overlay features */
+    instances?: FeatureBlockInstanceData | ParsedFeatureBlockInstanceData;    /* transforms of objects of instanced point features */
+    columns?: FeatureColumns;
+    materials?: MaterialData[];     /* materials added to the layer with this block */
+    models?: ModelData[];           /* models added to the layer with this block */
+}
+
+/** values of features stored as binary data, by group ("geom" or "mtl") and key */
+export type FeatureColumns = Record<string, Record<string, FeatureColumn>>;
+
+export interface FeatureColumn {
+    values: TypedArray;
+    counts?: Uint32Array[];     /* lengths of nested lists for each level from the outermost */
+}
+
+/** [material index, start, count] of a run of indices */
+export type MeshGroup = [number, number, number];
+
+export interface FeatureBlockMeshData {
+    vertices: Base64F32;
+    indices: Base64I32;
+    ranges: Base64I32;      /* start and count of indices of each feature */
+    groups: MeshGroup[];
+}
+
+export interface ParsedFeatureBlockMeshData {
+    vertices: Float32Array;
+    indices: Uint32Array;
+    ranges: Uint32Array;
+    groups: MeshGroup[];
+}
+
+export interface FeatureBlockInstanceData {
+    positions: Base64F64;
+    scales: Base64F32;
+    rotations: Base64F32;   /* quaternions (x, y, z, w) */
+    features: Base64I32;    /* index of the feature in the block of each instance */
+    groups: MeshGroup[];
+}
+
+export interface ParsedFeatureBlockInstanceData {
+    positions: Float64Array;
+    scales: Float32Array;
+    rotations: Float32Array;
+    features: Uint32Array;
+    groups: MeshGroup[];
 }
 
 export interface FeatureBlockDataRef extends BlockData {
@@ -355,11 +401,31 @@ export type PreviewData =
 
 
 //// binary data
-type BinaryDataType = "f32" | "I32";
+type BinaryDataType = "f32" | "f64" | "I32" | "I16" | "q16";
+
+/** parameters to decode quantized heights ("q16") */
+export interface QuantizationParams {
+    base: number;
+    scale: number;
+    nodata?: number;
+    filter?: "delta-zigzag";
+}
+
+/** filters applied to binary data before compression */
+type BinaryDataFilter = "shuffle" | "delta";
 
-interface Base64DataBase {
+/** metadata common to base64 data and data references */
+export interface BinaryDataMeta {
     __type__: BinaryDataType;
     compressed: boolean;
+    codec?: "deflate-raw";      /* zlib format if not specified */
+    filters?: BinaryDataFilter[];
+    params?: QuantizationParams;
+}
+
+export type TypedArray = Float32Array | Float64Array | Uint32Array | Uint16Array;
+
+interface Base64DataBase extends BinaryDataMeta {
     data: string;
 }
 
@@ -367,15 +433,26 @@ interface Base64F32 extends Base64DataBase {
     __type__: "f32";
 }
 
+interface Base64F64 extends Base64DataBase {
+    __type__: "f64";
+}
+
 interface Base64I32 extends Base64DataBase {
     __type__: "I32";
 }
 
-export type Base64Data = Base64F32 | Base64I32;
+interface Base64I16 extends Base64DataBase {
+    __type__: "I16";
+}
 
-interface DataRefBase {
-    __type__: BinaryDataType;
-    compressed: boolean;
+interface Base64Q16 extends Base64DataBase {
+    __type__: "q16";
+    params: QuantizationParams;
+}
+
+export type Base64Data = Base64F32 | Base64F64 | Base64I32 | Base64I16 | Base64Q16;
+
+interface DataRefBase extends BinaryDataMeta {
     offset: number;
     size: number;
 }
@@ -384,11 +461,24 @@ interface DataRefF32 extends DataRefBase {
     __type__: "f32";
 }
 
+interface DataRefF64 extends DataRefBase {
+    __type__: "f64";
+}
+
 interface DataRefI32 extends DataRefBase {
     __type__: "I32";
 }
 
-type DataRef = DataRefF32 | DataRefI32;
+interface DataRefI16 extends DataRefBase {
+    __type__: "I16";
+}
+
+interface DataRefQ16 extends DataRefBase {
+    __type__: "q16";
+    params: QuantizationParams;
+}
+
+type DataRef = DataRefF32 | DataRefF64 | DataRefI32 | DataRefI16 | DataRefQ16;
 
 /** Float32Array & { length: 1 } */
 type Float32Array1 = Float32Array;
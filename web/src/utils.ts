@@ -3,7 +3,7 @@
 
 import { THREE } from "./three.js";
 
-import type { Base64Data } from "./types.js";
+import type { Base64Data, BinaryDataMeta, QuantizationParams, TypedArray } from "./types.js";
 
 export const E = (id) => document.getElementById(id);
 
@@ -94,24 +94,86 @@ export const decodeBase64TypedArrayObject = async (obj) => {
 	return transformObjectValues(obj, async (value) => {
 		if (value.__type__ !== undefined) {
 			const bin = value as Base64Data;
-			let chunk = base64ToUint8Array(bin.data).buffer;
-
-			if (bin.compressed) {
-				chunk = await decompress(chunk);
-			}
-
-			switch (bin.__type__) {
-				case "f32":
-					return new Float32Array(chunk);
-				case "I32":
-					return new Uint32Array(chunk);
-			}
+			return decodeBinaryChunk(bin, base64ToUint8Array(bin.data).buffer);
 		}
 	});
 };
 
-export const decompress = async (buf: ArrayBuffer): Promise<ArrayBuffer> => {
-    const ds = new DecompressionStream("deflate");
+// decode a binary chunk of JSON binary data into a typed array
+export const decodeBinaryChunk = async (meta: BinaryDataMeta, chunk: ArrayBuffer): Promise<TypedArray> => {
+	if (meta.compressed) {
+		chunk = await decompress(chunk, (meta.codec === "deflate-raw") ? "deflate-raw" : "deflate");
+	}
+
+	// undo filters in reverse order
+	const filters = meta.filters || [];
+	for (let i = filters.length - 1; i >= 0; i--) {
+		switch (filters[i]) {
+			case "shuffle":
+				chunk = unshuffle(chunk, (meta.__type__ === "q16" || meta.__type__ === "I16") ? 2 : (meta.__type__ === "f64") ? 8 : 4);
+				break;
+			case "delta":
+				chunk = undelta(chunk, meta.__type__);
+				break;
+		}
+	}
+
+	switch (meta.__type__) {
+		case "f32":
+			return new Float32Array(chunk);
+		case "f64":
+			return new Float64Array(chunk);
+		case "I32":
+			return new Uint32Array(chunk);
+		case "I16":
+			return new Uint16Array(chunk);
+		case "q16":
+			return dequantizeHeights(new Uint16Array(chunk), meta.params);
+	}
+};
+
+export const unshuffle = (buf: ArrayBuffer, itemSize: number): ArrayBuffer => {
+	const src = new Uint8Array(buf);
+	const dst = new Uint8Array(src.length);
+	const n = src.length / itemSize;
+
+	for (let b = 0; b < itemSize; b++) {
+		const offset = b * n;
+		for (let i = 0; i < n; i++) {
+			dst[i * itemSize + b] = src[offset + i];
+		}
+	}
+	return dst.buffer;
+};
+
+export const undelta = (buf: ArrayBuffer, type: string): ArrayBuffer => {
+	const a = (type === "q16" || type === "I16") ? new Uint16Array(buf) : new Uint32Array(buf);
+	for (let i = 1; i < a.length; i++) {
+		a[i] += a[i - 1];		// wraps around
+	}
+	return buf;
+};
+
+// decode heights quantized into 16-bit integers
+export const dequantizeHeights = (codes: Uint16Array, params: QuantizationParams): Float32Array => {
+	const { base, scale, nodata } = params;
+	const delta = (params.filter === "delta-zigzag");
+	const values = new Float32Array(codes.length);
+
+	let q = 0;
+	for (let i = 0; i < codes.length; i++) {
+		let c = codes[i];
+		if (delta) {
+			q = (q + ((c >>> 1) ^ -(c & 1))) & 0xFFFF;
+			c = q;
+		}
+		values[i] = (c === 0xFFFF && nodata !== undefined) ? nodata : base + c * scale;
+	}
+	return values;
+};
+
+export const decompress = async (buf: ArrayBuffer, format: CompressionFormat = "deflate"): Promise<ArrayBuffer> => {
+    const ds = new DecompressionStream(format);
 
     const stream = new Blob([buf]).stream().pipeThrough(ds);
 
@@ -120,7 +182,7 @@ export const decompress = async (buf: ArrayBuffer): Promise<ArrayBuffer> => {
 
 export const transformObjectValues = async (obj, transform) => {
 	const visit = async (value) => {
-		if (!value || typeof value !== "object") {
+		if (!value || typeof value !== "object" || ArrayBuffer.isView(value)) {
 			return value;
 		}
 